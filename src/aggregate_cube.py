@@ -0,0 +1,177 @@
+# aggregate_cube.py
+import os
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+from frame_compaction import arrow_available, compact_frame
+from logger_config import logger
+from report_schemas import SCHEMAS
+from report_totals import total_mask
+
+# Additive measures of the analysis reports; 退率 is recomputed from them at every level
+MEASURES = ['出量', '退量', '淨量']
+RATE = '退率'
+
+# Rollup levels and their dimensions. Levels with a month are updated month by month;
+# the others are rolled up again from the monthly levels after every update.
+LEVELS = {
+    'customer_product_month': ['customer', 'product', 'month'],
+    'customer_month': ['customer', 'month'],
+    'product_month': ['product', 'month'],
+    'month': ['month'],
+    'customer': ['customer'],
+    'product': ['product'],
+}
+
+# Dimension each analysis report is broken down by
+REPORT_DIMENSIONS = {
+    'customer_analysis': 'customer',
+    'product_analysis': 'product',
+}
+
+
+def key_column(columns):
+    """The code column of an analysis report: its first column that is not a measure"""
+    measures = SCHEMAS['analysis']['columns']
+    return next(column for column in columns if column not in measures)
+
+
+def with_rate(df):
+    """Add 退率 (% of 出量 returned) computed from the summed measures"""
+    shipped = df['出量'].astype('float64')
+    df[RATE] = (df['退量'].astype('float64') / shipped * 100).where(shipped != 0).round(2)
+    return df
+
+
+class AggregateCube:
+    """Customer x product x month aggregates of the analysis reports at several rollup levels
+
+    Every level is one columnar file (Parquet with pyarrow, else pickle) sorted by
+    its dimensions, so a pivot is an index lookup on a small precomputed table.
+    Adding a month replaces that month's rows of the monthly levels and re-rolls
+    the all-time levels from them; nothing is recomputed from raw reports.
+    """
+
+    def __init__(self, root):
+        """
+        Args:
+            root: Directory holding one file per level
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.suffix = '.parquet' if arrow_available() else '.pkl'
+        self._lock = threading.RLock()
+        self._levels = {}
+
+    def _path(self, level):
+        return self.root / f"{level}{self.suffix}"
+
+    def level(self, level):
+        """Aggregates of a level, indexed by its dimensions"""
+        with self._lock:
+            if level not in self._levels:
+                path = self._path(level)
+                if path.exists():
+                    df = pd.read_parquet(path) if self.suffix == '.parquet' else pd.read_pickle(path)
+                else:
+                    df = pd.DataFrame(columns=LEVELS[level] + MEASURES + [RATE])
+                self._levels[level] = df.set_index(LEVELS[level]).sort_index()
+            return self._levels[level]
+
+    def _save(self, level, df):
+        df = df.sort_index()
+        self._levels[level] = df
+        target = self._path(level)
+        tmp_path = target.with_name(f"{target.stem}.tmp{self.suffix}")
+        flat = compact_frame(df.reset_index())
+        if self.suffix == '.parquet':
+            flat.to_parquet(tmp_path, index=False)
+        else:
+            flat.to_pickle(tmp_path)
+        os.replace(tmp_path, target)
+
+    def _replace_month(self, level, month, rows):
+        """Replace one month of a monthly level with aggregated `rows` (dimensions + measures)"""
+        dimensions = LEVELS[level]
+        aggregated = rows.groupby(dimensions, sort=False, observed=True)[MEASURES].sum().reset_index()
+        aggregated = with_rate(aggregated).set_index(dimensions)
+        existing = self.level(level)
+        if not existing.empty:
+            existing = existing[existing.index.get_level_values('month') != month]
+        self._save(level, pd.concat([existing, aggregated]) if not existing.empty else aggregated)
+
+    def _roll_up(self):
+        """Recompute the levels without a month from the monthly ones"""
+        for level, source in (('customer', 'customer_month'), ('product', 'product_month')):
+            monthly = self.level(source)
+            if monthly.empty:
+                continue
+            rolled = monthly.groupby(level=LEVELS[level], observed=True)[MEASURES].sum()
+            self._save(level, with_rate(rolled))
+
+        # Every month fetched as either report; the customer view wins where both have the month
+        by_month = [
+            # Months may load as categories from Parquet; plain strings align across both levels
+            monthly.groupby(level='month', observed=True)[MEASURES].sum().rename(index=str)
+            for monthly in (self.level('customer_month'), self.level('product_month')) if not monthly.empty
+        ]
+        if by_month:
+            totals = by_month[0] if len(by_month) == 1 else by_month[0].combine_first(by_month[1])
+            self._save('month', with_rate(totals))
+
+    def _rows(self, df, columns, month):
+        """Measures of a parsed report under cube dimension names, total row removed"""
+        measures = [column for column in MEASURES if column in df.columns]
+        labels = [column for column in df.columns if column not in SCHEMAS['analysis']['columns']]
+        df = df[~total_mask(df, labels)]
+        rows = pd.DataFrame({dimension: df[column].astype(str).str.strip() for dimension, column in columns.items()})
+        rows[measures] = df[measures].fillna(0).to_numpy()
+        rows['month'] = month
+        return rows
+
+    def add_view(self, report, df, month):
+        """Add a customer or product analysis report of one month
+        Args:
+            report: customer_analysis or product_analysis
+            df: Parsed report
+            month: 'YYYYMM'
+        """
+        dimension = REPORT_DIMENSIONS[report]
+        rows = self._rows(df, {dimension: key_column(df.columns)}, month)
+        with self._lock:
+            self._replace_month(f"{dimension}_month", month, rows)
+            self._roll_up()
+        logger.info(f"Aggregate cube: {report} of {month} added ({len(rows)} rows)")
+
+    def add_breakdown(self, df, customer_column, product_column, month):
+        """Add the customer x product breakdown of one month (combined analysis fetch)"""
+        rows = self._rows(df, {'customer': customer_column, 'product': product_column}, month)
+        with self._lock:
+            self._replace_month('customer_product_month', month, rows)
+            self._replace_month('customer_month', month, rows)
+            self._replace_month('product_month', month, rows)
+            self._roll_up()
+        logger.info(f"Aggregate cube: customer x product breakdown of {month} added ({len(rows)} rows)")
+
+    def query(self, level, **keys):
+        """Look up aggregates of a level
+        Args:
+            level: Key of LEVELS
+            keys: Values of some of the level's dimensions, e.g. customer='C001', month='202403'
+        Returns:
+            DataFrame of the matching rows
+        """
+        df = self.level(level)
+        unknown = set(keys) - set(LEVELS[level])
+        if unknown:
+            raise ValueError(f"Level {level} has no dimension(s) {', '.join(sorted(unknown))}")
+        if not keys or df.empty:
+            return df
+        # Lists keep every match a DataFrame, even a single fully specified row
+        selector = tuple([keys[dimension]] if dimension in keys else slice(None) for dimension in LEVELS[level])
+        try:
+            return df.loc[selector if len(selector) > 1 else selector[0], :]
+        except KeyError:
+            return df.iloc[0:0]
@@ -0,0 +1,169 @@
+# change_capture.py
+import gzip
+import json
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from logger_config import logger
+from report_schemas import SCHEMAS
+from report_totals import total_mask
+
+# Natural keys of the reports in the changeset. Only the listed columns present in a
+# report are used; a report with none of them is compared by whole rows (inserts and
+# deletes only). None keys a report by all columns that are not analysis measures, so
+# an analysis row changes by update of its measures. Rows sharing a key are matched in
+# order of appearance (OCCURRENCE_COLUMN). Payments have no document number in the
+# table; a payment is identified by its date and due date, so an edited amount or
+# description is an update.
+CHANGE_KEYS = {
+    'inventory': ['貨物代碼'],
+    'monthly_supply': ['貨物代碼'],
+    'customer_analysis': None,
+    'product_analysis': None,
+    'purchase_orders': ['單號', '貨物代碼'],
+    'return_orders': ['單號', '貨物代碼'],
+    'discounts': ['日期', '折讓類別'],
+    'payment_detail': ['日期', '到期日'],
+}
+
+# Added to the key when a key value occurs more than once, numbering the occurrences
+OCCURRENCE_COLUMN = '_occurrence'
+ROW_HASH_COLUMN = '_row'
+
+
+def _json_value(value):
+    if value is None or (not isinstance(value, (list, dict)) and pd.isna(value)):
+        return None
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+
+def json_records(df):
+    """Rows of a frame as JSON-serializable dicts (missing values as None, dates as ISO strings)"""
+    return [{column: _json_value(value) for column, value in row.items()} for row in df.to_dict('records')]
+
+
+def report_keys(report, df):
+    """Key columns of a report's frame ([ROW_HASH_COLUMN] if it has none of its natural keys)"""
+    keys = CHANGE_KEYS.get(report)
+    if keys is None:
+        measures = SCHEMAS['analysis']['columns'] if report.endswith('_analysis') else {}
+        keys = [column for column in df.columns if column not in measures]
+    keys = [column for column in keys if column in df.columns]
+    return keys or [ROW_HASH_COLUMN]
+
+
+def keyed(df, keys):
+    """Frame with total rows removed, values as comparable objects and an occurrence number per key"""
+    # Any non-numeric column may hold the total label (object, category, str or Arrow strings)
+    labels = [column for column in df.columns if not pd.api.types.is_numeric_dtype(df[column])]
+    df = df[~total_mask(df, labels)]
+    df = df.astype(object).where(df.notna(), None).reset_index(drop=True)
+    if keys == [ROW_HASH_COLUMN]:
+        df[ROW_HASH_COLUMN] = pd.util.hash_pandas_object(df.astype(str), index=False).astype(str)
+    df[OCCURRENCE_COLUMN] = df.groupby(keys, sort=False, dropna=False).cumcount()
+    return df
+
+
+def diff_frames(previous, current, keys):
+    """Rows inserted, updated and deleted between two versions of a report
+    Args:
+        previous: Frame of the previous run
+        current: Frame of this run
+        keys: Key columns (from report_keys)
+    Returns:
+        (inserted, updated, deleted) frames including the key columns; updated holds the current values
+    """
+    index = keys + [OCCURRENCE_COLUMN]
+    before = keyed(previous, keys)
+    after = keyed(current, keys)
+    merged = before.merge(after, on=index, how='outer', suffixes=('_before', '_after'), indicator=True)
+    state = merged['_merge']
+
+    columns = [column for column in after.columns if column in before.columns and column not in index]
+    old = merged[[f"{column}_before" for column in columns]].to_numpy()
+    new = merged[[f"{column}_after" for column in columns]].to_numpy()
+    changed = ((old != new) & ~(pd.isna(old) & pd.isna(new))).any(axis=1)
+    if set(before.columns) != set(after.columns):
+        # A column was added or removed: every remaining row changed
+        changed[:] = True
+
+    def rows(frame, mask):
+        return frame.merge(merged.loc[mask, index], on=index)
+
+    inserted = rows(after, state == 'right_only')
+    deleted = rows(before, state == 'left_only')
+    updated = rows(after, (state == 'both') & changed)
+    return inserted, updated, deleted
+
+
+class ChangeCapture:
+    """Changeset of every captured report against the previous run's version
+
+    Reports are captured as their final frames are written. write() compares each
+    with the snapshot of the previous run by natural key (CHANGE_KEYS) and writes
+    the inserted, updated and deleted rows as gzipped JSON lines, one change per
+    line, then replaces the snapshots. Reports not captured in a run (e.g. failed
+    ones) keep their snapshot and produce no changes.
+    """
+
+    def __init__(self, root):
+        """
+        Args:
+            root: Directory for changesets; snapshots live in its `snapshots` subdirectory
+        """
+        self.root = Path(root)
+        self.snapshots = self.root / 'snapshots'
+        self.snapshots.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._frames = {}
+
+    def capture(self, report, df):
+        """Remember the final frame of a report for this run's changeset"""
+        with self._lock:
+            self._frames[report] = df.copy()
+
+    def write(self):
+        """Write the changeset of the captured reports and replace their snapshots
+        Returns:
+            Path of the changeset file, or None if nothing was captured
+        """
+        with self._lock:
+            frames, self._frames = self._frames, {}
+        if not frames:
+            return None
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = self.root / f"changes_{timestamp}.jsonl.gz"
+        counts = {}
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            for report, current in frames.items():
+                snapshot = self.snapshots / f"{report}.pkl"
+                previous = pd.read_pickle(snapshot) if snapshot.exists() else current.iloc[0:0]
+                keys = report_keys(report, current)
+                if keys != report_keys(report, previous) and not previous.empty:
+                    logger.warning(f"{report}: key columns changed since the previous run; reloading every row")
+                    previous = current.iloc[0:0]
+                inserted, updated, deleted = diff_frames(previous, current, keys)
+                key_columns = [column for column in keys if column != ROW_HASH_COLUMN]
+                for op, rows in (('insert', inserted), ('update', updated), ('delete', deleted)):
+                    rows = rows.drop(columns=[OCCURRENCE_COLUMN, ROW_HASH_COLUMN], errors='ignore')
+                    for row in json_records(rows):
+                        record = {
+                            'report': report,
+                            'op': op,
+                            'key': {column: row[column] for column in key_columns},
+                            # Whole-row keyed reports identify a deleted row by its values
+                            'row': row if op != 'delete' or not key_columns else None,
+                        }
+                        f.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+                counts[report] = (len(inserted), len(updated), len(deleted))
+                current.to_pickle(snapshot)
+        logger.info(f"Changeset {path}: " + ', '.join(
+            f"{report} +{ins}/~{upd}/-{dele}" for report, (ins, upd, dele) in counts.items()))
+        return path
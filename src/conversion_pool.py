@@ -0,0 +1,51 @@
+# conversion_pool.py
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from logger_config import logger
+
+
+class ConversionPool:
+    """Bounded pool running LibreOffice conversions next to the browser
+
+    soffice refuses to run a second instance on a user profile that is in
+    use, so every worker thread gets its own throw-away profile
+    (-env:UserInstallation) and conversions can run side by side.
+    """
+
+    def __init__(self, workers=2):
+        """
+        Args:
+            workers: Maximum number of concurrent conversions
+        """
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='convert')
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._profiles = []
+
+    def user_installation_arg(self):
+        """soffice argument selecting the calling thread's private profile"""
+        profile = getattr(self._local, 'profile', None)
+        if profile is None:
+            profile = Path(tempfile.mkdtemp(prefix='soffice_profile_'))
+            self._local.profile = profile
+            with self._lock:
+                self._profiles.append(profile)
+        return f"-env:UserInstallation={profile.as_uri()}"
+
+    def submit(self, func, *args, **kwargs):
+        """Run a conversion job in the pool; returns a Future"""
+        return self._executor.submit(func, *args, **kwargs)
+
+    def close(self):
+        """Wait for running conversions and remove the worker profiles"""
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            profiles, self._profiles = self._profiles, []
+        for profile in profiles:
+            shutil.rmtree(profile, ignore_errors=True)
+        logger.debug(f"Removed {len(profiles)} LibreOffice worker profiles")
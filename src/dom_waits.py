@@ -0,0 +1,201 @@
+# dom_waits.py
+import time
+import uuid
+
+from selenium.common.exceptions import JavascriptException, TimeoutException
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+from logger_config import logger
+
+# Resolves with the first node matching an XPath as soon as it is attached.
+# Documents tagged with the stale token (the page that was current before a
+# submit) resolve with null so the caller retries once the new page is live.
+WAIT_FOR_XPATH_JS = """
+var xpath = arguments[0], staleToken = arguments[1], done = arguments[arguments.length - 1];
+if (staleToken && window.__sdaPageToken === staleToken) {
+    var retry = function () { done(null); };
+    window.addEventListener('pagehide', retry);
+    setTimeout(retry, 250);
+    return;
+}
+var find = function () {
+    return document.evaluate(xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+};
+var node = find();
+if (node) { done(node); return; }
+var observer = new MutationObserver(function () {
+    var found = find();
+    if (found) { observer.disconnect(); done(found); }
+});
+observer.observe(document, {childList: true, subtree: true});
+"""
+
+# Resolves when a JS predicate (function body returning a boolean) becomes true,
+# re-evaluated on every DOM mutation and input/change event
+WAIT_FOR_CONDITION_JS = """
+var predicate = new Function('args', arguments[0]), args = arguments[1], done = arguments[arguments.length - 1];
+var check = function () {
+    try { return predicate(args); } catch (e) { return false; }
+};
+if (check()) { done(true); return; }
+var finish = function () {
+    if (!check()) { return; }
+    observer.disconnect();
+    document.removeEventListener('input', finish, true);
+    document.removeEventListener('change', finish, true);
+    done(true);
+};
+var observer = new MutationObserver(finish);
+observer.observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+document.addEventListener('input', finish, true);
+document.addEventListener('change', finish, true);
+"""
+
+# Hooks window.open and form/link submissions targeting a new window
+ARM_POPUP_JS = """
+if (!window.__sdaPopupHooked) {
+    window.__sdaPopupHooked = true;
+    window.__sdaPopupWaiters = [];
+    var notify = function () {
+        window.__sdaPopupOpened = true;
+        var waiters = window.__sdaPopupWaiters;
+        window.__sdaPopupWaiters = [];
+        waiters.forEach(function (cb) { cb(true); });
+    };
+    var isNewWindow = function (target) {
+        return target && ['_self', '_top', '_parent'].indexOf(target) === -1;
+    };
+    var originalOpen = window.open;
+    window.open = function () {
+        var opened = originalOpen.apply(window, arguments);
+        notify();
+        return opened;
+    };
+    document.addEventListener('submit', function (e) {
+        if (e.target && isNewWindow(e.target.target)) { setTimeout(notify, 0); }
+    }, true);
+    document.addEventListener('click', function (e) {
+        var link = e.target && e.target.closest ? e.target.closest('a[target]') : null;
+        if (link && isNewWindow(link.target)) { setTimeout(notify, 0); }
+    }, true);
+}
+window.__sdaPopupOpened = false;
+"""
+
+WAIT_FOR_POPUP_JS = """
+var done = arguments[arguments.length - 1];
+if (!window.__sdaPopupHooked) { done(false); return; }
+if (window.__sdaPopupOpened) { done(true); return; }
+window.__sdaPopupWaiters.push(done);
+"""
+
+WAIT_FOR_LOAD_JS = """
+var done = arguments[arguments.length - 1];
+if (document.readyState === 'complete' && location.href !== 'about:blank') { done(true); return; }
+window.addEventListener('load', function () { done(true); });
+setTimeout(function () { done(false); }, 250);
+"""
+
+# Poll interval used only to confirm a window handle after the page signalled it
+HANDLE_POLL_SECONDS = 0.05
+
+
+class DomWaiter:
+    """Event-driven waits built on execute_async_script and MutationObserver
+
+    Unlike WebDriverWait, which re-queries the page every 0.5 s, these waits
+    resolve inside the browser the moment the DOM changes, so each wait costs
+    a single round trip in the common case.
+    """
+
+    def __init__(self, driver, timeout=30):
+        self.driver = driver
+        self.timeout = timeout
+
+    def _run_async(self, script, *args, deadline):
+        """Run an async script with the remaining time as script timeout
+        Returns:
+            The script result, or None if the document unloaded mid-wait
+        """
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutException("Timed out waiting for page event")
+        self.driver.set_script_timeout(remaining)
+        try:
+            return self.driver.execute_async_script(script, *args)
+        except JavascriptException as e:
+            # "document unloaded while waiting for result": the page navigated, try again on the new one
+            logger.debug(f"Async wait interrupted by navigation: {e.msg}")
+            return None
+
+    def mark_page(self):
+        """Tag the current document; pass the token to wait_for_xpath to ignore this page"""
+        token = uuid.uuid4().hex
+        self.driver.execute_script("window.__sdaPageToken = arguments[0];", token)
+        return token
+
+    def wait_for_xpath(self, xpath, stale_token=None, timeout=None):
+        """Wait until an element matching `xpath` is attached to the DOM
+        Args:
+            xpath: XPath of the target element
+            stale_token: Token from mark_page(); that document is treated as gone
+            timeout: Seconds to wait (defaults to the navigator timeout)
+        Returns:
+            The matching WebElement
+        """
+        deadline = time.monotonic() + (timeout or self.timeout)
+        while True:
+            node = self._run_async(WAIT_FOR_XPATH_JS, xpath, stale_token, deadline=deadline)
+            if node is not None:
+                return node
+
+    def wait_for_condition(self, predicate_body, args=None, timeout=None):
+        """Wait until a JS predicate returns true; `args` is available to it as `args`"""
+        deadline = time.monotonic() + (timeout or self.timeout)
+        while not self._run_async(WAIT_FOR_CONDITION_JS, predicate_body, args, deadline=deadline):
+            pass
+        return True
+
+    def wait_for_page_load(self, timeout=None):
+        """Wait for the current window's document to finish loading"""
+        deadline = time.monotonic() + (timeout or self.timeout)
+        while not self._run_async(WAIT_FOR_LOAD_JS, deadline=deadline):
+            pass
+        return True
+
+    def arm_new_window(self):
+        """Hook the current page so a following window.open/target submit is reported instantly
+        Returns:
+            The window handles that existed before the action
+        """
+        handles = self.driver.window_handles
+        try:
+            self.driver.execute_script(ARM_POPUP_JS)
+        except JavascriptException as e:
+            logger.debug(f"Could not install new-window hook: {e.msg}")
+        return handles
+
+    def wait_for_new_window(self, known_handles, timeout=None):
+        """Wait for a window not in `known_handles` to appear
+        Args:
+            known_handles: Handles returned by arm_new_window()
+            timeout: Seconds to wait (defaults to the navigator timeout)
+        Returns:
+            Handle of the new window
+        Raises:
+            TimeoutException if no window opened in time
+        """
+        timeout = timeout or self.timeout
+        deadline = time.monotonic() + timeout
+        try:
+            # Resolves when the opener page fires window.open or a target submit
+            self._run_async(WAIT_FOR_POPUP_JS, deadline=deadline)
+        except TimeoutException:
+            raise TimeoutException(f"No new window opened within {timeout}s")
+        remaining = max(deadline - time.monotonic(), HANDLE_POLL_SECONDS)
+        WebDriverWait(self.driver, remaining, poll_frequency=HANDLE_POLL_SECONDS).until(
+            EC.new_window_is_opened(known_handles)
+        )
+        new_handles = [h for h in self.driver.window_handles if h not in known_handles]
+        return new_handles[-1]
@@ -0,0 +1,122 @@
+# download_sandbox.py
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from selenium.common.exceptions import TimeoutException
+from logger_config import logger
+
+MANIFEST_NAME = 'manifest.json'
+
+# Sandboxes of crashed runs older than this are removed when a new one is created
+STALE_SANDBOX_SECONDS = 24 * 3600
+
+
+class DownloadSandbox:
+    """Private download directory of one browser session, with a manifest
+
+    Every expected download is registered under a key before it is triggered;
+    wait() then claims the first new file matching the expected name, so files
+    of other sessions or of a crashed run can never be picked up. The manifest
+    (manifest.json in the sandbox) maps each key to its file.
+    """
+
+    def __init__(self, root):
+        """
+        Args:
+            root: Directory the per-session sandboxes are created in
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._remove_stale()
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.path = Path(tempfile.mkdtemp(prefix=f"{timestamp}_", dir=self.root))
+        self.manifest = {}
+        self._save()
+        logger.info(f"Download sandbox: {self.path}")
+
+    def _remove_stale(self):
+        cutoff = time.time() - STALE_SANDBOX_SECONDS
+        for entry in self.root.iterdir():
+            try:
+                if entry.is_dir() and (entry / MANIFEST_NAME).exists() and entry.stat().st_mtime < cutoff:
+                    shutil.rmtree(entry, ignore_errors=True)
+                    logger.info(f"Removed stale download sandbox {entry}")
+            except OSError:
+                continue
+
+    def _save(self):
+        """Write the manifest atomically"""
+        target = self.path / MANIFEST_NAME
+        tmp_path = target.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(self.manifest, indent=2, ensure_ascii=False))
+        os.replace(tmp_path, target)
+
+    def _claimed(self):
+        return {entry['file'] for entry in self.manifest.values() if entry.get('file')}
+
+    def expect(self, key, pattern='*.xls'):
+        """Register a download before triggering it
+        Args:
+            key: Unique name of the download, e.g. the report type
+            pattern: Exact file name or glob of the expected file
+        """
+        previous = self.file(key)
+        if previous is not None and previous.exists():
+            # Left over from a failed attempt; Chrome would otherwise save the new copy as "name (1)"
+            previous.unlink()
+        self.manifest[key] = {
+            'pattern': pattern,
+            'file': None,
+            'bytes': None,
+            'status': 'pending',
+            'requested_at': datetime.now().isoformat(timespec='seconds'),
+        }
+        self._save()
+
+    def wait(self, key, timeout=30):
+        """Wait for the download registered under `key` to complete
+        Returns:
+            Path of the downloaded file
+        Raises:
+            TimeoutException if no new matching file appears in time
+        """
+        entry = self.manifest[key]
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            claimed = self._claimed()
+            new_files = [f for f in self.path.glob(entry['pattern']) if f.name not in claimed]
+            # Chrome writes to *.crdownload and renames the file once it is complete
+            if new_files and not any(self.path.glob("*.crdownload")):
+                file_path = min(new_files, key=os.path.getmtime)
+                entry.update({
+                    'file': file_path.name,
+                    'bytes': file_path.stat().st_size,
+                    'status': 'downloaded',
+                    'completed_at': datetime.now().isoformat(timespec='seconds'),
+                })
+                self._save()
+                return file_path
+            time.sleep(0.2)
+        entry['status'] = 'missing'
+        self._save()
+        raise TimeoutException(f"Download {key} ({entry['pattern']}) not complete within {timeout} seconds")
+
+    def file(self, key):
+        """Path of the file downloaded for `key`, or None"""
+        entry = self.manifest.get(key)
+        if entry and entry.get('file'):
+            return self.path / entry['file']
+        return None
+
+    def close(self):
+        """Remove the sandbox unless it still holds unprocessed files"""
+        leftovers = [f for f in self.path.iterdir() if f.name != MANIFEST_NAME] if self.path.exists() else []
+        if leftovers:
+            logger.warning(f"Keeping download sandbox {self.path}: {len(leftovers)} unprocessed file(s)")
+            return
+        shutil.rmtree(self.path, ignore_errors=True)
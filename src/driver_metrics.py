@@ -0,0 +1,190 @@
+# driver_metrics.py
+import json
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+from selenium.webdriver.remote.command import Command
+from logger_config import logger
+
+# Upper bounds (seconds) of the latency histogram buckets, Prometheus style
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+# Map raw WebDriver wire commands to the names we report on
+COMMAND_NAMES = {
+    Command.FIND_ELEMENT: 'find_element',
+    Command.FIND_CHILD_ELEMENT: 'find_element',
+    Command.FIND_ELEMENTS: 'find_elements',
+    Command.FIND_CHILD_ELEMENTS: 'find_elements',
+    Command.GET_ELEMENT_TEXT: 'text',
+    Command.GET_ELEMENT_ATTRIBUTE: 'get_attribute',
+    Command.GET_ELEMENT_PROPERTY: 'get_property',
+    Command.IS_ELEMENT_SELECTED: 'is_selected',
+    Command.CLICK_ELEMENT: 'click',
+    Command.SEND_KEYS_TO_ELEMENT: 'send_keys',
+    Command.CLEAR_ELEMENT: 'clear',
+    Command.W3C_EXECUTE_SCRIPT: 'execute_script',
+    Command.W3C_EXECUTE_SCRIPT_ASYNC: 'execute_async_script',
+    Command.GET: 'get',
+    Command.GET_CURRENT_URL: 'current_url',
+    Command.W3C_GET_WINDOW_HANDLES: 'window_handles',
+    Command.SWITCH_TO_WINDOW: 'switch_to_window',
+}
+
+# Selenium implements some element helpers as injected atoms; the script
+# starts with a marker comment naming the helper (e.g. "/* getAttribute */")
+SCRIPT_ATOMS = {
+    '/* getAttribute */': 'get_attribute',
+    '/* isDisplayed */': 'is_displayed',
+}
+
+
+# Commands that make the browser send a request to the server
+REQUEST_COMMANDS = {Command.GET, Command.CLICK_ELEMENT, Command.REFRESH, Command.GO_BACK}
+
+# Scripts that click, submit or open a page also reach the server
+REQUEST_SCRIPT_MARKERS = ('.click()', '.submit()', 'window.open(')
+
+
+def is_request(driver_command, params):
+    """True if the command is a page load or form submit (rate limited)"""
+    if driver_command in REQUEST_COMMANDS:
+        return True
+    if driver_command in (Command.W3C_EXECUTE_SCRIPT, Command.W3C_EXECUTE_SCRIPT_ASYNC) and params:
+        script = params.get('script', '')
+        return any(marker in script for marker in REQUEST_SCRIPT_MARKERS)
+    return False
+
+
+def command_name(driver_command, params):
+    """Return the reporting name for a raw WebDriver command"""
+    if driver_command == Command.W3C_EXECUTE_SCRIPT and params:
+        script = params.get('script', '')
+        for marker, name in SCRIPT_ATOMS.items():
+            if script.startswith(marker):
+                return name
+    return COMMAND_NAMES.get(driver_command, driver_command)
+
+
+class CommandMetrics:
+    """Counts WebDriver round trips per stage and keeps a latency histogram per command"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Stage is per thread so parallel sessions can share one CommandMetrics
+        self._local = threading.local()
+        self.counts = defaultdict(lambda: defaultdict(int))
+        self.histograms = defaultdict(lambda: [0] * len(LATENCY_BUCKETS))
+        self.latency_sums = defaultdict(float)
+
+    @property
+    def current_stage(self):
+        return getattr(self._local, 'stage', None) or 'setup'
+
+    @contextmanager
+    def stage(self, name):
+        """Attribute every command issued inside the block (on this thread) to stage `name`"""
+        previous = getattr(self._local, 'stage', None)
+        self._local.stage = name
+        try:
+            yield self
+        finally:
+            self._local.stage = previous
+
+    def record(self, command, elapsed):
+        """Record one WebDriver command and its round-trip latency"""
+        with self._lock:
+            self.counts[self.current_stage][command] += 1
+            self.latency_sums[command] += elapsed
+            buckets = self.histograms[command]
+            for i, upper in enumerate(LATENCY_BUCKETS):
+                if elapsed <= upper:
+                    buckets[i] += 1
+                    break
+
+    def total(self, stage=None):
+        """Total number of commands, optionally for a single stage"""
+        with self._lock:
+            if stage is not None:
+                return sum(self.counts.get(stage, {}).values())
+            return sum(sum(commands.values()) for commands in self.counts.values())
+
+    def snapshot(self):
+        """Return the per-stage counts as plain nested dicts"""
+        with self._lock:
+            return {stage: dict(commands) for stage, commands in self.counts.items()}
+
+    def log_summary(self):
+        """Log per-stage round trips and per-command latency for the run summary"""
+        counts = self.snapshot()
+        logger.info(f"WebDriver round trips: {self.total()} total")
+        for stage, commands in counts.items():
+            detail = ', '.join(f"{name}={count}" for name, count in sorted(commands.items()))
+            logger.info(f"  {stage}: {sum(commands.values())} ({detail})")
+        with self._lock:
+            for command, buckets in sorted(self.histograms.items()):
+                calls = sum(buckets)
+                mean_ms = self.latency_sums[command] / calls * 1000 if calls else 0.0
+                logger.info(f"  latency {command}: {calls} calls, mean {mean_ms:.1f} ms, "
+                            f"buckets {self._format_buckets(buckets)}")
+
+    @staticmethod
+    def _format_buckets(buckets):
+        labels = ['+Inf' if upper == float('inf') else f"{upper * 1000:g}ms" for upper in LATENCY_BUCKETS]
+        return ' '.join(f"<={label}:{count}" for label, count in zip(labels, buckets) if count)
+
+    def save_budget(self, path):
+        """Write the current per-stage counts as a round-trip budget file"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.snapshot(), indent=2, ensure_ascii=False, sort_keys=True))
+        logger.info(f"Saved WebDriver command budget to {path}")
+
+    def check_budget(self, path):
+        """Compare the current counts against a budget file
+        Args:
+            path: JSON file written by save_budget
+        Returns:
+            List of human readable violations; empty when every count is within budget.
+            Stages missing from the budget are violations.
+        """
+        budget = json.loads(Path(path).read_text())
+        counts = self.snapshot()
+        violations = []
+        for stage, commands in counts.items():
+            if stage not in budget:
+                # A new or renamed stage has no baseline; it must be budgeted before it passes
+                violations.append(f"{stage}: not in budget ({sum(commands.values())} commands); "
+                                  f"re-save the budget to include it")
+                continue
+            for command, count in commands.items():
+                allowed = budget[stage].get(command, 0)
+                if count > allowed:
+                    violations.append(f"{stage}.{command}: {count} > {allowed}")
+        return violations
+
+
+def instrument_driver(driver, metrics, rate_limiter=None):
+    """Route every WebDriver command of `driver` through `metrics`
+
+    WebElement methods call back into their parent driver's execute(), so
+    wrapping the instance method covers both driver and element commands.
+    With a rate_limiter (AdaptiveLimiter), page loads and form submits wait
+    for a request slot first.
+    """
+    original_execute = driver.execute
+
+    def execute(driver_command, params=None):
+        start = time.perf_counter()
+        try:
+            if rate_limiter is not None and is_request(driver_command, params):
+                with rate_limiter.request():
+                    return original_execute(driver_command, params)
+            return original_execute(driver_command, params)
+        finally:
+            metrics.record(command_name(driver_command, params), time.perf_counter() - start)
+
+    driver.execute = execute
+    return driver
@@ -0,0 +1,96 @@
+# form_filler.py
+import uuid
+
+from logger_config import logger
+
+# Applies a field map and optionally submits, all inside one script call.
+# Returns a list of problems; nothing is submitted if any field failed.
+FILL_FORM_JS = """
+var fields = arguments[0], submitXpath = arguments[1], uncheckAll = arguments[2], pageToken = arguments[3];
+var problems = [];
+var fire = function (el, type) { el.dispatchEvent(new Event(type, {bubbles: true})); };
+if (uncheckAll) {
+    Array.prototype.forEach.call(document.querySelectorAll("input[type='checkbox']"), function (box) {
+        if (box.checked) { box.click(); }
+    });
+}
+fields.forEach(function (field) {
+    var el = document.getElementsByName(field.name)[0];
+    if (!el) { problems.push(field.name + ': field not found'); return; }
+    if (field.type === 'select') {
+        var values = Array.prototype.map.call(el.options, function (o) { return o.value; });
+        if (values.indexOf(field.value) === -1) { problems.push(field.name + ': no option ' + field.value); return; }
+        el.value = field.value;
+        fire(el, 'change');
+    } else if (field.type === 'checkbox') {
+        if (el.checked !== field.checked) { el.click(); }
+    } else {
+        el.value = field.value;
+        fire(el, 'input');
+        fire(el, 'change');
+    }
+});
+if (problems.length || !submitXpath) { return problems; }
+var button = document.evaluate(submitXpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+if (!button) { problems.push('submit button not found: ' + submitXpath); return problems; }
+if (pageToken) { window.__sdaPageToken = pageToken; }
+button.click();
+return problems;
+"""
+
+READ_OPTIONS_JS = """
+var result = {};
+arguments[0].forEach(function (name) {
+    var el = document.getElementsByName(name)[0];
+    result[name] = el && el.options ? Array.prototype.map.call(el.options, function (o) { return o.value; }) : null;
+});
+return result;
+"""
+
+
+def select_field(name, value):
+    """Field map entry choosing `value` in the <select> named `name`"""
+    return {'type': 'select', 'name': name, 'value': str(value)}
+
+
+def checkbox_field(name, checked=True):
+    """Field map entry setting the checkbox named `name`"""
+    return {'type': 'checkbox', 'name': name, 'checked': bool(checked)}
+
+
+def text_field(name, value):
+    """Field map entry writing `value` into a text or date input named `name`"""
+    return {'type': 'text', 'name': name, 'value': str(value)}
+
+
+class FormFiller:
+    """Fills and submits filter forms with a single execute_script round trip"""
+
+    def __init__(self, driver):
+        self.driver = driver
+
+    def fill(self, fields, submit_xpath=None, uncheck_all=False, mark_page=False):
+        """Apply a declarative field map and optionally click the submit button
+        Args:
+            fields: List of select_field/checkbox_field/text_field entries, applied in order
+            submit_xpath: XPath of the submit button; None to leave submission to the caller
+            uncheck_all: Clear every checkbox on the page before applying the map
+            mark_page: Tag the current document so DomWaiter.wait_for_xpath can ignore it
+        Returns:
+            The page token when mark_page is set, otherwise None
+        Raises:
+            ValueError if a field or option is missing (the form is not submitted)
+        """
+        token = uuid.uuid4().hex if mark_page else None
+        problems = self.driver.execute_script(FILL_FORM_JS, fields, submit_xpath, uncheck_all, token)
+        if problems:
+            raise ValueError(f"Could not fill form: {'; '.join(problems)}")
+        logger.debug(f"Filled {len(fields)} form fields" + (" and submitted" if submit_xpath else ""))
+        return token
+
+    def read_options(self, names):
+        """Read the option values of several <select> elements in one call
+        Returns:
+            {name: [values]} with None for selects that are not on the page
+        """
+        return self.driver.execute_script(READ_OPTIONS_JS, list(names))
@@ -0,0 +1,133 @@
+# frame_compaction.py
+import threading
+from pathlib import Path
+
+import pandas as pd
+from logger_config import logger
+
+# String columns with at most this share of distinct values are dictionary encoded
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+
+def arrow_available():
+    """True if pyarrow is installed (needed for Arrow-backed string columns)"""
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _compact_column(column, use_arrow, categories):
+    if pd.api.types.is_object_dtype(column) or pd.api.types.is_string_dtype(column):
+        if pd.api.types.infer_dtype(column, skipna=True) != 'string':
+            # Mixed values (e.g. title rows above numbers) are left alone
+            return column
+        if categories and len(column) and column.nunique() <= len(column) * CATEGORY_MAX_UNIQUE_RATIO:
+            return column.astype('category')
+        if use_arrow:
+            return column.astype('string[pyarrow]')
+        return column
+    if pd.api.types.is_integer_dtype(column):
+        try:
+            return pd.to_numeric(column, downcast='integer')
+        except (TypeError, ValueError):
+            return column
+    if pd.api.types.is_float_dtype(column):
+        # Only downcast when float32 holds every value exactly (amounts must not be rounded)
+        narrow = column.astype('float32')
+        if (narrow.astype('float64') == column)[column.notna()].all():
+            return narrow
+    return column
+
+
+def compact_frame(df, arrow=True, categories=True):
+    """Return a memory-compact copy of a DataFrame
+    Args:
+        df: DataFrame to compact
+        arrow: Store distinct-heavy string columns as Arrow strings (if pyarrow is installed)
+        categories: Dictionary-encode string columns whose values repeat
+    Returns:
+        New DataFrame with repeated strings as categories, other strings
+        Arrow-backed and numbers downcast to the smallest lossless type
+    """
+    use_arrow = arrow and arrow_available()
+    compacted = df.copy(deep=False)
+    for position in range(compacted.shape[1]):
+        compacted.isetitem(position, _compact_column(compacted.iloc[:, position], use_arrow, categories))
+    return compacted
+
+
+def frame_bytes(df):
+    """Deep memory usage of a DataFrame in bytes"""
+    return int(df.memory_usage(deep=True).sum())
+
+
+class MemoryReport:
+    """Bytes per report before and after compaction"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.entries = {}
+
+    def add(self, report, before, after):
+        with self._lock:
+            previous = self.entries.get(report, (0, 0))
+            self.entries[report] = (previous[0] + before, previous[1] + after)
+
+    def format(self):
+        lines = [f"{'report':<30} {'before':>12} {'after':>12} {'saved':>7}"]
+        with self._lock:
+            entries = sorted(self.entries.items())
+        for report, (before, after) in entries:
+            saved = 1 - after / before if before else 0.0
+            lines.append(f"{report:<30} {before:>12,} {after:>12,} {saved:>6.0%}")
+        total_before = sum(before for _, (before, _) in entries)
+        total_after = sum(after for _, (_, after) in entries)
+        saved = 1 - total_after / total_before if total_before else 0.0
+        lines.append(f"{'total':<30} {total_before:>12,} {total_after:>12,} {saved:>6.0%}")
+        return '\n'.join(lines)
+
+    def log(self):
+        logger.info("DataFrame memory (bytes):\n" + self.format())
+
+
+def compact_report(df, report, memory_report=None, arrow=True):
+    """Compact a report's DataFrame and record its memory before and after"""
+    before = frame_bytes(df)
+    compacted = compact_frame(df, arrow=arrow)
+    if memory_report is not None:
+        memory_report.add(report, before, frame_bytes(compacted))
+    return compacted
+
+
+def load_report_history(workbook_paths, sheet_name, compact=True, memory_report=None, **read_kwargs):
+    """Load one sheet from many exported workbooks into a single DataFrame
+    Args:
+        workbook_paths: Exported workbooks, e.g. one per month
+        sheet_name: Sheet to load from each workbook
+        compact: Compact every workbook's frame as it is read, keeping peak memory low
+        memory_report: Optional MemoryReport recording bytes per workbook
+        read_kwargs: Passed to pandas.read_excel
+    Returns:
+        DataFrame with a `source` column naming the workbook of each row
+    """
+    frames = []
+    for path in workbook_paths:
+        try:
+            df = pd.read_excel(path, sheet_name=sheet_name, engine='openpyxl', **read_kwargs)
+        except ValueError:
+            logger.warning(f"{path} has no sheet {sheet_name}; skipping")
+            continue
+        df['source'] = Path(path).stem
+        if compact:
+            before = frame_bytes(df)
+            # Categories are built once after concatenation; per-file categories would not concatenate
+            df = compact_frame(df, categories=False)
+            if memory_report is not None:
+                memory_report.add(Path(path).stem, before, frame_bytes(df))
+        frames.append(df)
+    if not frames:
+        return pd.DataFrame()
+    history = pd.concat(frames, ignore_index=True)
+    return compact_frame(history) if compact else history
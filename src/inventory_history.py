@@ -0,0 +1,160 @@
+# inventory_history.py
+import sqlite3
+import time
+from contextlib import closing
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+
+from logger_config import logger
+from report_totals import total_mask
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    day TEXT PRIMARY KEY,
+    products INTEGER NOT NULL,
+    changed INTEGER NOT NULL,
+    recorded REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS inventory_changes (
+    code TEXT NOT NULL,
+    day TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    amount REAL NOT NULL,
+    quantity_delta INTEGER NOT NULL,
+    amount_delta REAL NOT NULL,
+    removed INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (code, day)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_inventory_changes_day ON inventory_changes(day);
+"""
+
+# Columns of the inventory report stored in the history
+CODE_COLUMN = '貨物代碼'
+QUANTITY_COLUMN = '庫存量'
+AMOUNT_COLUMN = '庫存額'
+
+
+def inventory_levels(df):
+    """Stock per product code from a parsed inventory report (total row removed)
+    Returns:
+        DataFrame indexed by code with quantity and amount
+    """
+    # The product code is the first column when the header is not the expected one
+    code = CODE_COLUMN if CODE_COLUMN in df.columns else df.columns[0]
+    rows = df[~total_mask(df, [code])]
+    levels = pd.DataFrame({
+        'code': rows[code].astype(str).str.strip(),
+        'quantity': rows[QUANTITY_COLUMN].fillna(0).astype('int64'),
+        'amount': rows[AMOUNT_COLUMN].fillna(0).astype('float64'),
+    })
+    levels = levels[levels['code'] != '']
+    return levels.groupby('code', sort=True)[['quantity', 'amount']].sum()
+
+
+class InventoryHistory:
+    """SQLite time series of daily inventory snapshots, stored as changes
+
+    Each recorded day stores only the products whose stock quantity or amount
+    differs from the previous recorded day (new level plus delta; products that
+    disappeared get a `removed` row). The stock of any day is the latest change
+    of each product on or before that day, found through the (code, day) key.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(str(self.db_path), timeout=30)
+
+    def days(self):
+        """Recorded days, oldest first"""
+        with closing(self._connect()) as conn:
+            return [row[0] for row in conn.execute("SELECT day FROM snapshots ORDER BY day")]
+
+    def state_at(self, day=None, conn=None):
+        """Stock of every product on a day
+        Args:
+            day: ISO date (default: latest recorded day)
+        Returns:
+            DataFrame indexed by code with quantity and amount
+        """
+        query = (
+            "SELECT c.code, c.quantity, c.amount FROM inventory_changes c "
+            "JOIN (SELECT code, MAX(day) AS day FROM inventory_changes WHERE day <= ? GROUP BY code) latest "
+            "ON c.code = latest.code AND c.day = latest.day WHERE c.removed = 0 ORDER BY c.code"
+        )
+        day = day or date.max.isoformat()
+        if conn is None:
+            with closing(self._connect()) as own_conn:
+                return pd.read_sql_query(query, own_conn, params=(day,), index_col='code')
+        return pd.read_sql_query(query, conn, params=(day,), index_col='code')
+
+    def record(self, df, day=None):
+        """Record a parsed inventory report as the snapshot of a day
+        Recording a day again (a rerun) replaces that day's changes.
+        Args:
+            df: DataFrame from parse_inventory_table
+            day: ISO date (default: today)
+        Returns:
+            Number of products that changed
+        """
+        day = day or date.today().isoformat()
+        current = inventory_levels(df)
+        with closing(self._connect()) as conn, conn:
+            later = conn.execute("SELECT MAX(day) FROM snapshots").fetchone()[0]
+            if later and later > day:
+                logger.warning(f"Inventory history already has {later}; not recording {day}")
+                return 0
+            conn.execute("DELETE FROM inventory_changes WHERE day = ?", (day,))
+            # Without the day's own changes, the state on the day is the previous day's
+            previous = self.state_at(day, conn)
+
+            merged = previous.join(current, how='outer', lsuffix='_before').fillna(0)
+            merged['removed'] = ~merged.index.isin(current.index)
+            changed = (merged['quantity'] != merged['quantity_before']) | \
+                      ((merged['amount'] - merged['amount_before']).abs() > 0.005) | \
+                      ~merged.index.isin(previous.index) | merged['removed']
+            changes = merged[changed]
+            conn.executemany(
+                "INSERT INTO inventory_changes (code, day, quantity, amount, quantity_delta, amount_delta, removed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (code, day, int(quantity), float(amount), int(quantity - quantity_before),
+                     float(amount - amount_before), int(removed))
+                    for code, quantity_before, amount_before, quantity, amount, removed in changes[
+                        ['quantity_before', 'amount_before', 'quantity', 'amount', 'removed']].itertuples()
+                ]
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO snapshots (day, products, changed, recorded) VALUES (?, ?, ?, ?)",
+                (day, len(current), len(changes), time.time())
+            )
+        logger.info(f"Recorded inventory of {day}: {len(current)} products, {len(changes)} changed")
+        return len(changes)
+
+    def product_history(self, code, daily=False):
+        """Stock history of one product
+        Args:
+            code: Product code
+            daily: True for one row per recorded day instead of one per change
+        Returns:
+            DataFrame indexed by day with quantity, amount and their deltas
+        """
+        with closing(self._connect()) as conn:
+            history = pd.read_sql_query(
+                "SELECT day, quantity, amount, quantity_delta, amount_delta, removed FROM inventory_changes "
+                "WHERE code = ? ORDER BY day", conn, params=(str(code),), index_col='day'
+            )
+        if not daily or history.empty:
+            return history
+        days = [day for day in self.days() if day >= history.index[0]]
+        expanded = history.reindex(days)
+        # Days without a change keep the previous level and have no delta
+        expanded[['quantity', 'amount', 'removed']] = expanded[['quantity', 'amount', 'removed']].ffill()
+        expanded[['quantity_delta', 'amount_delta']] = expanded[['quantity_delta', 'amount_delta']].fillna(0)
+        return expanded
@@ -7,12 +7,76 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, WebDriverException
 from webdriver_manager.chrome import ChromeDriverManager
 from web_navigator import WebNavigator
+from metrics_exporter import RunMetrics, write_textfile
+from driver_metrics import CommandMetrics
+from profiling import StageProfiler
+from perf_history import PerfHistory, format_report
+from session_store import SessionStore
+from navigator_daemon import NavigatorDaemon, SessionPool
+from session_watchdog import SessionSupervisor, CircuitBreaker, CircuitOpenError, StepFailedError
+from report_registry import REPORTS, plan, lane_stages, step_names, resolve_reports
+from workbook_merge import merge_workbooks
+from post_processing import PostProcessor
+from rate_limiter import AdaptiveLimiter
+from frame_compaction import MemoryReport, load_report_history
+from report_views import ViewHeaders
+from report_cache import ReportCache
+from change_capture import ChangeCapture
+from inventory_history import InventoryHistory
+from aggregate_cube import AggregateCube, LEVELS
+from query_service import QueryService, ReportIndex
+from report_totals import TotalsMismatchError
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from logger_config import logger
 from datetime import datetime
+import argparse
 import configparser
 from pathlib import Path
+import re
+import sys
+import threading
 import time
 
+PROJECT_ROOT = Path(__file__).parent.parent
+DEFAULT_HISTORY_DB = PROJECT_ROOT / 'exports' / 'perf_history.sqlite'
+DEFAULT_INVENTORY_DB = PROJECT_ROOT / 'exports' / 'inventory_history.sqlite'
+DEFAULT_CUBE_DIR = PROJECT_ROOT / 'exports' / 'cube'
+REPORT_HEADERS_FILE = PROJECT_ROOT / 'exports' / 'report_headers.json'
+
+# One limiter per process: every session, lane and account shares it
+_rate_limiter = None
+# Bytes per report before and after compaction, when compact_frames is enabled
+_memory_report = None
+# One ChangeCapture per changes directory (i.e. per account), shared by its sessions
+_change_captures = {}
+_change_captures_lock = threading.Lock()
+# Circuit breakers per account ('' without accounts), shared by every lane and kept in the
+# performance history so that a report failing run after run is skipped during its cool-down
+_circuit_breakers = {}
+_circuit_breakers_lock = threading.Lock()
+
+def resolve_path(value):
+    """Expand ~ and make relative paths relative to the project root"""
+    path = Path(value).expanduser()
+    return str(path if path.is_absolute() else PROJECT_ROOT / path)
+
+def load_accounts(config):
+    """Supplier accounts declared as [Account:<name>] sections"""
+    accounts = []
+    for section in config.sections():
+        if not section.startswith('Account:'):
+            continue
+        name = section.split(':', 1)[1].strip()
+        reports = config.get(section, 'reports', fallback='')
+        accounts.append({
+            'name': name,
+            'username': config[section]['username'],
+            'password': config[section]['password'],
+            'reports': [report.strip() for report in reports.split(',') if report.strip()] or None
+        })
+    return accounts
+
 def load_config():
     try:
         config = configparser.ConfigParser()
@@ -31,7 +95,37 @@ def load_config():
             'username': config['Credentials']['username'],
             'password': config['Credentials']['password'],
             'timeout': int(config['Settings']['timeout']),
-            'browser': config['Settings']['browser']
+            'browser': config['Settings']['browser'],
+            'post_process_workers': config.getint('Settings', 'post_process_workers', fallback=2),
+            'breaker_threshold': config.getint('Settings', 'breaker_threshold', fallback=3),
+            'breaker_reset_seconds': config.getint('Settings', 'breaker_reset_seconds', fallback=6 * 3600),
+            'conversion_workers': config.getint('Settings', 'conversion_workers', fallback=2),
+            'compact_frames': config.getboolean('Settings', 'compact_frames', fallback=False),
+            'combined_analysis': config.getboolean('Settings', 'combined_analysis', fallback=False),
+            'metrics_dir': config.get('Metrics', 'textfile_dir', fallback=None),
+            'history_db': config.get('Metrics', 'history_db', fallback=str(DEFAULT_HISTORY_DB)),
+            'persist_session': config.getboolean('Session', 'persist', fallback=False),
+            'profile_dir': resolve_path(config.get('Session', 'profile_dir', fallback='.session/chrome_profile')),
+            'cookie_jar': resolve_path(config.get('Session', 'cookie_jar', fallback='.session/session.jar')),
+            'report_cache': config.getboolean('Cache', 'enabled', fallback=False),
+            'report_cache_dir': resolve_path(config.get('Cache', 'dir', fallback='exports/report_cache')),
+            'change_capture': config.getboolean('Changes', 'enabled', fallback=False),
+            'changes_dir': resolve_path(config.get('Changes', 'dir', fallback='exports/changes')),
+            'inventory_history': config.getboolean('InventoryHistory', 'enabled', fallback=False),
+            'inventory_db': resolve_path(config.get('InventoryHistory', 'db', fallback=str(DEFAULT_INVENTORY_DB))),
+            'aggregate_cube': config.getboolean('Cube', 'enabled', fallback=False),
+            'cube_dir': resolve_path(config.get('Cube', 'dir', fallback=str(DEFAULT_CUBE_DIR))),
+            'daemon_port': config.getint('Daemon', 'port', fallback=8765),
+            'daemon_sessions': config.getint('Daemon', 'sessions', fallback=1),
+            'daemon_keepalive': config.getint('Daemon', 'keepalive_seconds', fallback=300),
+            'query_port': config.getint('Query', 'port', fallback=8766),
+            'accounts': load_accounts(config),
+            'max_concurrent_accounts': config.getint('Accounts', 'max_concurrent', fallback=2),
+            'sessions_per_account': config.getint('Accounts', 'sessions_per_account', fallback=1),
+            'rate_limit': config.getboolean('RateLimit', 'enabled', fallback=True),
+            'rate_limit_initial': config.getint('RateLimit', 'initial', fallback=2),
+            'rate_limit_max': config.getint('RateLimit', 'max', fallback=6),
+            'rate_limit_target_latency': config.getfloat('RateLimit', 'target_latency', fallback=3.0)
         }
     except Exception as e:
         logger.error(f"Error loading config: {str(e)}")
@@ -57,103 +151,693 @@ def setup_driver():
         logger.error(f"Failed to setup WebDriver: {str(e)}")
         raise
 
-def perform_ucd_automation(config):
-    navigator = WebNavigator(timeout=config['timeout'])
+def rate_limiter(config):
+    """The process-wide AdaptiveLimiter, or None if rate limiting is disabled"""
+    global _rate_limiter
+    if not config.get('rate_limit', True):
+        return None
+    if _rate_limiter is None:
+        _rate_limiter = AdaptiveLimiter(
+            initial=config.get('rate_limit_initial', 2),
+            maximum=config.get('rate_limit_max', 6),
+            target_latency=config.get('rate_limit_target_latency', 3.0)
+        )
+    return _rate_limiter
+
+def memory_report(config):
+    """The process-wide MemoryReport, or None if DataFrame compaction is disabled"""
+    global _memory_report
+    if not config.get('compact_frames'):
+        return None
+    if _memory_report is None:
+        _memory_report = MemoryReport()
+    return _memory_report
+
+def change_capture(config):
+    """The ChangeCapture of the configured changes directory, or None if change capture is disabled"""
+    if not config.get('change_capture'):
+        return None
+    with _change_captures_lock:
+        if config['changes_dir'] not in _change_captures:
+            _change_captures[config['changes_dir']] = ChangeCapture(config['changes_dir'])
+        return _change_captures[config['changes_dir']]
+
+def write_changes(config):
+    """Write the changeset of the reports captured so far"""
+    capture = change_capture(config)
+    if capture is None:
+        return
+    try:
+        capture.write()
+    except Exception as e:
+        logger.warning(f"Skipping changeset: {str(e)}")
+
+def circuit_breakers(config):
+    """The circuit breakers of the configured account, loaded from the performance history on first use"""
+    label = config.get('account', '')
+    with _circuit_breakers_lock:
+        if label not in _circuit_breakers:
+            breakers = {}
+            try:
+                state = PerfHistory(config.get('history_db') or DEFAULT_HISTORY_DB).load_breakers(label)
+            except Exception as e:
+                logger.warning(f"No circuit breaker state from performance history: {str(e)}")
+                state = {}
+            for name, (failures, opened_at) in state.items():
+                breakers[name] = CircuitBreaker(config['breaker_threshold'], config['breaker_reset_seconds'],
+                                                failures=failures, opened_at=opened_at)
+            _circuit_breakers[label] = breakers
+        return _circuit_breakers[label]
+
+def save_circuit_breakers(config):
+    """Persist the circuit breakers of the configured account for the next run"""
+    breakers = _circuit_breakers.get(config.get('account', ''))
+    if not breakers:
+        return
+    try:
+        PerfHistory(config.get('history_db') or DEFAULT_HISTORY_DB).save_breakers(
+            dict(breakers), label=config.get('account', ''))
+    except Exception as e:
+        logger.warning(f"Skipping circuit breaker state: {str(e)}")
+
+def log_run_summaries():
+    """Log the process-wide rate limiter and memory summaries"""
+    if _rate_limiter is not None:
+        _rate_limiter.log_summary()
+    if _memory_report is not None:
+        _memory_report.log()
+
+def session_profile_dir(config, session=0):
+    """Chrome profile of one concurrent session; Chrome locks a profile to one browser"""
+    return config['profile_dir'] if not session else f"{config['profile_dir']}_s{session}"
+
+def create_navigator(config, run_metrics=None, command_metrics=None, session=0):
+    """Build a WebNavigator from the loaded configuration
+    Args:
+        session: Index of the concurrent session (lane or pool slot) the navigator belongs to
+    """
+    session_kwargs = {}
+    if config.get('persist_session'):
+        session_kwargs = {
+            'profile_dir': session_profile_dir(config, session),
+            'session_store': SessionStore(config['cookie_jar'])
+        }
+    view_headers = ViewHeaders(REPORT_HEADERS_FILE) if config.get('combined_analysis') else None
+    report_cache = ReportCache(config['report_cache_dir']) if config.get('report_cache') else None
+    inventory_history = InventoryHistory(config['inventory_db']) if config.get('inventory_history') else None
+    aggregate_cube = AggregateCube(config['cube_dir']) if config.get('aggregate_cube') else None
+    return WebNavigator(timeout=config['timeout'], command_metrics=command_metrics,
+                        run_metrics=run_metrics, conversion_workers=config.get('conversion_workers', 2),
+                        rate_limiter=rate_limiter(config), memory_report=memory_report(config),
+                        view_headers=view_headers, report_cache=report_cache,
+                        change_capture=change_capture(config), inventory_history=inventory_history,
+                        aggregate_cube=aggregate_cube, **session_kwargs)
+
+def new_excel_path(suffix=''):
+    """Timestamped workbook path in the exports directory"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    exports_dir = PROJECT_ROOT / 'exports'
+    exports_dir.mkdir(exist_ok=True)  # Ensure exports directory exists
+    return str(exports_dir / f'sales_data_{timestamp}{suffix}.xlsx')
+
+def run_stages(navigator, excel_path, stages, profiler=None, at_index=False, supervisor=None, post_workers=2):
+    """Run pipeline stages into one workbook
+    Args:
+        navigator: Logged-in WebNavigator
+        excel_path: Workbook all stages export to
+        stages: List of (name, function) pairs from report_registry.lane_stages
+        profiler: Optional StageProfiler
+        at_index: True if the browser is already on the member index page
+        supervisor: Optional SessionSupervisor; failing stages are then retried
+                    and, if they still fail, skipped so the remaining stages run
+        post_workers: Background workers parsing, converting and exporting fetched
+                      reports while the browser moves on; 0 (or profiling) finishes each report inline
+    Raises:
+        StepFailedError listing the failed stages once all stages ran (supervised runs)
+    """
+    metrics = navigator.command_metrics
+    run_metrics = navigator.run_metrics
+    run_metrics.workbook_path = excel_path
+    if profiler:
+        # cProfile only sees the calling thread; parse and write inline so the stage profile covers them
+        post_workers = 0
+    processor = PostProcessor(run_metrics, workers=post_workers) if post_workers else None
+    failed = []
+    try:
+        for index, (stage_name, stage_func) in enumerate(stages):
+            starts_at_index = index == 0 and at_index
+
+            def step(nav, attempt, stage_func=stage_func, starts_at_index=starts_at_index):
+                # The supervisor may hand over a rebuilt navigator
+                nav.post_processor = processor
+                # Every retry starts over from the index page
+                if attempt > 1 or not starts_at_index:
+                    nav.return_to_index()
+                stage_func(nav, excel_path)
+
+            stage_profile = profiler.profile(stage_name) if profiler else nullcontext()
+            try:
+                with metrics.stage(stage_name), run_metrics.report(stage_name), stage_profile:
+                    if supervisor is None:
+                        step(navigator, 1)
+                    else:
+                        supervisor.run_step(stage_name, step)
+            except (StepFailedError, CircuitOpenError, TotalsMismatchError) as e:
+                # A totals mismatch fails only its stage, as it does when parsed in the background
+                logger.error(f"Stage {stage_name} skipped: {str(e)}")
+                failed.append(stage_name)
+    finally:
+        if processor:
+            # Post-processing errors surface here, after the browser work is done
+            failed += [name for name in processor.join() if name not in failed]
+            processor.close()
+            navigator.post_processor = None
+            if supervisor is not None:
+                supervisor.navigator.post_processor = None
+    if failed:
+        raise StepFailedError(f"Stages failed: {', '.join(failed)}")
+
+def make_supervisor(config, navigator, session=0):
+    """Supervise stages: re-login or restart the browser and retry only the failing stage"""
+    return SessionSupervisor(
+        navigator,
+        lambda **metrics_kwargs: create_navigator(config, session=session, **metrics_kwargs),
+        config['username'],
+        config['password'],
+        breaker_threshold=config['breaker_threshold'],
+        breaker_reset_seconds=config['breaker_reset_seconds'],
+        breakers=circuit_breakers(config)
+    )
+
+def load_cost_estimates(config):
+    """Median stage durations of the configured account's runs, for the planner"""
+    try:
+        return PerfHistory(config.get('history_db') or DEFAULT_HISTORY_DB).stage_costs(label=config.get('account', ''))
+    except Exception as e:
+        logger.warning(f"No cost estimates from performance history: {str(e)}")
+        return {}
+
+def run_lane(config, lane, excel_path, run_metrics, command_metrics, period=None, session=0):
+    """Run one plan lane on its own browser session (used for parallel plans)"""
+    navigator = create_navigator(config, run_metrics=run_metrics, command_metrics=command_metrics, session=session)
+    supervisor = make_supervisor(config, navigator, session=session)
+    try:
+        with command_metrics.stage('login'):
+            navigator.ensure_logged_in(config['username'], config['password'])
+        run_stages(navigator, excel_path, lane_stages(lane, period), at_index=True,
+                   supervisor=supervisor, post_workers=config.get('post_process_workers', 2))
+    finally:
+        supervisor.navigator.end_session()
+
+def perform_parallel_automation(config, lanes, run_metrics=None, command_metrics=None, period=None,
+                                excel_path=None):
+    """Run plan lanes concurrently, one browser session each, and merge their workbooks
+    Returns:
+        Path to the merged workbook
+    """
+    run_metrics = run_metrics or RunMetrics()
+    command_metrics = command_metrics or CommandMetrics()
+    excel_path = excel_path or new_excel_path()
+    output = Path(excel_path)
+    part_paths = [str(output.with_name(f"{output.stem}_part{index + 1}{output.suffix or '.xlsx'}"))
+                  for index in range(len(lanes))]
+    try:
+        with ThreadPoolExecutor(max_workers=len(lanes)) as executor:
+            futures = [
+                executor.submit(run_lane, config, lane, part_path, run_metrics, command_metrics, period, index)
+                for index, (lane, part_path) in enumerate(zip(lanes, part_paths))
+            ]
+            errors = [future.exception() for future in futures if future.exception()]
+        sheet_order = [REPORTS[name]['sheet'] for name in REPORTS]
+        merge_workbooks(part_paths, excel_path, sheet_order=sheet_order)
+        run_metrics.workbook_path = excel_path
+        if errors:
+            raise errors[0]
+        logger.info(f"All reports exported to {excel_path}")
+        return excel_path
+    finally:
+        command_metrics.log_summary()
+
+def perform_ucd_automation(config, run_metrics=None, command_metrics=None, profiler=None, reports=None,
+                           period=None, excel_path=None):
+    navigator = create_navigator(config, run_metrics=run_metrics, command_metrics=command_metrics)
+    metrics = navigator.command_metrics
     try:
-        # Create exports directory
-        exports_dir = Path(__file__).parent.parent / 'exports'
-        exports_dir.mkdir(exist_ok=True)
-        
         # Login to UCD website
         logger.info(f"Attempting login for user: {config['username'][:2]}***")
-        navigator.login(config['username'], config['password'])
+        with metrics.stage('login'):
+            navigator.ensure_logged_in(config['username'], config['password'])
         logger.info("Successfully logged in")
 
+        supervisor = make_supervisor(config, navigator)
+        stages = lane_stages(plan(reports)[0], period)
+
         # Create single Excel file for all reports
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        exports_dir = Path(__file__).parent.parent / 'exports'
-        exports_dir.mkdir(exist_ok=True)  # Ensure exports directory exists
-        excel_path = exports_dir / f'sales_data_{timestamp}.xlsx'
-
-        # Export inventory data
-        navigator.navigate_to_inventory()
-        inventory_df = navigator.extract_inventory_table()
-        navigator.export_to_excel(inventory_df, "inventory", excel_path=str(excel_path))
-        
-        # Return to index and export monthly supply
-        navigator.return_to_index()
-        navigator.navigate_to_monthly_supply()
-        navigator.set_monthly_supply_filter()
-        supply_df, supply_title = navigator.extract_monthly_supply_table()
-        navigator.export_to_excel(supply_df, "monthly_supply", title=supply_title, excel_path=str(excel_path))
-        
-        # Return to index and export analysis reports
-        navigator.return_to_index()
-        navigator.navigate_to_analysis_report()
-        
-        # Customer analysis
-        navigator.set_analysis_report_filter(filter_type='customer')
-        customer_df = navigator.extract_analysis_table()
-        navigator.export_to_excel(customer_df, "customer_analysis", excel_path=str(excel_path))
-        
-        # Product analysis
-        navigator.set_analysis_report_filter(filter_type='product')
-        product_df = navigator.extract_analysis_table()
-        navigator.export_to_excel(product_df, "product_analysis", excel_path=str(excel_path))
-
-        # Process weekly and monthly summary reports
-        navigator.return_to_index()
-        navigator.process_summary_reports(str(excel_path), 'weekly')
-        
-        navigator.return_to_index()
-        navigator.process_summary_reports(str(excel_path), 'monthly')
-
-        # Process order reports (purchase and return)
-        navigator.return_to_index()
-        navigator.process_order_reports(str(excel_path))
-
-        # Payment menu and discount reports
-        navigator.return_to_index()
-        logger.info("Processing discount reports...")
-        navigator.navigate_to_payment_menu()
-        navigator.navigate_to_discount_detail()
-        navigator.set_discount_filter()
-        
-        # Process main discount table and detail reports
-        navigator.process_discount_report(str(excel_path))
-        logger.info("Completed processing discount reports")
-
-        # Process UCD payment detail
-        navigator.return_to_index()
-        navigator.navigate_to_payment_menu()
-        navigator.navigate_to_payment_detail()
-        navigator.set_payment_filter()
-        result = navigator.process_payment_detail(str(excel_path))
-        if result is None:
-            logger.info("No payment details found for the period")
-        else:
-            logger.info(f"Successfully processed {len(result)} payment details")
+        excel_path = excel_path or new_excel_path()
+        try:
+            run_stages(navigator, excel_path, stages, profiler=profiler, at_index=True, supervisor=supervisor,
+                       post_workers=config.get('post_process_workers', 2))
+        finally:
+            # The supervisor may have replaced a crashed browser
+            navigator = supervisor.navigator
 
         logger.info(f"All reports exported to {excel_path}")
         return navigator
 
     except Exception as e:
         logger.error(f"Error in automation: {str(e)}")
+        navigator.close()
         raise
+    finally:
+        metrics.log_summary()
+
+def account_slug(name):
+    """File-name safe version of an account name"""
+    return re.sub(r'[^\w.-]+', '_', name).strip('_') or 'account'
+
+def account_config(config, account):
+    """Configuration of one account: its credentials and its own session files"""
+    slug = account_slug(account['name'])
+    cookie_jar = Path(config['cookie_jar'])
+    inventory_db = Path(config['inventory_db'])
+    return dict(
+        config,
+        account=account['name'],
+        username=account['username'],
+        password=account['password'],
+        profile_dir=f"{config['profile_dir']}_{slug}",
+        report_cache_dir=f"{config['report_cache_dir']}_{slug}",
+        changes_dir=f"{config['changes_dir']}_{slug}",
+        cube_dir=f"{config['cube_dir']}_{slug}",
+        inventory_db=str(inventory_db.with_name(f"{inventory_db.stem}_{slug}{inventory_db.suffix}")),
+        cookie_jar=str(cookie_jar.with_name(f"{cookie_jar.stem}_{slug}{cookie_jar.suffix}"))
+    )
+
+def run_account(config, account, args):
+    """Run one account's reports into its own workbook
+    Returns:
+        (RunMetrics, CommandMetrics) of the account's run
+    """
+    settings = account_config(config, account)
+    if args.refresh and settings['report_cache']:
+        ReportCache(settings['report_cache_dir']).clear()
+    run_metrics = RunMetrics()
+    command_metrics = CommandMetrics()
+    excel_path = new_excel_path(f"_{account_slug(account['name'])}")
+    reports = resolve_reports(account['reports']) if account['reports'] else args.reports
+    sessions = max(1, min(args.sessions, config['sessions_per_account']))
+    logger.info(f"Starting account {account['name']}")
+    try:
+        lanes = plan(reports, lanes=sessions, cost_estimates=load_cost_estimates(settings))
+        if len(lanes) > 1:
+            perform_parallel_automation(settings, lanes, run_metrics=run_metrics, command_metrics=command_metrics,
+                                        period=args.period, excel_path=excel_path)
+        else:
+            navigator = perform_ucd_automation(settings, run_metrics=run_metrics, command_metrics=command_metrics,
+                                               reports=reports, period=args.period, excel_path=excel_path)
+            navigator.end_session()
+        run_metrics.finish(success=True)
+        logger.info(f"Account {account['name']} finished: {excel_path}")
+    except Exception as e:
+        logger.error(f"Account {account['name']} failed: {str(e)}")
+        run_metrics.finish(success=False)
+    write_changes(settings)
+    save_circuit_breakers(settings)
+    return run_metrics, command_metrics
+
+def run_accounts(config, args):
+    """Run several accounts concurrently and aggregate their metrics
+    At most [Accounts] max_concurrent accounts run at once, each with at most
+    sessions_per_account browser sessions.
+    Returns:
+        Exit code; 1 if any account failed
+    """
+    accounts = config['accounts']
+    if args.accounts != 'all':
+        known = {account['name'] for account in accounts}
+        unknown = set(args.accounts) - known
+        if unknown:
+            logger.error(f"Unknown account(s): {', '.join(sorted(unknown))}. Configured: {', '.join(sorted(known))}")
+            return 1
+        accounts = [account for account in accounts if account['name'] in args.accounts]
+    if not accounts:
+        logger.error("No [Account:<name>] sections in config.ini")
+        return 1
+
+    workers = max(1, config['max_concurrent_accounts'])
+    logger.info(f"Running {len(accounts)} account(s), {workers} at a time")
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(lambda account: run_account(config, account, args), accounts))
+
+    for account, (run_metrics, command_metrics) in zip(accounts, results):
+        slug = account_slug(account['name'])
+        metrics_dir = args.metrics_dir or config.get('metrics_dir')
+        if metrics_dir:
+            try:
+                write_textfile(metrics_dir, run_metrics, command_metrics, extra_labels={'account': account['name']},
+                               job=f"sales_data_automator_{slug}")
+            except Exception as e:
+                logger.warning(f"Skipping metrics export for {account['name']}: {str(e)}")
+        try:
+            PerfHistory(config.get('history_db') or DEFAULT_HISTORY_DB).record_run(
+                run_metrics, command_metrics, label=account['name'])
+        except Exception as e:
+            logger.warning(f"Skipping performance history for {account['name']}: {str(e)}")
+
+    log_run_summaries()
+    combined = RunMetrics.combine(run_metrics for run_metrics, _ in results)
+    # Same label set as the per-account files (node_exporter rejects mixed sets); exclude
+    # account="_all" when summing over accounts
+    export_run_metrics(config, args, combined, None, extra_labels={'account': '_all'})
+    failed = [account['name'] for account, (run_metrics, _) in zip(accounts, results) if not run_metrics.success]
+    logger.info(f"Accounts finished: {len(accounts) - len(failed)} succeeded, {len(failed)} failed"
+                + (f" ({', '.join(failed)})" if failed else ''))
+    return 1 if failed else 0
+
+def check_command_budget(metrics, args):
+    """Save or enforce the WebDriver round-trip budget
+    Returns:
+        True if the run is within budget (or no budget was requested)
+    """
+    if args.save_command_budget:
+        metrics.save_budget(args.save_command_budget)
+    if args.command_budget:
+        violations = metrics.check_budget(args.command_budget)
+        if violations:
+            logger.error("WebDriver command budget exceeded: " + '; '.join(violations))
+            return False
+        logger.info("WebDriver command counts within budget")
+    return True
+
+def parse_month(value):
+    """Parse a YYYY-MM (or YYYYMM) command line month into (year, month)"""
+    digits = value.replace('-', '').replace('/', '')
+    if len(digits) != 6 or not digits.isdigit() or not 1 <= int(digits[4:]) <= 12:
+        raise argparse.ArgumentTypeError(f"Invalid month '{value}', expected YYYY-MM")
+    return int(digits[:4]), int(digits[4:])
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Export UCD sales and inventory reports to Excel")
+    parser.add_argument('--reports', metavar='REPORTS',
+                        help=f"Comma-separated reports to run (default: all; reports: {', '.join(REPORTS)})")
+    parser.add_argument('--period', type=parse_month, metavar='YYYY-MM',
+                        help="Month to report on (default: each report's usual period, mostly the previous month)")
+    parser.add_argument('--from', dest='period_from', type=parse_month, metavar='YYYY-MM',
+                        help="First month of a reporting range")
+    parser.add_argument('--to', dest='period_to', type=parse_month, metavar='YYYY-MM',
+                        help="Last month of a reporting range; single-month reports use this month")
+    parser.add_argument('--accounts', nargs='?', const='all', metavar='NAMES',
+                        help="Run the [Account:<name>] accounts from config.ini concurrently, all or a "
+                             "comma-separated list; each account writes its own workbook")
+    parser.add_argument('--output', metavar='XLSX',
+                        help="Workbook to write (default: exports/sales_data_<timestamp>.xlsx); replaced if it exists")
+    parser.add_argument('--command-budget', metavar='JSON',
+                        help="Fail the run when any stage issues more WebDriver commands than this budget file allows")
+    parser.add_argument('--save-command-budget', metavar='JSON',
+                        help="Write this run's per-stage WebDriver command counts as a budget file")
+    parser.add_argument('--profile', nargs='?', const='all', metavar='STAGES',
+                        help="Profile CPU (cProfile) and memory (tracemalloc) for a comma-separated list of stages "
+                             f"or 'all' (stages: {', '.join(step_names())}); "
+                             "reports go to exports/profiles/<timestamp>/")
+    parser.add_argument('--sessions', type=int, default=1,
+                        help="Run the plan on this many parallel browser sessions (default: %(default)s)")
+    parser.add_argument('--compact', action='store_true',
+                        help="Compact extracted tables (categories, Arrow strings, downcast numbers) and log "
+                             "their memory before and after (overrides [Settings] compact_frames)")
+    parser.add_argument('--refresh', action='store_true',
+                        help="Discard cached results of unchanged reports and extract everything ([Cache] enabled)")
+    parser.add_argument('--metrics-dir', metavar='DIR',
+                        help="Write Prometheus textfile metrics to this directory (overrides [Metrics] textfile_dir)")
+
+    subparsers = parser.add_subparsers(dest='command')
+    report_parser = subparsers.add_parser(
+        'perf-report', help="Compare the latest run's stage timings with a rolling baseline")
+    report_parser.add_argument('--db', default=str(DEFAULT_HISTORY_DB),
+                               help="Performance history database (default: %(default)s)")
+    report_parser.add_argument('--window', type=int, default=10,
+                               help="Number of preceding successful runs in the baseline (default: %(default)s)")
+    report_parser.add_argument('--threshold', type=float, default=1.5,
+                               help="Flag stages slower than baseline by this factor (default: %(default)s)")
+    report_parser.add_argument('--label', default='',
+                               help="Series to compare, e.g. an account name from --accounts (default: runs without one)")
+
+    serve_parser = subparsers.add_parser(
+        'serve', help="Run a local daemon keeping logged-in browser sessions warm for report jobs")
+    serve_parser.add_argument('--port', type=int, help="TCP port on 127.0.0.1 (overrides [Daemon] port)")
+    serve_parser.add_argument('--sessions', type=int, help="Number of browser sessions (overrides [Daemon] sessions)")
+
+    history_parser = subparsers.add_parser(
+        'history', help="Load one sheet from many exported workbooks as a compact DataFrame")
+    history_parser.add_argument('sheet', help="Sheet to load, e.g. product_analysis")
+    history_parser.add_argument('workbooks', nargs='+', help="Exported workbooks, e.g. exports/sales_data_*.xlsx")
+    history_parser.add_argument('--save', metavar='FILE',
+                                help="Write the combined table as .parquet (needs pyarrow) or .pkl")
+    history_parser.add_argument('--no-compact', dest='compact', action='store_false',
+                                help="Keep pandas' default dtypes (to compare memory use)")
+
+    inventory_parser = subparsers.add_parser(
+        'inventory', help="Query the daily inventory history ([InventoryHistory] enabled)")
+    inventory_parser.add_argument('--db', default=str(DEFAULT_INVENTORY_DB),
+                                  help="Inventory history database (default: %(default)s)")
+    inventory_parser.add_argument('--at', metavar='YYYY-MM-DD', help="Print the stock of every product on this day")
+    inventory_parser.add_argument('--product', metavar='CODE', help="Print the stock history of one product")
+    inventory_parser.add_argument('--daily', action='store_true',
+                                  help="With --product, one row per recorded day instead of one per change")
+
+    query_parser = subparsers.add_parser(
+        'query', help="Serve the extracted reports from memory over a local HTTP/JSON API")
+    query_parser.add_argument('--port', type=int, help="TCP port on 127.0.0.1 (overrides [Query] port)")
+    query_parser.add_argument('--workbook', help="Workbook to index when there are no change snapshots "
+                                                 "(default: the newest export)")
+
+    cube_parser = subparsers.add_parser(
+        'cube', help="Look up the customer x product x month aggregates ([Cube] enabled)")
+    cube_parser.add_argument('level', choices=list(LEVELS), help="Rollup level")
+    cube_parser.add_argument('--dir', default=str(DEFAULT_CUBE_DIR), help="Cube directory (default: %(default)s)")
+    cube_parser.add_argument('--customer', metavar='CODE', help="Only this customer")
+    cube_parser.add_argument('--product', metavar='CODE', help="Only this product")
+    cube_parser.add_argument('--month', metavar='YYYYMM', help="Only this month")
+
+    args = parser.parse_args(argv)
+    if args.accounts:
+        if args.output or args.command_budget or args.save_command_budget or args.profile:
+            parser.error("--accounts cannot be combined with --output, --profile or command budgets")
+        if args.accounts != 'all':
+            args.accounts = [name.strip() for name in args.accounts.split(',') if name.strip()]
+    if args.profile and args.sessions > 1:
+        # cProfile and tracemalloc are per process; concurrent lanes would profile each other
+        parser.error("--profile needs a single session (--sessions 1)")
+    if args.reports:
+        try:
+            args.reports = resolve_reports([name.strip() for name in args.reports.split(',') if name.strip()])
+        except ValueError as e:
+            parser.error(str(e))
+
+    # Period as ((year, month), (end_year, end_month)); None keeps the report defaults
+    if args.period and (args.period_from or args.period_to):
+        parser.error("--period cannot be combined with --from/--to")
+    start = args.period or args.period_from or args.period_to
+    end = args.period or args.period_to or args.period_from
+    args.period = (start, end) if start else None
+    if args.period and end < start:
+        parser.error("--to must not be before --from")
+
+    if args.profile and args.profile != 'all':
+        stage_names = set(step_names())
+        args.profile = [name.strip() for name in args.profile.split(',') if name.strip()]
+        unknown = set(args.profile) - stage_names
+        if unknown:
+            parser.error(f"Unknown stage(s) for --profile: {', '.join(sorted(unknown))}")
+    return args
+
+def export_run_metrics(config, args, run_metrics, command_metrics, extra_labels=None):
+    """Write Prometheus textfile metrics if a metrics directory is configured"""
+    metrics_dir = args.metrics_dir or (config or {}).get('metrics_dir')
+    if not metrics_dir:
+        return
+    try:
+        write_textfile(metrics_dir, run_metrics, command_metrics, extra_labels=extra_labels)
+    except Exception as e:
+        # Metrics must never fail the nightly run itself
+        logger.warning(f"Skipping metrics export: {str(e)}")
+
+def record_perf_history(config, run_metrics, command_metrics):
+    """Append this run's stage timings to the performance history"""
+    try:
+        db_path = (config or {}).get('history_db') or DEFAULT_HISTORY_DB
+        PerfHistory(db_path).record_run(run_metrics, command_metrics)
+    except Exception as e:
+        logger.warning(f"Skipping performance history: {str(e)}")
+
+def perf_report(args):
+    """Print the regression report; returns 1 if any stage regressed"""
+    history = PerfHistory(args.db)
+    run_id, comparisons = history.compare_latest(window=args.window, threshold=args.threshold, label=args.label)
+    print(format_report(run_id, comparisons, args.threshold))
+    regressed = [c['stage'] for c in comparisons if c['regressed']]
+    if regressed:
+        logger.warning(f"Stages slower than x{args.threshold:g} baseline: {', '.join(regressed)}")
+        return 1
+    return 0
+
+def history(args):
+    """Load a report's history from exported workbooks and print its memory report"""
+    report = MemoryReport()
+    df = load_report_history(sorted(args.workbooks), args.sheet, compact=args.compact, memory_report=report)
+    if df.empty:
+        logger.error(f"No workbook has a sheet {args.sheet}")
+        return 1
+    print(f"{len(df)} rows from {df['source'].nunique()} workbook(s), {df.memory_usage(deep=True).sum():,} bytes")
+    if args.compact:
+        print(report.format())
+    if args.save:
+        save_path = Path(args.save)
+        if save_path.suffix == '.parquet':
+            df.to_parquet(save_path, index=False)
+        else:
+            df.to_pickle(save_path)
+        logger.info(f"History saved to {save_path}")
+    return 0
+
+def inventory(args):
+    """Print the inventory of a day or the history of one product"""
+    store = InventoryHistory(args.db)
+    days = store.days()
+    if not days:
+        logger.error(f"No inventory snapshots in {args.db}")
+        return 1
+    if args.product:
+        history = store.product_history(args.product, daily=args.daily)
+        if history.empty:
+            logger.error(f"Product {args.product} is not in the inventory history")
+            return 1
+        print(history.to_string())
+        return 0
+    state = store.state_at(args.at)
+    print(f"Inventory on {args.at or days[-1]} ({len(days)} recorded days from {days[0]}): "
+          f"{len(state)} products, {state['quantity'].sum():,} units, {state['amount'].sum():,.0f}")
+    print(state.to_string())
+    return 0
+
+def cube(args):
+    """Print the aggregates of one rollup level, optionally for one customer, product or month"""
+    keys = {dimension: getattr(args, dimension) for dimension in ('customer', 'product', 'month')
+            if getattr(args, dimension)}
+    try:
+        df = AggregateCube(args.dir).query(args.level, **keys)
+    except ValueError as e:
+        logger.error(str(e))
+        return 1
+    if df.empty:
+        logger.error(f"No {args.level} aggregates in {args.dir}" + (f" for {keys}" if keys else ""))
+        return 1
+    print(df.to_string())
+    return 0
+
+def query(args):
+    """Serve product, customer and period queries over the latest extracted reports"""
+    config = load_config()
+    inventory_history = InventoryHistory(config['inventory_db']) if config.get('inventory_history') else None
+    aggregate_cube = AggregateCube(config['cube_dir']) if config.get('aggregate_cube') else None
+
+    def load_index():
+        workbook = args.workbook or max((PROJECT_ROOT / 'exports').glob('sales_data_*.xlsx'), default=None)
+        return ReportIndex.load(Path(config['changes_dir']) / 'snapshots', workbook,
+                                inventory_history, aggregate_cube)
+
+    service = QueryService(load_index, port=args.port or config['query_port'])
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Query service stopped")
+    return 0
+
+def serve(args):
+    """Run the warm-session daemon until interrupted"""
+    config = load_config()
+    pool = SessionPool(
+        lambda slot: create_navigator(config, session=slot),
+        config['username'],
+        config['password'],
+        size=args.sessions or config['daemon_sessions']
+    )
+    daemon = NavigatorDaemon(
+        pool, lambda reports: lane_stages(plan(reports)[0]), list(REPORTS), new_excel_path, run_stages,
+        port=args.port or config['daemon_port'],
+        keepalive_seconds=config['daemon_keepalive']
+    )
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Navigator daemon stopped")
+    return 0
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == 'perf-report':
+        return perf_report(args)
+    if args.command == 'serve':
+        return serve(args)
+    if args.command == 'history':
+        return history(args)
+    if args.command == 'inventory':
+        return inventory(args)
+    if args.command == 'cube':
+        return cube(args)
+    if args.command == 'query':
+        return query(args)
+    if args.accounts:
+        try:
+            config = load_config()
+        except Exception:
+            return 1
+        config['compact_frames'] = config['compact_frames'] or args.compact
+        return run_accounts(config, args)
 
-def main():
     navigator = None
+    config = None
+    within_budget = True
+    run_metrics = RunMetrics()
+    command_metrics = CommandMetrics()
+    profiler = None
+    if args.profile:
+        profiler = StageProfiler(args.profile, Path(__file__).parent.parent / 'exports' / 'profiles')
     try:
         # Load configuration
         config = load_config()
+        config['compact_frames'] = config['compact_frames'] or args.compact
+        if args.refresh and config['report_cache']:
+            ReportCache(config['report_cache_dir']).clear()
+        
+        excel_path = None
+        if args.output:
+            output = Path(args.output).expanduser().resolve()
+            output.parent.mkdir(parents=True, exist_ok=True)
+            if output.exists():
+                logger.warning(f"Replacing existing workbook {output}")
+                output.unlink()
+            excel_path = str(output)
+        
+        # Plan the run; more than one session splits the reports into parallel lanes
+        lanes = plan(args.reports, lanes=args.sessions, cost_estimates=load_cost_estimates(config))
         
         # Perform automation
-        navigator = perform_ucd_automation(config)
+        if len(lanes) > 1:
+            # Each lane logs in, runs and ends its own session
+            perform_parallel_automation(config, lanes, run_metrics=run_metrics, command_metrics=command_metrics,
+                                        period=args.period, excel_path=excel_path)
+        else:
+            navigator = perform_ucd_automation(config, run_metrics=run_metrics, command_metrics=command_metrics,
+                                               profiler=profiler, reports=args.reports, period=args.period,
+                                               excel_path=excel_path)
+        run_metrics.finish(success=True)
+        within_budget = check_command_budget(command_metrics, args)
         
-        # Automatically logout and close browser
-        logger.info("Initiating logout sequence...")
-        navigator.logout_and_quit()  # This already includes closing the browser
-        logger.info("Successfully logged out and closed browser")
+        if navigator:
+            # Automatically logout (or keep the persistent session) and close browser
+            logger.info("Initiating logout sequence...")
+            navigator.end_session()  # This already includes closing the browser
+            logger.info("Successfully ended session and closed browser")
         
     except Exception as e:
         logger.error(f"Error in main execution: {str(e)}")
@@ -163,6 +847,16 @@ def main():
                 logger.info("Browser closed after error")
             except Exception as close_error:
                 logger.error(f"Error while closing browser: {str(close_error)}")
+        run_metrics.finish(success=False)
+        return 1
+    finally:
+        log_run_summaries()
+        export_run_metrics(config, args, run_metrics, command_metrics)
+        if config is not None:
+            write_changes(config)
+            save_circuit_breakers(config)
+            record_perf_history(config, run_metrics, command_metrics)
+    return 0 if within_budget else 1
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,166 @@
+# metrics_exporter.py
+import os
+import socket
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+from logger_config import logger
+
+METRIC_PREFIX = 'sales_data_automator'
+
+# Per-report counters and their Prometheus help text
+REPORT_FIELDS = {
+    'duration_seconds': 'Wall time spent on the report in the last run',
+    'rows': 'Rows extracted for the report in the last run',
+    'download_bytes': 'Bytes downloaded for the report in the last run',
+    'conversion_seconds': 'Time spent converting downloaded files for the report in the last run',
+    'retries': 'Retries issued for the report in the last run',
+    'failures': 'Failures of the report in the last run',
+}
+
+
+class RunMetrics:
+    """Collects per-report statistics of one automation run"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reports = defaultdict(lambda: dict.fromkeys(REPORT_FIELDS, 0))
+        self.started = time.time()
+        self.finished = None
+        self.success = False
+        self.workbook_path = None
+
+    @property
+    def current_report(self):
+        return getattr(self._local, 'report', None) or 'unassigned'
+
+    @contextmanager
+    def report(self, name):
+        """Time the block as report `name` and attribute counters recorded inside it"""
+        previous = getattr(self._local, 'report', None)
+        self._local.report = name
+        start = time.perf_counter()
+        try:
+            yield self
+        except Exception:
+            self.add('failures', 1, report=name)
+            raise
+        finally:
+            self.add('duration_seconds', time.perf_counter() - start, report=name)
+            self._local.report = previous
+
+    @contextmanager
+    def attribute(self, name):
+        """Attribute counters recorded inside the block to report `name` without timing it
+        (used by background workers finishing a report the browser already left)"""
+        previous = getattr(self._local, 'report', None)
+        self._local.report = name
+        try:
+            yield self
+        finally:
+            self._local.report = previous
+
+    def add(self, field, value, report=None):
+        """Add `value` to a per-report counter (defaults to the current report)"""
+        with self._lock:
+            self.reports[report or self.current_report][field] += value
+
+    def finish(self, success):
+        self.finished = time.time()
+        self.success = success
+
+    def workbook_size(self):
+        if self.workbook_path and os.path.exists(self.workbook_path):
+            return os.path.getsize(self.workbook_path)
+        return 0
+
+    @classmethod
+    def combine(cls, runs):
+        """Aggregate several runs (e.g. one per account) into one RunMetrics
+        Per-report counters are summed; the combined run spans all runs and only
+        succeeds if every run succeeded. The workbook size is not aggregated.
+        """
+        combined = cls()
+        runs = list(runs)
+        for run in runs:
+            for report, values in run.reports.items():
+                for field, value in values.items():
+                    combined.reports[report][field] += value
+        if runs:
+            combined.started = min(run.started for run in runs)
+            finished = [run.finished for run in runs if run.finished]
+            combined.finished = max(finished) if finished else None
+            combined.success = all(run.success for run in runs)
+        return combined
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def render_metrics(run_metrics, command_metrics=None, extra_labels=None):
+    """Render run statistics in the Prometheus text exposition format"""
+    base = dict(extra_labels or {})
+    lines = []
+
+    def metric(name, help_text, samples, metric_type='gauge'):
+        full_name = f"{METRIC_PREFIX}_{name}"
+        lines.append(f"# HELP {full_name} {help_text}")
+        lines.append(f"# TYPE {full_name} {metric_type}")
+        for labels, value in samples:
+            lines.append(f"{full_name}{_labels({**base, **labels})} {value}")
+
+    for field, help_text in REPORT_FIELDS.items():
+        samples = [({'report': report}, values[field]) for report, values in sorted(run_metrics.reports.items())]
+        if samples:
+            metric(f"report_{field}", help_text, samples)
+
+    finished = run_metrics.finished or time.time()
+    metric('run_duration_seconds', 'Wall time of the last run', [({}, finished - run_metrics.started)])
+    metric('run_success', '1 if the last run completed without errors', [({}, int(run_metrics.success))])
+    metric('run_last_timestamp_seconds', 'Unix time the last run finished', [({}, finished)])
+    metric('workbook_size_bytes', 'Size of the exported workbook', [({}, run_metrics.workbook_size())])
+
+    if command_metrics is not None:
+        samples = [({'stage': stage}, sum(commands.values()))
+                   for stage, commands in sorted(command_metrics.snapshot().items())]
+        if samples:
+            metric('webdriver_commands', 'WebDriver round trips issued per stage in the last run', samples)
+
+    return '\n'.join(lines) + '\n'
+
+
+def write_textfile(textfile_dir, run_metrics, command_metrics=None, extra_labels=None, job='sales_data_automator'):
+    """Atomically write a .prom file for node_exporter's textfile collector
+    Args:
+        textfile_dir: Directory watched by node_exporter (--collector.textfile.directory)
+        run_metrics: RunMetrics of the finished run
+        command_metrics: Optional CommandMetrics to include WebDriver round trips
+        extra_labels: Optional labels added to every sample
+        job: File name stem; one file per job keeps concurrent jobs apart
+    Returns:
+        Path to the written file
+    """
+    try:
+        directory = Path(textfile_dir)
+        directory.mkdir(parents=True, exist_ok=True)
+        target = directory / f"{job}.prom"
+        # node_exporter may read at any time; write a temp file and rename it into place
+        temp = directory / f".{job}.prom.{socket.gethostname()}.{os.getpid()}"
+        temp.write_text(render_metrics(run_metrics, command_metrics, extra_labels), encoding='utf-8')
+        os.replace(temp, target)
+        logger.info(f"Wrote Prometheus metrics to {target}")
+        return target
+    except Exception as e:
+        logger.error(f"Failed to write Prometheus metrics: {str(e)}")
+        raise
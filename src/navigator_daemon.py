@@ -0,0 +1,218 @@
+# navigator_daemon.py
+import json
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from selenium.common.exceptions import WebDriverException
+from logger_config import logger
+from metrics_exporter import RunMetrics
+
+
+class JobRequestError(ValueError):
+    """Raised for malformed job requests (HTTP 400)"""
+    pass
+
+
+class SessionPool:
+    """Pool of logged-in WebNavigator sessions kept warm between jobs"""
+
+    def __init__(self, navigator_factory, username, password, size=1):
+        """
+        Args:
+            navigator_factory: Callable(slot) returning a new, not yet logged-in WebNavigator;
+                               `slot` (0..size-1) keeps per-session files such as the browser profile apart
+            username: UCD username
+            password: UCD password
+            size: Number of browser sessions in the pool
+        """
+        self.navigator_factory = navigator_factory
+        self.username = username
+        self.password = password
+        self.size = size
+        # (slot, navigator) pairs; a rebuilt session keeps its slot
+        self._idle = queue.Queue()
+
+    def _new_session(self, slot):
+        navigator = self.navigator_factory(slot)
+        try:
+            navigator.ensure_logged_in(self.username, self.password)
+        except Exception:
+            navigator.close()
+            raise
+        return navigator
+
+    def _is_alive(self, navigator):
+        """True if the browser process still answers"""
+        if navigator.driver is None:
+            return False
+        try:
+            navigator.driver.current_url
+            return True
+        except WebDriverException:
+            return False
+
+    def _refresh(self, slot, navigator):
+        """Return a usable, logged-in session, rebuilding or re-logging in as needed"""
+        if not self._is_alive(navigator):
+            logger.warning("Browser session died; starting a new one")
+            navigator.close()
+            return self._new_session(slot)
+        if not navigator.is_session_valid():
+            logger.info("Session expired; logging in again")
+            navigator.ensure_logged_in(self.username, self.password)
+        return navigator
+
+    def start(self):
+        """Create and log in all sessions up front"""
+        for slot in range(self.size):
+            self._idle.put((slot, self._new_session(slot)))
+        logger.info(f"Session pool ready with {self.size} session(s)")
+
+    @contextmanager
+    def session(self, timeout=None):
+        """Borrow a logged-in navigator positioned on the member index page"""
+        slot, navigator = self._idle.get(timeout=timeout)
+        try:
+            navigator = self._refresh(slot, navigator)
+            yield navigator
+        finally:
+            self._idle.put((slot, navigator))
+
+    def keepalive(self):
+        """Touch every idle session so the server does not expire it"""
+        for _ in range(self._idle.qsize()):
+            try:
+                slot, navigator = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                navigator = self._refresh(slot, navigator)
+            except Exception as e:
+                logger.warning(f"Keepalive failed: {str(e)}")
+            finally:
+                self._idle.put((slot, navigator))
+
+    def status(self):
+        return {'size': self.size, 'idle': self._idle.qsize()}
+
+    def close(self):
+        while True:
+            try:
+                _, navigator = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            navigator.end_session()
+
+
+class NavigatorDaemon:
+    """Local HTTP API running report jobs on a warm SessionPool
+
+    POST /jobs  {"reports": ["inventory", ...]}  -> runs the reports, returns the workbook path
+    GET  /health                                  -> pool status
+    """
+
+    def __init__(self, pool, plan_stages, report_names, excel_path_factory, run_stages, host='127.0.0.1',
+                 port=8765, keepalive_seconds=300):
+        """
+        Args:
+            pool: SessionPool
+            plan_stages: Callable(report names) returning ordered (name, function) stages;
+                         raises ValueError for unknown reports
+            report_names: Names of all available reports
+            excel_path_factory: Callable(suffix) returning a new workbook path
+            run_stages: Callable(navigator, excel_path, stages) running stages into a workbook
+            host: Interface to bind; keep it on loopback, the API is unauthenticated
+            port: TCP port
+            keepalive_seconds: Interval between keepalive touches of idle sessions
+        """
+        self.pool = pool
+        self.plan_stages = plan_stages
+        self.report_names = report_names
+        self.excel_path_factory = excel_path_factory
+        self.run_stages = run_stages
+        self.keepalive_seconds = keepalive_seconds
+        self._stop = threading.Event()
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+
+    def run_job(self, job):
+        """Run one job and return its result dict"""
+        try:
+            selected = self.plan_stages(job.get('reports'))
+        except ValueError as e:
+            raise JobRequestError(str(e))
+
+        job_id = uuid.uuid4().hex[:8]
+        excel_path = self.excel_path_factory(f"_{job_id}")
+        start = time.perf_counter()
+        with self.pool.session() as navigator:
+            navigator.run_metrics = RunMetrics()
+            self.run_stages(navigator, excel_path, selected, at_index=True)
+            navigator.run_metrics.finish(success=True)
+            reports = {name: dict(values) for name, values in navigator.run_metrics.reports.items()}
+        return {
+            'job_id': job_id,
+            'excel_path': excel_path,
+            'stages': [name for name, _ in selected],
+            'duration_seconds': round(time.perf_counter() - start, 3),
+            'reports': reports,
+        }
+
+    def _handler_class(self):
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send(self, status, payload):
+                body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == '/health':
+                    self._send(200, {'status': 'ok', 'pool': daemon.pool.status(), 'reports': daemon.report_names})
+                else:
+                    self._send(404, {'error': 'not found'})
+
+            def do_POST(self):
+                if self.path != '/jobs':
+                    self._send(404, {'error': 'not found'})
+                    return
+                try:
+                    length = int(self.headers.get('Content-Length') or 0)
+                    try:
+                        job = json.loads(self.rfile.read(length) or b'{}')
+                    except ValueError as e:
+                        raise JobRequestError(f"Invalid JSON: {str(e)}")
+                    self._send(200, daemon.run_job(job))
+                except JobRequestError as e:
+                    self._send(400, {'error': str(e)})
+                except Exception as e:
+                    logger.error(f"Job failed: {str(e)}")
+                    self._send(500, {'error': str(e)})
+
+            def log_message(self, format, *args):
+                logger.info(f"daemon: {format % args}")
+
+        return Handler
+
+    def _keepalive_loop(self):
+        while not self._stop.wait(self.keepalive_seconds):
+            self.pool.keepalive()
+
+    def serve_forever(self):
+        self.pool.start()
+        threading.Thread(target=self._keepalive_loop, daemon=True).start()
+        host, port = self.server.server_address[:2]
+        logger.info(f"Navigator daemon listening on http://{host}:{port}")
+        try:
+            self.server.serve_forever()
+        finally:
+            self._stop.set()
+            self.server.server_close()
+            self.pool.close()
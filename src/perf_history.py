@@ -0,0 +1,194 @@
+# perf_history.py
+import sqlite3
+import statistics
+import time
+from contextlib import closing
+from pathlib import Path
+
+from logger_config import logger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started REAL NOT NULL,
+    finished REAL NOT NULL,
+    success INTEGER NOT NULL,
+    label TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS stage_stats (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    stage TEXT NOT NULL,
+    duration_seconds REAL NOT NULL,
+    rows INTEGER NOT NULL,
+    round_trips INTEGER NOT NULL,
+    failures INTEGER NOT NULL,
+    PRIMARY KEY (run_id, stage)
+);
+CREATE INDEX IF NOT EXISTS idx_runs_label ON runs(label, run_id);
+CREATE TABLE IF NOT EXISTS circuit_breakers (
+    label TEXT NOT NULL,
+    name TEXT NOT NULL,
+    failures INTEGER NOT NULL,
+    opened_at REAL,
+    PRIMARY KEY (label, name)
+);
+"""
+
+
+class PerfHistory:
+    """SQLite store of per-run stage timings, row counts and WebDriver round trips"""
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(str(self.db_path), timeout=30)
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    def record_run(self, run_metrics, command_metrics=None, label=''):
+        """Persist one run
+        Args:
+            run_metrics: RunMetrics of the finished run
+            command_metrics: Optional CommandMetrics for round-trip counts
+            label: Optional label separating independent series (e.g. account name)
+        Returns:
+            The new run id
+        """
+        round_trips = {}
+        if command_metrics is not None:
+            round_trips = {stage: sum(commands.values()) for stage, commands in command_metrics.snapshot().items()}
+
+        with closing(self._connect()) as conn, conn:
+            cursor = conn.execute(
+                "INSERT INTO runs (started, finished, success, label) VALUES (?, ?, ?, ?)",
+                (run_metrics.started, run_metrics.finished or time.time(), int(run_metrics.success), label)
+            )
+            run_id = cursor.lastrowid
+            conn.executemany(
+                "INSERT INTO stage_stats (run_id, stage, duration_seconds, rows, round_trips, failures) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (run_id, stage, values['duration_seconds'], int(values['rows']),
+                     round_trips.get(stage, 0), int(values['failures']))
+                    for stage, values in run_metrics.reports.items()
+                ]
+            )
+        logger.info(f"Recorded run {run_id} in performance history {self.db_path}")
+        return run_id
+
+    def load_breakers(self, label=''):
+        """Circuit breaker state of a series
+        Returns:
+            {report: (consecutive failures, wall-clock time the circuit opened or None)}
+        """
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT name, failures, opened_at FROM circuit_breakers WHERE label = ?", (label,)
+            ).fetchall()
+        return {name: (failures, opened_at) for name, failures, opened_at in rows}
+
+    def save_breakers(self, breakers, label=''):
+        """Persist circuit breakers ({report: CircuitBreaker}) so failures count across runs"""
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO circuit_breakers (label, name, failures, opened_at) VALUES (?, ?, ?, ?)",
+                [(label, name, breaker.failures, breaker.opened_at) for name, breaker in breakers.items()]
+            )
+
+    def stage_stats(self, run_id):
+        """Return {stage: row dict} for one run"""
+        with closing(self._connect()) as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute("SELECT * FROM stage_stats WHERE run_id = ?", (run_id,)).fetchall()
+        return {row['stage']: dict(row) for row in rows}
+
+    def latest_run(self, label=''):
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT run_id FROM runs WHERE label = ? ORDER BY run_id DESC LIMIT 1", (label,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def baseline_runs(self, before_run_id, window, label=''):
+        """Ids of the last `window` successful runs before `before_run_id`"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT run_id FROM runs WHERE label = ? AND success = 1 AND run_id < ? "
+                "ORDER BY run_id DESC LIMIT ?",
+                (label, before_run_id, window)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def stage_costs(self, window=10, label=''):
+        """Median duration per stage over the last `window` successful runs"""
+        latest = self.latest_run(label)
+        if latest is None:
+            return {}
+        samples = {}
+        for run_id in self.baseline_runs(latest + 1, window, label):
+            for stage, stats in self.stage_stats(run_id).items():
+                samples.setdefault(stage, []).append(stats['duration_seconds'])
+        return {stage: statistics.median(values) for stage, values in samples.items()}
+
+    def compare_latest(self, window=10, threshold=1.5, label=''):
+        """Compare the latest run with the median of the preceding successful runs
+        Args:
+            window: Number of preceding successful runs forming the baseline
+            threshold: Slowdown ratio above which a stage is flagged
+            label: Series to compare
+        Returns:
+            (run_id, list of per-stage comparison dicts) or (None, []) when there is no history
+        """
+        latest = self.latest_run(label)
+        if latest is None:
+            return None, []
+
+        baseline_ids = self.baseline_runs(latest, window, label)
+        baseline = {}
+        for run_id in baseline_ids:
+            for stage, stats in self.stage_stats(run_id).items():
+                baseline.setdefault(stage, []).append(stats)
+
+        comparisons = []
+        for stage, current in sorted(self.stage_stats(latest).items()):
+            history = baseline.get(stage, [])
+            entry = {
+                'stage': stage,
+                'duration': current['duration_seconds'],
+                'round_trips': current['round_trips'],
+                'rows': current['rows'],
+                'baseline_duration': None,
+                'baseline_round_trips': None,
+                'ratio': None,
+                'regressed': False,
+            }
+            if history:
+                entry['baseline_duration'] = statistics.median(h['duration_seconds'] for h in history)
+                entry['baseline_round_trips'] = statistics.median(h['round_trips'] for h in history)
+                if entry['baseline_duration'] > 0:
+                    entry['ratio'] = entry['duration'] / entry['baseline_duration']
+                    entry['regressed'] = entry['ratio'] > threshold
+            comparisons.append(entry)
+        return latest, comparisons
+
+
+def format_report(run_id, comparisons, threshold):
+    """Render compare_latest() output as a text table"""
+    if run_id is None:
+        return "No runs recorded yet"
+    lines = [
+        f"Run {run_id} vs rolling baseline (threshold x{threshold:g})",
+        f"{'stage':<20}{'seconds':>10}{'baseline':>10}{'ratio':>8}{'trips':>8}{'base':>8}{'rows':>8}  status",
+    ]
+    for c in comparisons:
+        baseline = f"{c['baseline_duration']:.1f}" if c['baseline_duration'] is not None else '-'
+        ratio = f"{c['ratio']:.2f}" if c['ratio'] is not None else '-'
+        base_trips = f"{c['baseline_round_trips']:.0f}" if c['baseline_round_trips'] is not None else '-'
+        status = 'SLOWER' if c['regressed'] else 'ok'
+        lines.append(f"{c['stage']:<20}{c['duration']:>10.1f}{baseline:>10}{ratio:>8}"
+                     f"{c['round_trips']:>8}{base_trips:>8}{c['rows']:>8}  {status}")
+    return '\n'.join(lines)
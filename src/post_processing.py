@@ -0,0 +1,59 @@
+# post_processing.py
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from logger_config import logger
+
+
+class PostProcessor:
+    """Background pool finishing reports while the browser moves on
+
+    The browser thread only fetches raw payloads (table rows, HTML, downloaded
+    files) and submits the rest of the report - parsing, dtype conversion,
+    file conversion and the workbook write - as a job. Jobs run concurrently;
+    workbook writes are serialized by the navigator's workbook lock.
+    """
+
+    def __init__(self, run_metrics, workers=2):
+        """
+        Args:
+            run_metrics: RunMetrics the jobs' counters are attributed to
+            workers: Number of worker threads
+        """
+        self.run_metrics = run_metrics
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='postprocess')
+        self._lock = threading.Lock()
+        self._pending = []
+
+    def submit(self, func, *args, **kwargs):
+        """Run func(*args, **kwargs) in the pool on behalf of the current report"""
+        report = self.run_metrics.current_report
+
+        def job():
+            with self.run_metrics.attribute(report):
+                return func(*args, **kwargs)
+
+        future = self._executor.submit(job)
+        with self._lock:
+            self._pending.append((report, future))
+        return future
+
+    def join(self):
+        """Wait for every submitted job
+        Returns:
+            List of report names whose post-processing failed
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+        failed = []
+        for report, future in pending:
+            error = future.exception()
+            if error is not None:
+                logger.error(f"Post-processing of {report} failed: {str(error)}")
+                self.run_metrics.add('failures', 1, report=report)
+                if report not in failed:
+                    failed.append(report)
+        return failed
+
+    def close(self):
+        self._executor.shutdown(wait=True)
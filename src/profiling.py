@@ -0,0 +1,78 @@
+# profiling.py
+import cProfile
+import io
+import pstats
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from logger_config import logger
+
+# Number of entries written to the text reports
+TOP_N = 30
+
+
+class StageProfiler:
+    """Runs cProfile and tracemalloc around selected pipeline stages"""
+
+    def __init__(self, stages, output_root):
+        """
+        Args:
+            stages: Iterable of stage names to profile, or None/'all' for every stage
+            output_root: Base directory; reports go to <output_root>/<timestamp>/
+        """
+        self.stages = None if stages in (None, 'all') else set(stages)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.output_dir = Path(output_root) / timestamp
+
+    def enabled_for(self, stage):
+        return self.stages is None or stage in self.stages
+
+    @contextmanager
+    def profile(self, stage):
+        """Profile the block as `stage` if it was selected"""
+        if not self.enabled_for(stage):
+            yield
+            return
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(25)
+        baseline = tracemalloc.take_snapshot()
+        if hasattr(tracemalloc, 'reset_peak'):  # Python 3.9+
+            tracemalloc.reset_peak()
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+            try:
+                self._dump(stage, profiler, baseline, snapshot, peak)
+            except Exception as e:
+                logger.warning(f"Failed to write profile for stage {stage}: {str(e)}")
+
+    def _dump(self, stage, profiler, baseline, snapshot, peak):
+        pstats_path = self.output_dir / f"{stage}.pstats"
+        profiler.dump_stats(str(pstats_path))
+
+        # Human readable CPU summary next to the raw stats
+        stream = io.StringIO()
+        stats = pstats.Stats(profiler, stream=stream)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP_N)
+        (self.output_dir / f"{stage}_cpu.txt").write_text(stream.getvalue(), encoding='utf-8')
+
+        # Allocations made during the stage that were still alive at its end
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        diff = snapshot.filter_traces(filters).compare_to(baseline.filter_traces(filters), 'lineno')
+        lines = [f"Stage: {stage}", f"Peak traced memory: {peak / 1024 / 1024:.1f} MiB", ""]
+        lines += [str(stat) for stat in diff[:TOP_N]]
+        (self.output_dir / f"{stage}_allocations.txt").write_text('\n'.join(lines) + '\n', encoding='utf-8')
+
+        logger.info(f"Profile for stage {stage} written to {pstats_path}")
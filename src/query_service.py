@@ -0,0 +1,285 @@
+# query_service.py
+import json
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import pandas as pd
+
+from aggregate_cube import REPORT_DIMENSIONS, key_column
+from change_capture import json_records
+from frame_compaction import compact_frame
+from logger_config import logger
+from report_registry import REPORTS
+from report_totals import total_mask
+
+PRODUCT_COLUMN = '貨物代碼'
+
+
+def _sheet_frame(raw):
+    """Table of an exported sheet: header is the first well-filled row, title rows are dropped"""
+    filled = raw.notna().sum(axis=1)
+    header = int(filled.ge(filled.max() / 2).idxmax())
+    df = raw.iloc[header + 1:].copy()
+    df.columns = [str(column) for column in raw.iloc[header]]
+    df = df[df.notna().sum(axis=1) > 1].reset_index(drop=True)
+    for column in df.columns:
+        converted = pd.to_numeric(df[column], errors='coerce')
+        if converted.notna().sum() == df[column].notna().sum():
+            df[column] = converted
+    return df
+
+
+def read_workbook(path):
+    """Frames of the registered reports found in an exported workbook, by report name"""
+    sheets = pd.read_excel(path, sheet_name=None, header=None, engine='openpyxl')
+    return {name: _sheet_frame(sheets[spec['sheet']]) for name, spec in REPORTS.items()
+            if spec['sheet'] in sheets and not sheets[spec['sheet']].empty}
+
+
+def read_snapshots(snapshots_dir):
+    """Frames of the last run's reports kept by ChangeCapture, by report name"""
+    return {path.stem: pd.read_pickle(path) for path in sorted(Path(snapshots_dir).glob('*.pkl'))
+            if path.stem in REPORTS}
+
+
+def _code_index(codes):
+    """{code: row positions} of a column of codes"""
+    codes = codes.astype(str).str.strip().reset_index(drop=True)
+    return codes.groupby(codes, sort=False).indices
+
+
+class ReportIndex:
+    """Extracted reports held in memory and indexed by product code, customer code and period
+
+    Product and customer lookups are dictionary hits on row positions built once at
+    load time; periods come from the aggregate cube and the inventory history,
+    whose tables are read once and kept in memory as well.
+    """
+
+    def __init__(self, frames, inventory_history=None, aggregate_cube=None, source=None):
+        """
+        Args:
+            frames: {report name: parsed DataFrame} of the latest extraction
+            inventory_history: Optional InventoryHistory (stock of the latest recorded day)
+            aggregate_cube: Optional AggregateCube (monthly 出量/退量/淨量)
+            source: Description of where the frames came from
+        """
+        self.source = source
+        self.loaded_at = datetime.now().isoformat(timespec='seconds')
+        self.frames = {}
+        self.products = {}
+        self.customers = {}
+        for name, df in frames.items():
+            labels = [column for column in df.columns if not pd.api.types.is_numeric_dtype(df[column])]
+            df = compact_frame(df[~total_mask(df, labels)].reset_index(drop=True))
+            self.frames[name] = df
+            if PRODUCT_COLUMN in df.columns:
+                self.products[name] = _code_index(df[PRODUCT_COLUMN])
+            elif REPORT_DIMENSIONS.get(name) == 'product':
+                self.products[name] = _code_index(df[key_column(df.columns)])
+            elif REPORT_DIMENSIONS.get(name) == 'customer':
+                self.customers[name] = _code_index(df[key_column(df.columns)])
+
+        self.stock = None
+        self.stock_day = None
+        if inventory_history is not None:
+            days = inventory_history.days()
+            if days:
+                self.stock_day = days[-1]
+                self.stock = inventory_history.state_at(self.stock_day)
+        self.cube = aggregate_cube
+        if aggregate_cube is not None:
+            # Read every level now so that no query touches the disk
+            for level in ('product_month', 'customer_month', 'customer_product_month', 'month'):
+                aggregate_cube.level(level)
+
+    @classmethod
+    def load(cls, snapshots_dir=None, workbook=None, inventory_history=None, aggregate_cube=None):
+        """Index the last run's report snapshots, or an exported workbook if there are none"""
+        frames, source = {}, None
+        if snapshots_dir is not None and Path(snapshots_dir).is_dir():
+            frames, source = read_snapshots(snapshots_dir), str(snapshots_dir)
+        if not frames and workbook is not None:
+            frames, source = read_workbook(workbook), str(workbook)
+        index = cls(frames, inventory_history, aggregate_cube, source)
+        logger.info(f"Query index loaded from {source}: " + ', '.join(
+            f"{name} ({len(df)} rows)" for name, df in index.frames.items()))
+        return index
+
+    def _rows(self, indexes, code):
+        """{report: rows} of the reports whose index has the code"""
+        rows = {}
+        for name, index in indexes.items():
+            positions = index.get(code)
+            if positions is not None:
+                rows[name] = json_records(self.frames[name].iloc[positions])
+        return rows
+
+    def _cube(self, level, **keys):
+        if self.cube is None:
+            return []
+        return json_records(self.cube.query(level, **{k: v for k, v in keys.items() if v}).reset_index())
+
+    def product(self, code, month=None):
+        """Stock, monthly 出量/退量/淨量, customers and report rows of one product, or None if unknown"""
+        result = {
+            'code': code,
+            'stock': None,
+            'monthly': self._cube('product_month', product=code, month=month),
+            'customers': self._cube('customer_product_month', product=code, month=month),
+            'reports': self._rows(self.products, code),
+        }
+        if self.stock is not None and code in self.stock.index:
+            row = self.stock.loc[code]
+            result['stock'] = {'day': self.stock_day, 'quantity': int(row['quantity']), 'amount': float(row['amount'])}
+        if result['stock'] is None and not result['monthly'] and not result['reports']:
+            return None
+        return result
+
+    def customer(self, code, month=None):
+        """Monthly 出量/退量/淨量, products and report rows of one customer, or None if unknown"""
+        result = {
+            'code': code,
+            'monthly': self._cube('customer_month', customer=code, month=month),
+            'products': self._cube('customer_product_month', customer=code, month=month),
+            'reports': self._rows(self.customers, code),
+        }
+        if not result['monthly'] and not result['reports']:
+            return None
+        return result
+
+    def period(self, month):
+        """Totals and per-product/per-customer aggregates of one month ('YYYYMM'), or None if unknown"""
+        totals = self._cube('month', month=month)
+        if not totals:
+            return None
+        return {
+            'month': month,
+            'totals': totals[0],
+            'products': self._cube('product_month', month=month),
+            'customers': self._cube('customer_month', month=month),
+        }
+
+    def report(self, name):
+        """All rows of one report (e.g. discounts, which are not broken down by product), or None"""
+        df = self.frames.get(name)
+        return None if df is None else {'report': name, 'rows': json_records(df)}
+
+    def status(self):
+        return {
+            'source': self.source,
+            'loaded_at': self.loaded_at,
+            'reports': {name: len(df) for name, df in self.frames.items()},
+            'products': len(set().union(*self.products.values())) if self.products else 0,
+            'stock_day': self.stock_day,
+            'months': sorted(self._cube_months()),
+        }
+
+    def _cube_months(self):
+        if self.cube is None or self.cube.level('month').empty:
+            return []
+        return [str(month) for month in self.cube.level('month').index]
+
+
+class QueryService:
+    """Local HTTP/JSON API answering product, customer and period questions from a ReportIndex
+
+    GET  /products/<code>[?month=YYYYMM]   -> stock, monthly in/out/returns, customers, report rows
+    GET  /customers/<code>[?month=YYYYMM]  -> monthly in/out/returns, products, report rows
+    GET  /periods/<YYYYMM>                 -> month totals by product and customer
+    GET  /reports/<name>                   -> all rows of a report (e.g. discounts)
+    GET  /health                           -> what is loaded
+    POST /reload                           -> reload the index after a run
+    """
+
+    def __init__(self, load_index, host='127.0.0.1', port=8766):
+        """
+        Args:
+            load_index: Callable returning a fresh ReportIndex
+            host: Interface to bind; keep it on loopback, the API is unauthenticated
+            port: TCP port
+        """
+        self.load_index = load_index
+        self.index = load_index()
+        self._reload_lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+
+    def reload(self):
+        """Build a new index and swap it in; queries keep using the old one until then"""
+        with self._reload_lock:
+            self.index = self.load_index()
+        return self.index.status()
+
+    def answer(self, path, query):
+        """(status, payload) for a GET request"""
+        parts = [unquote(part) for part in path.strip('/').split('/') if part]
+        month = query.get('month', [None])[0]
+        index = self.index
+        if parts == ['health']:
+            return 200, {'status': 'ok', **index.status()}
+        if len(parts) != 2:
+            return 404, {'error': 'not found'}
+        kind, key = parts
+        if kind == 'products':
+            result = index.product(key, month)
+        elif kind == 'customers':
+            result = index.customer(key, month)
+        elif kind == 'periods':
+            result = index.period(key)
+        elif kind == 'reports':
+            result = index.report(key)
+        else:
+            return 404, {'error': 'not found'}
+        if result is None:
+            return 404, {'error': f"{kind[:-1]} {key} not found"}
+        return 200, result
+
+    def _handler_class(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send(self, status, payload):
+                body = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                start = time.perf_counter()
+                url = urlsplit(self.path)
+                try:
+                    status, payload = service.answer(url.path, parse_qs(url.query))
+                except Exception as e:
+                    logger.error(f"Query {self.path} failed: {str(e)}")
+                    status, payload = 500, {'error': str(e)}
+                payload['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 3)
+                self._send(status, payload)
+
+            def do_POST(self):
+                if self.path != '/reload':
+                    self._send(404, {'error': 'not found'})
+                    return
+                try:
+                    self._send(200, service.reload())
+                except Exception as e:
+                    logger.error(f"Reload failed: {str(e)}")
+                    self._send(500, {'error': str(e)})
+
+            def log_message(self, format, *args):
+                logger.debug(f"query: {format % args}")
+
+        return Handler
+
+    def serve_forever(self):
+        host, port = self.server.server_address[:2]
+        logger.info(f"Query service listening on http://{host}:{port}")
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
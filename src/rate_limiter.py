@@ -0,0 +1,82 @@
+# rate_limiter.py
+import threading
+import time
+from contextlib import contextmanager
+
+from logger_config import logger
+
+
+class AdaptiveLimiter:
+    """Shared AIMD concurrency limit for requests sent to the UCD server
+
+    Every page load and form submit of every session takes a slot. The limit
+    grows by one slot per window of fast responses (additive increase) and is
+    halved when a response is slower than the target latency or fails
+    (multiplicative decrease), so concurrent sessions settle at the highest
+    rate the server tolerates.
+    """
+
+    def __init__(self, initial=2, minimum=1, maximum=8, target_latency=3.0):
+        """
+        Args:
+            initial: Concurrent requests allowed at start
+            minimum: Lower bound of the limit
+            maximum: Upper bound of the limit
+            target_latency: Seconds; slower responses count as congestion
+        """
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        # Back off at most once per target_latency so one burst of slow
+        # responses does not collapse the limit to the minimum
+        self._last_decrease = 0.0
+        self.stats = {'requests': 0, 'errors': 0, 'slow': 0, 'decreases': 0, 'wait_seconds': 0.0}
+
+    @property
+    def slots(self):
+        return max(self.minimum, int(self.limit))
+
+    @contextmanager
+    def request(self):
+        """Hold a request slot for the block and feed its latency back into the limit"""
+        wait_start = time.perf_counter()
+        with self._condition:
+            while self._in_flight >= self.slots:
+                self._condition.wait()
+            self._in_flight += 1
+            self.stats['wait_seconds'] += time.perf_counter() - wait_start
+        start = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._release(time.perf_counter() - start, failed)
+
+    def _release(self, latency, failed):
+        with self._condition:
+            self._in_flight -= 1
+            self.stats['requests'] += 1
+            if failed or latency > self.target_latency:
+                self.stats['errors' if failed else 'slow'] += 1
+                now = time.monotonic()
+                if now - self._last_decrease >= self.target_latency:
+                    self._last_decrease = now
+                    self.limit = max(float(self.minimum), self.limit / 2)
+                    self.stats['decreases'] += 1
+                    logger.debug(f"Rate limit decreased to {self.slots} "
+                                 f"({'error' if failed else f'{latency:.1f}s response'})")
+            else:
+                self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+    def log_summary(self):
+        stats = self.stats
+        logger.info(f"Rate limiter: {stats['requests']} requests, limit now {self.slots}, "
+                    f"{stats['slow']} slow, {stats['errors']} failed, {stats['decreases']} decreases, "
+                    f"{stats['wait_seconds']:.1f}s waited for a slot")
@@ -0,0 +1,65 @@
+# report_cache.py
+import hashlib
+import json
+import os
+import pickle
+from datetime import datetime
+from pathlib import Path
+
+from logger_config import logger
+
+
+def fingerprint(probe):
+    """Stable hash of a probe result (any JSON-serializable value)"""
+    return hashlib.sha256(json.dumps(probe, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class ReportCache:
+    """Raw payloads of reports that may change within a period, keyed by a cheap fingerprint
+
+    Before a report is fetched, a probe reads a fingerprint of the result page
+    (row count, footer row, hash of the table text) in one round trip. If it
+    equals the fingerprint stored with the previous payload, that payload is
+    reused and the full extraction is skipped. One entry is kept per key.
+    """
+
+    def __init__(self, root):
+        """
+        Args:
+            root: Directory holding one <key>.pkl file per cached report
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key):
+        return self.root / f"{key}.pkl"
+
+    def get(self, key, probe):
+        """Cached payload for `key` if it was stored with the same probe result, else None"""
+        try:
+            with open(self._path(key), 'rb') as f:
+                entry = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            entry = None
+        if entry is None or entry.get('fingerprint') != fingerprint(probe):
+            return None
+        logger.info(f"{key} unchanged since {entry['saved_at']}; reusing the cached result")
+        return entry['payload']
+
+    def put(self, key, probe, payload):
+        """Store the payload fetched for a probe result (written atomically)"""
+        entry = {
+            'fingerprint': fingerprint(probe),
+            'saved_at': datetime.now().isoformat(timespec='seconds'),
+            'payload': payload,
+        }
+        target = self._path(key)
+        tmp_path = target.with_suffix('.tmp')
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, target)
+
+    def clear(self):
+        """Forget every cached payload"""
+        for path in self.root.glob('*.pkl'):
+            path.unlink(missing_ok=True)
@@ -0,0 +1,374 @@
+# report_registry.py
+from logger_config import logger
+from report_schemas import SCHEMAS
+from report_views import derive_view
+
+# Declarative description of every report the pipeline can produce, in
+# pipeline order. Each entry names:
+#   navigate:      WebNavigator methods that open the report's page from the member index
+#   filter:        WebNavigator method submitting the filter form (+ filter_args)
+#   filter_fields: form fields the filter sets, for reference and planning
+#   extract:       WebNavigator method returning a DataFrame (or (DataFrame, title))
+#                  that is written with export_to_excel to `sheet`
+#   fetch/parse:   the two halves of `extract`: fetch reads the raw payload in the
+#                  browser, parse(*payload) builds the DataFrame and may run in the background
+#   probe:         optional WebNavigator method fingerprinting the result page; with a
+#                  ReportCache the fetch is skipped while the fingerprint is unchanged
+#   record:        optional WebNavigator method receiving the parsed DataFrame and the report
+#                  name (e.g. to keep history)
+#   process:       alternatively, a WebNavigator method taking (excel_path, **process_args)
+#                  that extracts and writes the report itself
+#   sheet:         output sheet name
+#   period:        what the filter period means for this report
+#                  ('snapshot', 'month', 'month_range', 'week_range', 'date_range', 'settlement_month')
+#   group:         reports of one group share navigation and run as a single plan step
+#   default_cost:  rough seconds, used until the performance history has real timings
+REPORTS = {
+    'inventory': {
+        'navigate': ['navigate_to_inventory'],
+        'filter_fields': [],
+        'extract': 'extract_inventory_table',
+        'fetch': 'fetch_inventory_table',
+        'parse': 'parse_inventory_table',
+        'probe': 'probe_inventory_table',
+        'record': 'record_inventory_snapshot',
+        'sheet': 'inventory',
+        'period': 'snapshot',
+        'default_cost': 10,
+    },
+    'monthly_supply': {
+        'navigate': ['navigate_to_monthly_supply'],
+        'filter': 'set_monthly_supply_filter',
+        'filter_fields': ['p_year', 'p_period'],
+        'extract': 'extract_monthly_supply_table',
+        'fetch': 'fetch_monthly_supply_table',
+        'parse': 'parse_monthly_supply_table',
+        'sheet': 'monthly_supply',
+        'period': 'month',
+        'default_cost': 15,
+    },
+    'customer_analysis': {
+        'navigate': ['navigate_to_analysis_report'],
+        'filter': 'set_analysis_report_filter',
+        'filter_args': {'filter_type': 'customer'},
+        'filter_fields': ['b_ym', 'e_ym', 'acc_code', 'acc_cat1'],
+        'extract': 'extract_analysis_table',
+        'fetch': 'fetch_analysis_table',
+        'parse': 'parse_analysis_table',
+        'record': 'record_analysis',
+        'sheet': 'customer_analysis',
+        'period': 'month_range',
+        'group': 'analysis',
+        'default_cost': 20,
+    },
+    'product_analysis': {
+        'navigate': ['navigate_to_analysis_report'],
+        'filter': 'set_analysis_report_filter',
+        'filter_args': {'filter_type': 'product'},
+        'filter_fields': ['b_ym', 'e_ym', 'stk_c', 'acc_cat'],
+        'extract': 'extract_analysis_table',
+        'fetch': 'fetch_analysis_table',
+        'parse': 'parse_analysis_table',
+        'record': 'record_analysis',
+        'sheet': 'product_analysis',
+        'period': 'month_range',
+        'group': 'analysis',
+        'default_cost': 20,
+    },
+    'sum_by_week': {
+        'process': 'process_summary_report',
+        'process_args': {'report_type': 'sum_by_week'},
+        'filter_fields': ['mas_date_b', 'mas_date_e'],
+        'sheet': 'Weekly Summary',
+        'period': 'week_range',
+        'default_cost': 20,
+    },
+    'sum_by_week_customer': {
+        'process': 'process_summary_report',
+        'process_args': {'report_type': 'sum_by_week_customer'},
+        'filter_fields': ['mas_date_b', 'mas_date_e'],
+        'sheet': 'Weekly Customer Summary',
+        'period': 'week_range',
+        'default_cost': 20,
+    },
+    'sum_by_month': {
+        'process': 'process_summary_report',
+        'process_args': {'report_type': 'sum_by_month'},
+        'filter_fields': ['ym_b', 'ym_e'],
+        'sheet': 'Monthly Summary',
+        'period': 'month_range',
+        'default_cost': 20,
+    },
+    'sum_by_month_customer': {
+        'process': 'process_summary_report',
+        'process_args': {'report_type': 'sum_by_month_customer'},
+        'filter_fields': ['ym_b', 'ym_e'],
+        'sheet': 'Monthly Customer Summary',
+        'period': 'month_range',
+        'default_cost': 20,
+    },
+    'purchase_orders': {
+        'process': 'process_order_report',
+        'process_args': {'order_type': 'GR'},
+        'filter_fields': ['mas_code', 'date1', 'date2'],
+        'sheet': 'Purchase Orders',
+        'period': 'date_range',
+        'default_cost': 15,
+    },
+    'return_orders': {
+        'process': 'process_order_report',
+        'process_args': {'order_type': 'RNS'},
+        'filter_fields': ['mas_code', 'date1', 'date2'],
+        'sheet': 'Return Orders',
+        'period': 'date_range',
+        'default_cost': 15,
+    },
+    'discounts': {
+        'navigate': ['navigate_to_payment_menu', 'navigate_to_discount_detail'],
+        'filter': 'set_discount_filter',
+        'filter_fields': ['period'],
+        'process': 'process_discount_report',
+        'sheet': 'Discount Details',
+        'period': 'settlement_month',
+        'default_cost': 30,
+    },
+    'payment_detail': {
+        'navigate': ['navigate_to_payment_menu', 'navigate_to_payment_detail'],
+        'filter': 'set_payment_filter',
+        'filter_fields': ['date1', 'date2'],
+        'process': 'process_payment_detail',
+        'sheet': 'Payment Details',
+        'period': 'date_range',
+        'default_cost': 15,
+    },
+}
+
+# Groups whose reports can be derived from one combined fetch:
+#   filter_args: filter arguments requesting the breakdown by every dimension
+#   sum:         additive columns, summed when rolling up to a report's dimensions
+#   rates:       percentage columns recomputed from the sums, {column: (numerator, denominator)}
+#   record:      optional WebNavigator method receiving the combined DataFrame and {report: headers}
+# The columns of every report are learned from one ordinary run (ViewHeaders).
+COMBINED_GROUPS = {
+    'analysis': {
+        'filter_args': {'filter_type': 'all'},
+        'sum': SCHEMAS['analysis']['totals'],
+        'rates': {'退率': ('退量', '出量')},
+        'record': 'record_analysis_breakdown',
+    },
+}
+
+
+def export_report(navigator, excel_path, name, payload):
+    """Parse a fetched payload and write the report's sheet (post-processing half of run_report)"""
+    spec = REPORTS[name]
+    result = getattr(navigator, spec['parse'])(*payload)
+    df, title = result if isinstance(result, tuple) else (result, None)
+    if navigator.view_headers is not None and spec.get('group') in COMBINED_GROUPS:
+        navigator.view_headers.record(name, df.columns)
+    navigator.capture_changes(df, name)
+    if spec.get('record'):
+        getattr(navigator, spec['record'])(df, name)
+    navigator.export_to_excel(navigator.compact(df, name), spec['sheet'], title=title, excel_path=excel_path)
+
+
+def export_views(navigator, excel_path, group, views):
+    """Derive each report of a group from the combined breakdown and write its sheet"""
+    combined = COMBINED_GROUPS[group]
+    for name, (df, headers) in views.items():
+        view = derive_view(df, headers, combined['sum'], combined['rates'])
+        navigator.capture_changes(view, name)
+        navigator.export_to_excel(navigator.compact(view, name), REPORTS[name]['sheet'], excel_path=excel_path)
+    if combined.get('record') and views:
+        df = next(iter(views.values()))[0]
+        getattr(navigator, combined['record'])(df, {name: headers for name, (_, headers) in views.items()})
+
+
+def run_combined(navigator, excel_path, group, reports, period=None):
+    """Produce the reports of a group from a single fetch broken down by every dimension
+    Only used when the navigator has ViewHeaders and the headers of every report
+    are known; if the combined table lacks a report's columns, the reports are
+    fetched one by one.
+    Returns:
+        True if the reports were produced (their export may still be running in the
+        background), False if the caller should run them one by one
+    """
+    combined = COMBINED_GROUPS.get(group)
+    if combined is None or navigator.view_headers is None or len(reports) < 2:
+        return False
+    headers = {name: navigator.view_headers.get(name) for name in reports}
+    if not all(headers.values()):
+        logger.info(f"{group}: fetching each report once to learn its columns")
+        return False
+
+    spec = REPORTS[reports[0]]
+    for method in spec.get('navigate', []):
+        getattr(navigator, method)()
+    getattr(navigator, spec['filter'])(**combined['filter_args'], **period_kwargs(reports[0], period))
+    df = getattr(navigator, spec['parse'])(*getattr(navigator, spec['fetch'])())
+    missing = {name: [column for column in columns if column not in df.columns and column not in combined['rates']]
+               for name, columns in headers.items()}
+    if any(missing.values()):
+        logger.warning(f"{group}: combined report lacks columns {missing}; fetching each report")
+        # The filter form is on the result page, so the reports need no navigation
+        for name in reports:
+            run_report(navigator, excel_path, name, navigate=False, period=period)
+        return True
+    logger.info(f"{group}: deriving {', '.join(reports)} from one report of {len(df)} rows")
+    navigator.defer(export_views, navigator, excel_path, group, {name: (df, headers[name]) for name in reports})
+    return True
+
+
+def period_kwargs(name, period=None):
+    """Translate a requested period into filter keyword arguments for a report
+    Args:
+        name: Report name in REPORTS
+        period: ((year, month), (end_year, end_month)) or None for the report's default period
+    Returns:
+        Dict of year/month (and end_year/end_month for range reports)
+    """
+    if not period:
+        return {}
+    (year, month), (end_year, end_month) = period
+    kind = REPORTS[name]['period']
+    if kind == 'snapshot':
+        logger.info(f"{name} is a current snapshot; ignoring the requested period")
+        return {}
+    if kind in ('month', 'settlement_month'):
+        if (year, month) != (end_year, end_month):
+            logger.warning(f"{name} covers a single month; using {end_year}/{end_month:02d}")
+        return {'year': end_year, 'month': end_month}
+    return {'year': year, 'month': month, 'end_year': end_year, 'end_month': end_month}
+
+
+def run_report(navigator, excel_path, name, navigate=True, period=None):
+    """Run one registered report into the workbook
+    Args:
+        navigator: WebNavigator on the member index page (or on the report page if navigate=False)
+        excel_path: Workbook to write to
+        name: Report name in REPORTS
+        navigate: False when a previous report of the same group already opened the page
+        period: Optional ((year, month), (end_year, end_month)); default is the report's usual period
+    """
+    spec = REPORTS[name]
+    # The period goes to the filter form; reports without a separate filter set it while processing
+    filter_period = period_kwargs(name, period)
+    if navigate:
+        for method in spec.get('navigate', []):
+            getattr(navigator, method)()
+    if spec.get('filter'):
+        getattr(navigator, spec['filter'])(**spec.get('filter_args', {}), **filter_period)
+        filter_period = {}
+    if spec.get('process'):
+        getattr(navigator, spec['process'])(excel_path, **spec.get('process_args', {}), **filter_period)
+        return
+    if spec.get('fetch'):
+        # Only the fetch needs the browser; parsing and export can overlap the next report
+        fetch = getattr(navigator, spec['fetch'])
+        if spec.get('probe'):
+            payload = navigator.cached_fetch(name, getattr(navigator, spec['probe']), fetch)
+        else:
+            payload = fetch()
+        navigator.defer(export_report, navigator, excel_path, name, payload)
+        return
+    result = getattr(navigator, spec['extract'])()
+    df, title = result if isinstance(result, tuple) else (result, None)
+    navigator.capture_changes(df, name)
+    if spec.get('record'):
+        getattr(navigator, spec['record'])(df, name)
+    navigator.export_to_excel(navigator.compact(df, name), spec['sheet'], title=title, excel_path=excel_path)
+
+
+def resolve_reports(names=None):
+    """Validate report names and return them in pipeline order
+    Raises:
+        ValueError for unknown names
+    """
+    if not names:
+        return list(REPORTS)
+    unknown = [name for name in names if name not in REPORTS]
+    if unknown:
+        raise ValueError(f"Unknown report(s): {', '.join(unknown)}. Available: {', '.join(REPORTS)}")
+    return [name for name in REPORTS if name in names]
+
+
+def build_steps(names=None, cost_estimates=None):
+    """Group reports into plan steps; reports of one group become a single step
+    Args:
+        names: Report names (default: all)
+        cost_estimates: Optional {step name: seconds} from the performance history
+    Returns:
+        List of step dicts with 'name', 'reports' and estimated 'cost'
+    """
+    cost_estimates = cost_estimates or {}
+    steps = []
+    for name in resolve_reports(names):
+        group = REPORTS[name].get('group')
+        if group and steps and steps[-1]['group'] == group:
+            steps[-1]['reports'].append(name)
+        else:
+            steps.append({'name': name, 'group': group, 'reports': [name]})
+    for step in steps:
+        # A step with a whole group is named after the group, a lone report after itself
+        group = step['group']
+        if group and len(step['reports']) == sum(1 for spec in REPORTS.values() if spec.get('group') == group):
+            step['name'] = group
+        default = sum(REPORTS[name]['default_cost'] for name in step['reports'])
+        step['cost'] = cost_estimates.get(step['name'], default)
+    return steps
+
+
+def step_names():
+    """Names of every possible plan step (reports and whole groups)"""
+    names = list(REPORTS)
+    for spec in REPORTS.values():
+        if spec.get('group') and spec['group'] not in names:
+            names.append(spec['group'])
+    return names
+
+
+def plan(names=None, lanes=1, cost_estimates=None):
+    """Compile a report subset into an execution plan
+    Args:
+        names: Report names (default: all)
+        lanes: Number of browser sessions that can run in parallel
+        cost_estimates: Optional {step name: seconds} from the performance history
+    Returns:
+        List of lanes, each an ordered list of steps. Steps are assigned
+        longest-first to the least loaded lane, which keeps the slowest lane
+        (the wall time of the run) short; each lane keeps pipeline order.
+    """
+    steps = build_steps(names, cost_estimates)
+    if lanes <= 1 or len(steps) <= 1:
+        return [steps]
+
+    order = {step['name']: index for index, step in enumerate(steps)}
+    loads = [[0.0, []] for _ in range(min(lanes, len(steps)))]
+    for step in sorted(steps, key=lambda s: s['cost'], reverse=True):
+        lane = min(loads, key=lambda entry: entry[0])
+        lane[0] += step['cost']
+        lane[1].append(step)
+    plan_lanes = [sorted(lane_steps, key=lambda s: order[s['name']]) for _, lane_steps in loads]
+    logger.info("Execution plan: " + ' | '.join(
+        f"lane {i + 1} (~{sum(s['cost'] for s in lane):.0f}s): {', '.join(s['name'] for s in lane)}"
+        for i, lane in enumerate(plan_lanes)
+    ))
+    return plan_lanes
+
+
+def lane_stages(lane, period=None):
+    """Turn a plan lane into (name, function) stages for main.run_stages
+    Args:
+        lane: Ordered steps of one plan lane
+        period: Optional ((year, month), (end_year, end_month)) for every report
+    """
+    stages = []
+    for step in lane:
+        def run_step(navigator, excel_path, reports=tuple(step['reports']), group=step['group']):
+            if group and run_combined(navigator, excel_path, group, reports, period):
+                return
+            for index, name in enumerate(reports):
+                # Reports of a group share the page opened by the first one
+                run_report(navigator, excel_path, name, navigate=index == 0, period=period)
+        stages.append((step['name'], run_step))
+    return stages
@@ -0,0 +1,138 @@
+# report_schemas.py
+import pandas as pd
+
+from logger_config import logger
+
+# Column types of the scraped reports. Kinds:
+#   int:      counts and quantities -> nullable Int32
+#   float:    small decimals such as prices -> float32
+#   money:    amounts -> float64 (float32 would round large totals)
+#   percent:  '12.5%' -> float32
+#   date:     datetime64, trying each of `date_formats` in turn
+#   category: repeated labels such as product codes and titles
+#   string:   free text, missing values become ''
+# `fill_empty` replaces empty cells of numeric columns before parsing.
+# `totals` lists the columns the site sums in its 合計 row (checked by report_totals).
+# Duplicate headers are named the way pandas deduplicates them ('退量', '退量.1', ...).
+SCHEMAS = {
+    'inventory': {
+        'columns': {
+            '庫存量': 'int',
+            '庫存額': 'money',
+            '定價': 'float',
+            '安全存量': 'int',
+        },
+    },
+    'monthly_supply': {
+        'columns': {
+            '貨物代碼': 'category',
+            '書名': 'category',
+            '發書日': 'date',
+            '定價': 'float',
+            '系列編號': 'string',
+            '存量': 'int',
+            '存額': 'money',
+            '月進量': 'int',
+            '退量': 'int',
+            '進淨量': 'int',
+            '出量': 'int',
+            '退量.1': 'int',
+            '出淨量': 'int',
+            '年進量': 'int',
+            '退量.2': 'int',
+            '進淨量.1': 'int',
+            '出量.1': 'int',
+            '退量.3': 'int',
+            '出淨量.1': 'int',
+        },
+        'totals': ['存量', '存額', '月進量', '退量', '進淨量', '出量', '退量.1', '出淨量',
+                   '年進量', '退量.2', '進淨量.1', '出量.1', '退量.3', '出淨量.1'],
+    },
+    'analysis': {
+        'columns': {
+            '出量': 'int',
+            '退量': 'int',
+            '淨量': 'int',
+            '退率': 'percent',
+        },
+        'fill_empty': 0,
+        'totals': ['出量', '退量', '淨量'],
+    },
+    'payment_detail': {
+        'columns': {
+            '金額': 'money',
+            '日期': 'date',
+            '到期日': 'date',
+        },
+        'date_formats': ['%Y%m%d', '%Y/%m/%d'],
+    },
+    'discounts': {
+        'columns': {
+            '日期': 'date',
+            '折讓類別': 'category',
+            '折讓金額': 'money',
+        },
+        'date_formats': ['%Y/%m/%d'],
+        'totals': ['折讓金額'],
+    },
+}
+
+NUMERIC_DTYPES = {
+    'int': 'Int32',
+    'float': 'float32',
+    'money': 'float64',
+    'percent': 'float32',
+}
+
+
+def _parse_dates(series, formats):
+    if not formats:
+        return pd.to_datetime(series, errors='coerce')
+    parsed = pd.to_datetime(series, format=formats[0], errors='coerce')
+    for date_format in formats[1:]:
+        missing = parsed.isna() & series.notna()
+        if not missing.any():
+            break
+        parsed = parsed.fillna(pd.to_datetime(series.where(missing), format=date_format, errors='coerce'))
+    return parsed
+
+
+def apply_schema(df, report):
+    """Convert the columns of a scraped report to the dtypes declared in SCHEMAS
+    Numeric columns are cleaned (thousands separators, % signs, empty cells)
+    and parsed as one block; unparseable values become missing.
+    Args:
+        df: DataFrame with the report's raw (mostly string) columns
+        report: Key of SCHEMAS
+    Returns:
+        The converted DataFrame
+    """
+    schema = SCHEMAS[report]
+    columns = {name: kind for name, kind in schema['columns'].items() if name in df.columns}
+
+    numeric = [name for name, kind in columns.items() if kind in NUMERIC_DTYPES]
+    if numeric:
+        raw = df[numeric]
+        block = raw.astype(str).replace([r',', r'%$'], '', regex=True).apply(lambda column: column.str.strip())
+        block = block.where(raw.notna())
+        if 'fill_empty' in schema:
+            block = block.replace('', schema['fill_empty']).fillna(schema['fill_empty'])
+        block = block.apply(pd.to_numeric, errors='coerce')
+        # Casting to Int32 fails on fractions; counts never have any, so round stray float noise
+        ints = [name for name in numeric if columns[name] == 'int']
+        if ints:
+            block[ints] = block[ints].round()
+        df[numeric] = block.astype({name: NUMERIC_DTYPES[columns[name]] for name in numeric})
+
+    for name, kind in columns.items():
+        if kind == 'date':
+            df[name] = _parse_dates(df[name], schema.get('date_formats'))
+        elif kind == 'category':
+            df[name] = df[name].fillna('').astype(str).astype('category')
+        elif kind == 'string':
+            df[name] = df[name].fillna('').astype(str)
+
+    missing = set(schema['columns']) - set(df.columns)
+    if missing:
+        logger.debug(f"{report}: schema columns not in table: {', '.join(sorted(missing))}")
+    return df
@@ -0,0 +1,78 @@
+# report_totals.py
+import re
+
+import pandas as pd
+
+from logger_config import logger
+from report_schemas import SCHEMAS
+
+# Labels of the site's total rows, compared with all whitespace removed ('合  計' -> '合計')
+TOTAL_LABELS = ('合計', '總計')
+
+# Allowed difference between a computed and a site total: the larger of an absolute
+# margin (amounts are shown rounded) and a share of the site total
+ABSOLUTE_TOLERANCE = 1.0
+RELATIVE_TOLERANCE = 0.001
+
+
+class TotalsMismatchError(ValueError):
+    """The rows of an extracted report do not add up to the site's total row (e.g. a truncated table)"""
+
+
+def is_total_label(text):
+    """True if a cell text labels a total row"""
+    return re.sub(r'\s+', '', str(text)) in TOTAL_LABELS
+
+
+def total_row_frame(cells, label_column, value_columns):
+    """One-row DataFrame of a total row the site shows outside the report table
+    Args:
+        cells: Cell texts of the row, label cell first
+        label_column: Column receiving the label
+        value_columns: Columns of the remaining cells, in order; missing cells stay empty
+    Returns:
+        DataFrame of text values, to be converted with the report's schema
+    """
+    row = {label_column: TOTAL_LABELS[0]}
+    row.update(zip(value_columns, cells[1:]))
+    return pd.DataFrame([row])
+
+
+def total_mask(df, columns):
+    """Boolean Series marking total rows: any of `columns` holds a total label"""
+    if not columns:
+        return pd.Series(False, index=df.index)
+    labels = df[columns].astype(str).replace(r'\s+', '', regex=True)
+    return labels.isin(TOTAL_LABELS).any(axis=1)
+
+
+def validate_totals(df, report):
+    """Check the site's total row of a report against totals computed from its rows
+    The sum columns are declared as `totals` in SCHEMAS; all other columns are searched
+    for the total label. Rows labelled as totals are excluded from the sums and the last
+    one is compared, so a table cut short by a slow page fails here instead of downstream.
+    Args:
+        df: Report DataFrame after apply_schema, including the site's total row(s)
+        report: Key of SCHEMAS
+    Returns:
+        Series of the computed totals
+    Raises:
+        TotalsMismatchError if a computed total differs from the site's beyond the tolerance
+    """
+    columns = [name for name in SCHEMAS[report].get('totals', []) if name in df.columns]
+    mask = total_mask(df, [name for name in df.columns if name not in columns])
+    computed = df.loc[~mask, columns].sum()
+    if not mask.any():
+        logger.debug(f"{report}: no total row on the site; {mask.size} rows not validated")
+        return computed
+
+    site = df.loc[mask, columns].iloc[-1].astype('float64')
+    difference = (computed.astype('float64') - site).abs()
+    allowed = (site.abs() * RELATIVE_TOLERANCE).clip(lower=ABSOLUTE_TOLERANCE)
+    # Cells the site leaves empty cannot be checked
+    mismatched = (difference > allowed) & site.notna()
+    if mismatched.any():
+        details = ', '.join(f"{name} {computed[name]:,.2f} vs {site[name]:,.2f}" for name in mismatched[mismatched].index)
+        raise TotalsMismatchError(f"{report}: {int((~mask).sum())} rows do not add up to the site's total ({details})")
+    logger.debug(f"{report}: totals of {int((~mask).sum())} rows match the site")
+    return computed
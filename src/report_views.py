@@ -0,0 +1,78 @@
+# report_views.py
+import json
+import os
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+from logger_config import logger
+from report_totals import TOTAL_LABELS, total_mask
+
+
+class ViewHeaders:
+    """Column headers of each report as the site last returned them, kept in a JSON file
+
+    A view derived from a combined fetch must have exactly the columns of the
+    report the site would have produced, which are only known after the report
+    has been fetched once on its own.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path: JSON file holding {report name: [headers]}
+        """
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        try:
+            self._headers = json.loads(self.path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            self._headers = {}
+
+    def get(self, name):
+        """Headers recorded for a report, or None"""
+        with self._lock:
+            return self._headers.get(name)
+
+    def record(self, name, headers):
+        """Remember a report's headers (written atomically when they change)"""
+        headers = [str(header) for header in headers]
+        with self._lock:
+            if self._headers.get(name) == headers:
+                return
+            self._headers[name] = headers
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix('.tmp')
+            tmp_path.write_text(json.dumps(self._headers, indent=2, ensure_ascii=False), encoding='utf-8')
+            os.replace(tmp_path, self.path)
+        logger.debug(f"Recorded headers of {name}: {headers}")
+
+
+def derive_view(df, headers, sum_columns, rates=None):
+    """Roll a finer-grained report up to the dimensions of another
+    Args:
+        df: Parsed report broken down by all dimensions, including the site's total row
+        headers: Columns of the wanted view; those not in sum_columns/rates are its dimensions
+        sum_columns: Additive columns, summed per group
+        rates: Optional {column: (numerator, denominator)} percentages recomputed from the sums
+    Returns:
+        DataFrame with the view's columns in order, groups in order of first appearance,
+        and a 合計 row at the end
+    """
+    rates = rates or {}
+    dimensions = [name for name in headers if name not in sum_columns and name not in rates]
+    missing = [name for name in headers if name not in df.columns and name not in rates]
+    if missing:
+        raise KeyError(f"columns missing from the combined report: {', '.join(missing)}")
+
+    rows = df[~total_mask(df, [name for name in df.columns if name not in sum_columns and name not in rates])]
+    view = rows.groupby(dimensions, sort=False, dropna=False, observed=True)[list(sum_columns)].sum().reset_index()
+    total = {dimensions[0]: TOTAL_LABELS[0], **view[list(sum_columns)].sum().to_dict()}
+    view = pd.concat([view, pd.DataFrame([total])], ignore_index=True)
+
+    for column, (numerator, denominator) in rates.items():
+        denominators = view[denominator].astype('float64')
+        share = view[numerator].astype('float64') / denominators * 100
+        view[column] = share.where(denominators != 0).round(2).astype('float32')
+    return view[headers]
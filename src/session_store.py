@@ -0,0 +1,85 @@
+# session_store.py
+import json
+import os
+from pathlib import Path
+
+from logger_config import logger
+
+# Environment variable that may hold the Fernet key instead of a key file
+KEY_ENV_VAR = 'SDA_SESSION_KEY'
+
+
+class SessionStore:
+    """Encrypted on-disk cookie jar for reusing an authenticated UCD session"""
+
+    def __init__(self, jar_path, key_path=None):
+        """
+        Args:
+            jar_path: File holding the encrypted cookies
+            key_path: File holding the Fernet key; created on first use when
+                      SDA_SESSION_KEY is not set. Defaults to <jar_path>.key
+        """
+        self.jar_path = Path(jar_path)
+        self.key_path = Path(key_path) if key_path else self.jar_path.with_suffix('.key')
+        self._fernet = None
+
+    def _get_fernet(self):
+        if self._fernet is None:
+            try:
+                from cryptography.fernet import Fernet
+            except ImportError:
+                raise ImportError("Persistent sessions require the 'cryptography' package: pip install cryptography")
+
+            key = os.environ.get(KEY_ENV_VAR)
+            if key:
+                key = key.encode()
+            elif self.key_path.exists():
+                key = self.key_path.read_bytes().strip()
+            else:
+                key = Fernet.generate_key()
+                self.key_path.parent.mkdir(parents=True, exist_ok=True)
+                # Create the key file readable by the owner only
+                fd = os.open(str(self.key_path), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+                with os.fdopen(fd, 'wb') as key_file:
+                    key_file.write(key)
+                logger.info(f"Created session key at {self.key_path}")
+            self._fernet = Fernet(key)
+        return self._fernet
+
+    def save(self, cookies):
+        """Encrypt and store a list of WebDriver cookie dicts"""
+        try:
+            token = self._get_fernet().encrypt(json.dumps(cookies).encode('utf-8'))
+            self.jar_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = self.jar_path.with_suffix('.tmp')
+            fd = os.open(str(temp_path), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'wb') as jar:
+                jar.write(token)
+            os.replace(temp_path, self.jar_path)
+            logger.info(f"Saved {len(cookies)} session cookies")
+        except Exception as e:
+            logger.error(f"Failed to save session cookies: {str(e)}")
+            raise
+
+    def load(self):
+        """Return the stored cookies, or an empty list if there is no usable jar"""
+        if not self.jar_path.exists():
+            return []
+        try:
+            from cryptography.fernet import InvalidToken
+            try:
+                data = self._get_fernet().decrypt(self.jar_path.read_bytes())
+            except InvalidToken:
+                logger.warning("Stored session could not be decrypted; a full login is required")
+                return []
+            return json.loads(data.decode('utf-8'))
+        except Exception as e:
+            logger.warning(f"Failed to load session cookies: {str(e)}")
+            return []
+
+    def clear(self):
+        """Forget the stored session"""
+        try:
+            self.jar_path.unlink()
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,160 @@
+# session_watchdog.py
+import random
+import time
+
+from selenium.common.exceptions import (
+    StaleElementReferenceException,
+    TimeoutException,
+    WebDriverException,
+)
+from logger_config import logger
+
+# Failures worth a retry: waits that timed out, stale DOM references and
+# driver/browser errors. Anything else (bad data, missing options) is a bug
+# that retrying will not fix.
+TRANSIENT_ERRORS = (TimeoutException, StaleElementReferenceException, WebDriverException)
+
+
+class CircuitOpenError(Exception):
+    """Raised when a report's circuit breaker is open and the step is skipped"""
+    pass
+
+
+class StepFailedError(Exception):
+    """Raised when a step still fails after all retries"""
+    pass
+
+
+class CircuitBreaker:
+    """Stops retrying a report that keeps failing until a cool-down has passed
+
+    Failures count across runs when the state is persisted (see
+    PerfHistory.save_breakers), so `opened_at` is wall-clock time.
+    """
+
+    def __init__(self, failure_threshold=3, reset_seconds=600, failures=0, opened_at=None):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = failures
+        self.opened_at = opened_at
+
+    def allow(self):
+        if self.opened_at is None:
+            return True
+        if time.time() - self.opened_at >= self.reset_seconds:
+            # Half-open: let one attempt through
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.time()
+
+
+class SessionSupervisor:
+    """Runs pipeline steps, repairing the browser session and retrying only the failing step"""
+
+    def __init__(self, navigator, navigator_factory, username, password, max_attempts=3,
+                 base_delay=2.0, max_delay=30.0, breaker_threshold=3, breaker_reset_seconds=600,
+                 breakers=None):
+        """
+        Args:
+            navigator: Logged-in WebNavigator to supervise
+            navigator_factory: Callable(command_metrics=, run_metrics=) building a fresh WebNavigator
+            username: UCD username for re-login
+            password: UCD password for re-login
+            max_attempts: Attempts per step, including the first
+            base_delay: Backoff before the first retry in seconds; doubles per retry
+            max_delay: Upper bound of the backoff
+            breaker_threshold: Consecutive failed steps that open a report's circuit
+            breaker_reset_seconds: Cool-down before an open circuit lets a step through again
+            breakers: Optional dict of CircuitBreaker shared between supervisors (lanes, runs)
+        """
+        self.navigator = navigator
+        self.navigator_factory = navigator_factory
+        self.username = username
+        self.password = password
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset_seconds = breaker_reset_seconds
+        self.breakers = breakers if breakers is not None else {}
+
+    def _breaker(self, name):
+        # setdefault is atomic, so supervisors of concurrent lanes share one breaker per report
+        return self.breakers.setdefault(name, CircuitBreaker(self.breaker_threshold, self.breaker_reset_seconds))
+
+    def _driver_alive(self):
+        if self.navigator.driver is None:
+            return False
+        try:
+            self.navigator.driver.current_url
+            return True
+        except WebDriverException:
+            return False
+
+    def _rebuild(self):
+        """Replace a crashed browser with a new, logged-in one"""
+        old = self.navigator
+        old.close()
+        self.navigator = self.navigator_factory(command_metrics=old.command_metrics, run_metrics=old.run_metrics)
+        self.navigator.ensure_logged_in(self.username, self.password)
+
+    def recover(self):
+        """Bring the session back to a logged-in state after a failure"""
+        if not self._driver_alive():
+            logger.warning("Browser is not responding; starting a new session")
+            self._rebuild()
+            return
+        try:
+            valid = self.navigator.is_session_valid()
+        except WebDriverException:
+            valid = False
+        if not valid:
+            logger.warning("Session expired; logging in again")
+            self.navigator.login(self.username, self.password)
+            if self.navigator.session_store:
+                self.navigator.save_session()
+
+    def run_step(self, name, func):
+        """Run `func(navigator, attempt)` with recovery and exponential backoff
+        Args:
+            name: Report/stage name, used for logging and the circuit breaker
+            func: Step callable; it must be safe to rerun from the member index page
+        Returns:
+            Whatever func returns
+        Raises:
+            CircuitOpenError if the report's circuit is open
+            StepFailedError if all attempts failed with transient errors
+        """
+        breaker = self._breaker(name)
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {name}; skipping")
+
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                result = func(self.navigator, attempt)
+                breaker.record_success()
+                return result
+            except TRANSIENT_ERRORS as e:
+                logger.warning(f"Step {name} failed on attempt {attempt}/{self.max_attempts}: "
+                               f"{type(e).__name__}: {str(e).splitlines()[0] if str(e) else ''}")
+                if attempt == self.max_attempts:
+                    breaker.record_failure()
+                    raise StepFailedError(f"Step {name} failed after {attempt} attempts") from e
+                self.navigator.run_metrics.add('retries', 1, report=name)
+                delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+                time.sleep(delay * random.uniform(0.8, 1.2))
+                try:
+                    self.recover()
+                except Exception as recover_error:
+                    logger.error(f"Session recovery failed: {str(recover_error)}")
+            except Exception:
+                breaker.record_failure()
+                raise
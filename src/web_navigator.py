@@ -3,12 +3,12 @@ from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import Select
 from selenium.common.exceptions import TimeoutException
 from selenium.common.exceptions import StaleElementReferenceException
 from logger_config import logger
 from datetime import datetime
 import pandas as pd
+import io
 import os
 import time
 import openpyxl
@@ -20,21 +20,125 @@ from selenium.webdriver.chrome.options import Options
 import subprocess
 from pathlib import Path
 import calendar
+import threading
+from contextlib import contextmanager
+from driver_metrics import CommandMetrics, instrument_driver
+from metrics_exporter import RunMetrics
+from dom_waits import DomWaiter
+from form_filler import FormFiller, select_field, checkbox_field, text_field
+from conversion_pool import ConversionPool
+from download_sandbox import DownloadSandbox
+from report_schemas import SCHEMAS, apply_schema
+from report_totals import is_total_label, total_row_frame, validate_totals
+from frame_compaction import compact_report
+from aggregate_cube import key_column
+
+# Cell texts of the last row containing a 合計 cell, or null
+SUMMARY_ROW_JS = """
+var rows = Array.prototype.filter.call(document.getElementsByTagName('tr'), function (row) {
+    return Array.prototype.some.call(row.children, function (cell) {
+        // Own text only, like XPath text(), so rows wrapping a nested table do not match
+        return cell.tagName === 'TD' && Array.prototype.some.call(cell.childNodes, function (node) {
+            return node.nodeType === 3 && /合\\s*計/.test(node.nodeValue);
+        });
+    });
+});
+if (!rows.length) { return null; }
+return Array.prototype.filter.call(rows[rows.length - 1].children, function (cell) {
+    return cell.tagName === 'TD';
+}).map(function (cell) { return cell.innerText.trim(); });
+"""
+
+# Row count, last row text and a 32-bit FNV-1a hash of the whole text of a table,
+# computed in the browser so only a few bytes cross the wire
+TABLE_FINGERPRINT_JS = """
+var table = arguments[0], text = table.textContent, hash = 0x811c9dc5;
+for (var i = 0; i < text.length; i++) {
+    hash ^= text.charCodeAt(i);
+    hash = Math.imul(hash, 0x01000193) >>> 0;
+}
+var rows = table.rows, last = rows.length ? rows[rows.length - 1].textContent : '';
+return [rows.length, last.replace(/\\s+/g, ' ').trim(), hash];
+"""
+
+# Snapshot of a table in one round trip: per row the <td> texts (a cell spanning n
+# columns gives its text plus n-1 empty strings) and the row's first link.
+# A row whose first cell has the total colour arguments[1] is labelled 合計.
+TABLE_ROWS_JS = """
+var table = arguments[0], totalColor = arguments[1];
+return Array.prototype.map.call(table.rows, function (row) {
+    var cells = [], link = row.querySelector('a');
+    Array.prototype.forEach.call(row.cells, function (cell, index) {
+        if (cell.tagName !== 'TD') { return; }
+        var text = cell.innerText.trim();
+        if (index === 0 && totalColor && cell.getAttribute('bgcolor') === totalColor) { text = '合計'; }
+        cells.push(text);
+        for (var i = 1; i < cell.colSpan; i++) { cells.push(''); }
+    });
+    return {cells: cells, link: link ? {text: link.innerText.trim(), href: link.href} : null};
+});
+"""
 
 
 class WebNavigator:
-    def __init__(self, timeout=30):
-        """Initialize WebNavigator with directories setup"""
+    # How long to wait for a result tab before concluding a report has no data
+    NO_DATA_GRACE_SECONDS = 5
+
+    def __init__(self, timeout=30, command_metrics=None, run_metrics=None, profile_dir=None, session_store=None,
+                 conversion_workers=2, rate_limiter=None, memory_report=None, view_headers=None,
+                 report_cache=None, change_capture=None, inventory_history=None, aggregate_cube=None):
+        """Initialize WebNavigator with directories setup
+        Args:
+            timeout: Default wait timeout in seconds
+            command_metrics: Optional CommandMetrics collecting WebDriver round trips
+            run_metrics: Optional RunMetrics collecting per-report statistics
+            profile_dir: Optional persistent Chrome profile directory (keeps the HTTP cache between runs)
+            session_store: Optional SessionStore used to reuse a logged-in session
+            conversion_workers: Maximum number of concurrent LibreOffice conversions
+            rate_limiter: Optional AdaptiveLimiter shared by all sessions talking to the server
+            memory_report: Optional MemoryReport; if set, extracted tables are compacted
+                (categories, Arrow strings, downcast numbers) and their memory recorded
+            view_headers: Optional ViewHeaders; if set, report groups that support it are
+                fetched once and their reports derived locally (see report_registry.run_combined)
+            report_cache: Optional ReportCache; if set, reports with a probe are only fetched
+                when their fingerprint changed since the cached result
+            change_capture: Optional ChangeCapture receiving the final frame of every report
+            inventory_history: Optional InventoryHistory recording each run's inventory as a daily snapshot
+            aggregate_cube: Optional AggregateCube updated with every single-month analysis report
+        """
         self.timeout = timeout
+        self.session_store = session_store
+        self.command_metrics = command_metrics or CommandMetrics()
+        self.run_metrics = run_metrics or RunMetrics()
+        self.memory_report = memory_report
+        self.view_headers = view_headers
+        self.report_cache = report_cache
+        self.change_capture = change_capture
+        self.inventory_history = inventory_history
+        self.aggregate_cube = aggregate_cube
+        # (start, end) months ('YYYYMM') of the last analysis filter
+        self.analysis_period = None
+        
+        # Optional PostProcessor finishing reports off the browser thread
+        self.post_processor = None
+        # Workbook writes may come from post-processing workers; one writer at a time
+        self._workbook_lock = threading.RLock()
+        # Downloads are converted in the background while the browser moves on
+        self.conversions = ConversionPool(conversion_workers)
+        # (downloaded file, conversion future) of the discount detail files
+        self.pending_discount_files = []
         
         # Setup directories using Path
         self._project_root = Path(__file__).parent.parent
         self._exports_dir = self._project_root / 'exports'
-        self._downloads_dir = self._exports_dir / 'downloads'
         
         # Create necessary directories
         self._exports_dir.mkdir(exist_ok=True)
-        self._downloads_dir.mkdir(exist_ok=True)
+        
+        # Every session downloads into its own sandbox below exports/downloads, so
+        # concurrent runs and files left by a crashed run never mix
+        self.downloads = DownloadSandbox(self._exports_dir / 'downloads')
+        self._downloads_dir = self.downloads.path
         
         # Store string versions for JSON-serializable contexts
         self.project_root = str(self._project_root)
@@ -61,6 +165,20 @@ class WebNavigator:
             }
         }
         
+        # Order report configurations
+        self.order_configs = {
+            'GR': {
+                'sheet_name': 'Purchase Orders',
+                'description': 'purchase',
+                'report': 'purchase_orders'
+            },
+            'RNS': {
+                'sheet_name': 'Return Orders',
+                'description': 'return',
+                'report': 'return_orders'
+            }
+        }
+        
         logger.info(f"Downloads directory set to: {self.downloads_dir}")
         
         try:
@@ -74,15 +192,78 @@ class WebNavigator:
                 'safebrowsing.enabled': True
             })
             
+            # Persistent profile so static assets stay cached between runs
+            if profile_dir:
+                Path(profile_dir).mkdir(parents=True, exist_ok=True)
+                chrome_options.add_argument(f"--user-data-dir={Path(profile_dir).resolve()}")
+                logger.info(f"Using persistent browser profile: {profile_dir}")
+            
             # Initialize Chrome WebDriver with options
             self.driver = webdriver.Chrome(options=chrome_options)
+            instrument_driver(self.driver, self.command_metrics, rate_limiter=rate_limiter)
             self.driver.maximize_window()
             self.wait = WebDriverWait(self.driver, timeout)
+            self.dom = DomWaiter(self.driver, timeout)
+            self.forms = FormFiller(self.driver)
+            self._window_handles_before_submit = None
             
         except Exception as e:
             logger.error(f"Failed to initialize WebNavigator: {str(e)}")
             raise
 
+    def defer(self, func, *args, **kwargs):
+        """Run post-processing in the background if a PostProcessor is attached, else inline"""
+        if self.post_processor is None:
+            return func(*args, **kwargs)
+        return self.post_processor.submit(func, *args, **kwargs)
+
+    def compact(self, df, report):
+        """Compact an extracted table if compaction is enabled, recording its memory under `report`"""
+        if self.memory_report is None:
+            return df
+        return compact_report(df, report, self.memory_report)
+
+    def capture_changes(self, df, report):
+        """Hand a report's final frame to the ChangeCapture, if change capture is enabled"""
+        if self.change_capture is not None:
+            self.change_capture.capture(report, df)
+
+    def cached_fetch(self, key, probe, fetch):
+        """Fetch a report unless its fingerprint matches the cached result
+        Args:
+            key: Cache key of the report
+            probe: Callable returning the page's fingerprint (one cheap round trip)
+            fetch: Callable reading the full payload
+        Returns:
+            The fetched or cached payload
+        """
+        if self.report_cache is None:
+            return fetch()
+        probe_result = probe()
+        payload = self.report_cache.get(key, probe_result)
+        if payload is None:
+            payload = fetch()
+            self.report_cache.put(key, probe_result, payload)
+        return payload
+
+    def probe_table(self, locator):
+        """Fingerprint of the table at `locator`: row count, last row and a hash of its text"""
+        table = self.wait.until(EC.presence_of_element_located(locator))
+        return self.driver.execute_script(TABLE_FINGERPRINT_JS, table)
+
+    def convert_download(self, file_path):
+        """Submit a downloaded xls file to the conversion pool
+        Returns:
+            Future resolving to the converted xlsx path
+        """
+        report = self.run_metrics.current_report
+
+        def job():
+            with self.run_metrics.attribute(report):
+                return self.process_downloaded_excel(file_path)
+
+        return self.conversions.submit(job)
+
     def _get_downloads_path(self) -> Path:
         """Get downloads directory as Path object"""
         return Path(self.downloads_dir)
@@ -151,6 +332,60 @@ class WebNavigator:
             self.save_screenshot("login_failure")
             raise
 
+    def ensure_logged_in(self, username, password):
+        """Reuse the stored session if it is still valid, otherwise perform a full login"""
+        if self.session_store and self.restore_session():
+            logger.info("Reusing saved session")
+            return
+        self.login(username, password)
+        if self.session_store:
+            self.save_session()
+
+    def restore_session(self):
+        """Load stored cookies and check that they still authenticate
+        Returns:
+            True if the member page is reachable without logging in
+        """
+        try:
+            cookies = self.session_store.load()
+            if cookies:
+                # Cookies can only be set for the domain currently loaded
+                self.driver.get(URLConfig.BASE_URL)
+                for cookie in cookies:
+                    try:
+                        self.driver.add_cookie(cookie)
+                    except Exception as e:
+                        logger.debug(f"Skipping cookie {cookie.get('name')}: {str(e)}")
+            if self.is_session_valid():
+                return True
+            logger.info("Saved session expired; logging in again")
+            self.session_store.clear()
+            return False
+        except Exception as e:
+            logger.warning(f"Could not restore session: {str(e)}")
+            return False
+
+    def is_session_valid(self):
+        """Cheap session check: load the member page and look for the logout link"""
+        self.driver.get(URLConfig.get_full_url(URLConfig.MEMBER_PATH))
+        return self.is_logged_in()
+
+    def save_session(self):
+        """Store the current cookies for the next run"""
+        try:
+            self.session_store.save(self.driver.get_cookies())
+        except Exception as e:
+            # Losing the session only costs a login next time
+            logger.warning(f"Could not save session: {str(e)}")
+
+    def end_session(self):
+        """Finish the run: keep a persistent session alive, otherwise log out"""
+        if self.session_store:
+            self.save_session()
+            self.close()
+        else:
+            self.logout_and_quit()
+
     def return_to_index(self):
         """Return to the member index page"""
         try:
@@ -198,6 +433,20 @@ class WebNavigator:
             logger.error(f"Failed to generate filter dates: {str(e)}")
             raise
 
+    def filter_range_generator(self, year=None, month=None, end_year=None, end_month=None):
+        """Generate start and end month values for reports filtered by a month range
+        Returns:
+            (start, end) dicts as returned by filter_month_generator; without an
+            end month the range is the single start month
+        """
+        start = self.filter_month_generator(year, month)
+        if end_year is None and end_month is None:
+            return start, start
+        end = self.filter_month_generator(end_year, end_month)
+        if end['combined'] < start['combined']:
+            raise ValueError(f"Period end {end['combined']} is before its start {start['combined']}")
+        return start, end
+
     def navigate_to_inventory(self):
         """Navigate to the inventory page after login"""
         try:
@@ -225,6 +474,22 @@ class WebNavigator:
 
     def extract_inventory_table(self):
         """Extract data from the inventory table"""
+        return self.parse_inventory_table(*self.fetch_inventory_table())
+
+    def probe_inventory_table(self):
+        """Fingerprint of the inventory table (see cached_fetch)"""
+        return self.probe_table((By.CLASS_NAME, "dataGrid"))
+
+    def record_inventory_snapshot(self, df, report='inventory'):
+        """Add a parsed inventory report to the inventory history, if one is configured"""
+        if self.inventory_history is not None:
+            self.inventory_history.record(df)
+
+    def fetch_inventory_table(self):
+        """Read the raw inventory table
+        Returns:
+            (headers, rows) with the footer totals as the last row
+        """
         try:
             # Wait for table to be present
             table = self.wait.until(
@@ -277,24 +542,20 @@ class WebNavigator:
             
             # Add footer data to main data
             data.append(footer_data)
-
-
-            # Create DataFrame
-            df = pd.DataFrame(data, columns=headers)
-            
-            # Convert numeric columns
-            numeric_columns = ['庫存量', '庫存額', '定價', '安全存量']
-            for col in numeric_columns:
-                if col in df.columns:
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
-            
-            logger.info(f"Successfully extracted {len(df)} inventory records")
-            return df
+            return headers, data
             
         except Exception as e:
             logger.error(f"Failed to extract inventory table: {str(e)}")
             raise
 
+    def parse_inventory_table(self, headers, data):
+        """Build the inventory DataFrame from fetch_inventory_table output"""
+        # Create DataFrame and convert columns to their schema types
+        df = apply_schema(pd.DataFrame(data, columns=headers), 'inventory')
+        
+        logger.info(f"Successfully extracted {len(df)} inventory records")
+        return df
+
     def navigate_to_monthly_supply(self):
             """Navigate to the monthly supply report page"""
             try:
@@ -326,30 +587,18 @@ class WebNavigator:
             # Get date values
             date_values = self.filter_month_generator(year, month)
             
-            # Select year
-            year_select = self.wait.until(
-                EC.presence_of_element_located((By.NAME, "p_year"))
-            )
-            year_dropdown = Select(year_select)
-            year_dropdown.select_by_value(str(date_values['year']))
-
-            # Select month
-            month_select = self.wait.until(
-                EC.presence_of_element_located((By.NAME, "p_period"))
+            # Select year and month, then submit
+            page_token = self.forms.fill(
+                [
+                    select_field("p_year", date_values['year']),
+                    select_field("p_period", date_values['month']),
+                ],
+                submit_xpath="//*[@name='B1']",
+                mark_page=True
             )
-            month_dropdown = Select(month_select)
-            month_dropdown.select_by_value(date_values['month'])
-
-            # Submit
-            submit_button = self.wait.until(
-                EC.element_to_be_clickable((By.NAME, "B1"))
-            )
-            submit_button.click()
 
             # Wait for results
-            self.wait.until(
-                EC.presence_of_element_located((By.CLASS_NAME, "sortable"))
-            )
+            self.dom.wait_for_xpath("//table[contains(@class, 'sortable')]", stale_token=page_token)
             
             logger.info(f"Successfully set filter for {date_values['year']}/{date_values['month']}")
 
@@ -359,6 +608,14 @@ class WebNavigator:
 
     def extract_monthly_supply_table(self):
         """Extract data from the monthly supply table"""
+        return self.parse_monthly_supply_table(*self.fetch_monthly_supply_table())
+
+    def fetch_monthly_supply_table(self):
+        """Read the raw monthly supply report
+        Returns:
+            (title, table_html, summary_cells) where summary_cells are the texts of
+            the 合計 row, or None if the page has none
+        """
         try:
             # Extract title from p element
             title = self.driver.find_element(By.XPATH, "//p[contains(text(), '庫存銷售月報表')]").text
@@ -371,77 +628,13 @@ class WebNavigator:
             
             # Get the main table data
             table_html = main_table.get_attribute('outerHTML')
-            tables = pd.read_html(table_html)
-            df = tables[0]
-            
-            # Convert columns as before
-            numeric_columns = ['定價', '存量', '存額', '月進量', '退量', '進淨量', 
-                            '出量', '退量', '出淨量', '年量', '退量', '進淨量', 
-                            '出量', '退量', '出淨量']
-            
-            date_columns = ['發書日']
-            string_columns = ['貨物代碼', '書名', '系列編號']
-            
-            for col in numeric_columns:
-                if col in df.columns:
-                    df[col] = df[col].astype(str).str.replace(',', '')
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
-            
-            for col in date_columns:
-                if col in df.columns:
-                    df[col] = pd.to_datetime(df[col], errors='coerce')
-            
-            for col in string_columns:
-                if col in df.columns:
-                    df[col] = df[col].fillna('').astype(str)
 
+            summary_cells = None
             try:
-                # Try to find the summary row using a more specific XPath
-                summary_rows = self.driver.find_elements(
-                    By.XPATH, "//tr[td[contains(text(), '合計') or contains(text(), '合  計')]]"
-                )
-                
-                if summary_rows:
-                    logger.debug(f"Found {len(summary_rows)} potential summary rows")
-                    summary_row = summary_rows[-1]  # Take the last one if multiple found
-                    cells = summary_row.find_elements(By.TAG_NAME, "td")
-                    
-                    # Log the actual cell contents for debugging
-                    cell_texts = [cell.text.strip() for cell in cells]
-                    logger.debug(f"Summary row cell contents: {cell_texts}")
-                    
-                    # Create summary data dictionary with empty values for first columns
-                    summary_data = {
-                        '貨物代碼': '',
-                        '書名': '',
-                        '發書日': pd.NaT,
-                        '定價': None,
-                        '系列編號': '合計'  # Put '計' in 系列編號 column
-                    }
-                    
-                    # Remove the first cell that contains '合計' and process the remaining cells sequentially
-                    remaining_cells = cells[1:]  # Skip the first cell with '合計'
-                    
-                    # Map the values to the correct columns in order
-                    columns_order = ['存量', '存額', '月進量', '退量', '進淨量', 
-                                   '出量', '退量.1', '出淨量', '年進量', '退量.2', 
-                                   '進淨量.1', '出量.1', '退量.3', '出淨量.1']
-                    
-                    for i, col_name in enumerate(columns_order):
-                        if i < len(remaining_cells):
-                            value = remaining_cells[i].text.strip().replace(',', '')
-                            try:
-                                summary_data[col_name] = float(value) if value else 0.0
-                            except ValueError:
-                                logger.warning(f"Could not convert value for {col_name}: {value}")
-                                summary_data[col_name] = 0.0
-                        else:
-                            summary_data[col_name] = 0.0
-                    
-                    # Add summary row to DataFrame
-                    summary_df = pd.DataFrame([summary_data])
-                    df = pd.concat([df, summary_df], ignore_index=True)
-                    logger.debug(f"Added summary row: {summary_data}")
+                # Read the cells of the last 合計 row in one round trip
+                summary_cells = self.driver.execute_script(SUMMARY_ROW_JS)
+                if summary_cells:
+                    logger.debug(f"Summary row cell contents: {summary_cells}")
                 else:
                     logger.warning("No summary row found")
 
@@ -449,13 +642,32 @@ class WebNavigator:
                 logger.warning(f"Failed to extract summary data: {str(e)}")
                 logger.warning(f"Summary extraction error details: {traceback.format_exc()}")
 
-            logger.info(f"Successfully extracted {len(df)} monthly supply records")
-            return df, title
+            return title, table_html, summary_cells
             
         except Exception as e:
             logger.error(f"Failed to extract monthly supply table: {str(e)}")
             raise
 
+    def parse_monthly_supply_table(self, title, table_html, summary_cells):
+        """Build the monthly supply DataFrame from fetch_monthly_supply_table output
+        Returns:
+            (DataFrame, title)
+        """
+        tables = pd.read_html(io.StringIO(table_html))
+        df = tables[0]
+
+        if summary_cells:
+            # The 合計 label goes to 系列編號; its values follow in column order
+            summary_df = total_row_frame(summary_cells, '系列編號', SCHEMAS['monthly_supply']['totals'])
+            df = pd.concat([df, summary_df], ignore_index=True)
+
+        # Convert columns to their schema types (after the summary row, so categories include 合計)
+        df = apply_schema(df, 'monthly_supply')
+        validate_totals(df, 'monthly_supply')
+
+        logger.info(f"Successfully extracted {len(df)} monthly supply records")
+        return df, title
+
     def navigate_to_analysis_report(self):
         """Navigate to the analysis report page"""
         try:
@@ -488,75 +700,42 @@ class WebNavigator:
             self.save_screenshot("analysis_navigation_error")
             raise
     
-    def set_analysis_report_filter(self, year=None, month=None, filter_type='customer'):
+    def set_analysis_report_filter(self, year=None, month=None, filter_type='customer', end_year=None, end_month=None):
         """Set filter for analysis report
         Args:
             year: Optional year to filter
             month: Optional month to filter
-            filter_type: 'customer' or 'product' to determine which checkboxes to select
+            filter_type: 'customer' or 'product' to determine which checkboxes to select,
+                'all' for the breakdown by every dimension (both views are derived from it)
+            end_year: Optional end year of a month range
+            end_month: Optional end month of a month range
         """
         try:
             # Get date values
-            date_values = self.filter_month_generator(year, month)
-            combined_date = date_values['combined']
+            start_values, end_values = self.filter_range_generator(year, month, end_year, end_month)
+            combined_date = start_values['combined']
+            if end_values['combined'] != combined_date:
+                combined_date = f"{combined_date}-{end_values['combined']}"
             
+            self.analysis_period = (start_values['combined'], end_values['combined'])
             logger.debug(f"Setting analysis filter for {combined_date}, type: {filter_type}")
             
-            # Select start and end dates (same month for our case)
-            for field_name in ['b_ym', 'e_ym']:
-                date_select = self.wait.until(
-                    EC.presence_of_element_located((By.NAME, field_name))
-                )
-                date_dropdown = Select(date_select)
-                date_dropdown.select_by_value(combined_date)
-            
-            # Clear existing selections
-            checkboxes = self.driver.find_elements(By.XPATH, "//input[@type='checkbox']")
-            for checkbox in checkboxes:
-                if checkbox.is_selected():
-                    checkbox.click()
-            
             # Select appropriate checkboxes based on filter type
             if filter_type == 'customer':
-                # Wait and select customer-related checkboxes
-                self.wait.until(
-                    EC.element_to_be_clickable((By.NAME, "acc_code"))
-                ).click()
-                self.wait.until(
-                    EC.element_to_be_clickable((By.NAME, "acc_cat1"))
-                ).click()
+                dimensions = ["acc_code", "acc_cat1"]
+            elif filter_type == 'all':
+                dimensions = ["acc_code", "acc_cat1", "stk_c", "acc_cat"]
             else:  # product
-                # Wait and select product-related checkboxes
-                self.wait.until(
-                    EC.element_to_be_clickable((By.NAME, "stk_c"))
-                ).click()
-                self.wait.until(
-                    EC.element_to_be_clickable((By.NAME, "acc_cat"))
-                ).click()
+                dimensions = ["stk_c", "acc_cat"]
             
-            # Submit form
-            # Capture the old table (if present) so we can wait for it to go stale after submit
-            old_table = None
-            try:
-                old_table = self.driver.find_element(By.XPATH, "//table[@bgcolor='#008080']")
-            except Exception:
-                old_table = None
-
-            submit_button = self.wait.until(
-                EC.element_to_be_clickable((By.NAME, "B1"))
-            )
-            submit_button.click()
-
-            # Ensure the old table is detached, then wait for the new table
-            if old_table is not None:
-                try:
-                    self.wait.until(EC.staleness_of(old_table))
-                except Exception:
-                    pass
+            # Start and end months, cleared checkboxes plus the dimension checkboxes,
+            # submitted in one call. The current page is tagged so the wait below
+            # only accepts the table of the result page
+            fields = [select_field("b_ym", start_values['combined']), select_field("e_ym", end_values['combined'])]
+            fields += [checkbox_field(name) for name in dimensions]
+            page_token = self.forms.fill(fields, submit_xpath="//*[@name='B1']", uncheck_all=True, mark_page=True)
 
-            self.wait.until(
-                EC.presence_of_element_located((By.XPATH, "//table[@bgcolor='#008080']"))
-            )
+            self.dom.wait_for_xpath("//table[@bgcolor='#008080']", stale_token=page_token)
             
             logger.info(f"Successfully set analysis filter type: {filter_type} for {combined_date}")
 
@@ -565,8 +744,42 @@ class WebNavigator:
             self.save_screenshot("analysis_filter_error")
             raise
 
+    def _cube_month(self, report):
+        """Month of the current analysis report for the aggregate cube, or None to skip it"""
+        if self.aggregate_cube is None or self.analysis_period is None:
+            return None
+        start, end = self.analysis_period
+        if start != end:
+            logger.info(f"{report} covers {start}-{end}; only single months go into the aggregate cube")
+            return None
+        return start
+
+    def record_analysis(self, df, report):
+        """Add a customer or product analysis report to the aggregate cube, if one is configured"""
+        month = self._cube_month(report)
+        if month is not None:
+            self.aggregate_cube.add_view(report, df, month)
+
+    def record_analysis_breakdown(self, df, headers):
+        """Add the combined customer x product analysis report to the aggregate cube
+        Args:
+            df: Combined report broken down by every dimension
+            headers: {report: columns} of the customer and product analysis reports
+        """
+        month = self._cube_month('analysis')
+        if month is not None:
+            self.aggregate_cube.add_breakdown(df, key_column(headers['customer_analysis']),
+                                              key_column(headers['product_analysis']), month)
+
     def extract_analysis_table(self):
         """Extract data from analysis report table based on current filter (stale-safe with retries)"""
+        return self.parse_analysis_table(*self.fetch_analysis_table())
+
+    def fetch_analysis_table(self):
+        """Read the raw analysis table (stale-safe with retries)
+        Returns:
+            (headers, rows) with the total row's spanning cell normalized to 合計
+        """
         attempts = 0
         last_err = None
         while attempts < 3:
@@ -577,60 +790,19 @@ class WebNavigator:
                     EC.presence_of_element_located((By.XPATH, "//table[@bgcolor='#008080']"))
                 )
             
-                # Build headers by reading the first row fresh each time
-                header_row = table.find_element(By.TAG_NAME, "tr")
-                headers = [td.text.strip() for td in header_row.find_elements(By.TAG_NAME, "td")]
-
-                # Gather rows
-                data = []
-                rows = table.find_elements(By.TAG_NAME, "tr")[1:]  # Skip header row
-
-                for row in rows:
-                    cells = row.find_elements(By.TAG_NAME, "td")
-                    if not cells:
-                        continue
+                # Read all rows in one round trip; the total row (first cell
+                # coloured #CCFF66, spanning the label columns) is labelled 合計
+                rows = self.driver.execute_script(TABLE_ROWS_JS, table, "#CCFF66")
+                headers = rows[0]['cells']
+                data = [row['cells'] for row in rows[1:] if row['cells']]
 
-                    # Detect total row based on bgcolor of first cell
-                    is_total = False
-                    try:
-                        if cells[0].get_attribute("bgcolor") == "#CCFF66":
-                            is_total = True
-                    except StaleElementReferenceException:
-                        # If this cell went stale mid-loop, refetch the table and retry the whole attempt
-                        raise
-
-                    row_data = []
-                    for cell in cells:
-                        value = cell.text.strip()
-                        if is_total and cell.get_attribute("colspan"):
-                            # First cell in total row spans multiple columns; normalize to one "合計" token
-                            row_data.append("合計")
-                            for _ in range(int(cell.get_attribute("colspan")) - 1):
-                                row_data.append("")
-                        else:
-                            row_data.append(value)
-
-                    if row_data:
-                        data.append(row_data)
-
-                # Create DataFrame
-                df = pd.DataFrame(data, columns=headers)
-
-                # Convert numeric columns where applicable
-                for col in ['出量', '退量', '淨量']:
-                    if col in df.columns:
-                        df[col] = pd.to_numeric(df[col].replace('', '0'), errors='coerce')
-
-                if '退率' in df.columns:
-                    df['退率'] = df['退率'].replace('', '0')
-                    df['退率'] = df['退率'].str.rstrip('%').astype(float)
-
-                logger.info(f"Successfully extracted {len(df)} analysis records (attempt {attempts})")
-                return df
+                logger.debug(f"Read {len(data)} analysis rows (attempt {attempts})")
+                return headers, data
 
             except StaleElementReferenceException as e:
                 last_err = e
                 logger.warning(f"Stale element while extracting analysis table (attempt {attempts}); retrying...")
+                self.run_metrics.add('retries', 1)
                 time.sleep(0.5)
                 continue
             except Exception as e:
@@ -645,6 +817,15 @@ class WebNavigator:
         else:
             raise Exception("Failed to extract analysis table for unknown reasons")
 
+    def parse_analysis_table(self, headers, data):
+        """Build the analysis DataFrame from fetch_analysis_table output"""
+        # Create DataFrame and convert columns to their schema types
+        df = apply_schema(pd.DataFrame(data, columns=headers), 'analysis')
+        validate_totals(df, 'analysis')
+
+        logger.info(f"Successfully extracted {len(df)} analysis records")
+        return df
+
     def export_to_excel(self, df, report_type, title=None, excel_path=None):
         """Export the DataFrame to Excel with report type specification and optional title
         Args:
@@ -668,20 +849,26 @@ class WebNavigator:
                 
                 excel_path = os.path.join(exports_dir, filename)
             
-            # Check if file exists to determine mode
-            mode = 'a' if os.path.exists(excel_path) else 'w'
-            
-            # Create Excel writer object with appropriate mode
-            with pd.ExcelWriter(excel_path, engine='openpyxl', mode=mode) as writer:
-                # Always write DataFrame, adjust startrow based on title presence
-                start_row = 1 if title else 0
-                df.to_excel(writer, sheet_name=report_type, index=False, startrow=start_row)
+            # Workbook writes may come from post-processing workers; the mode
+            # is decided under the lock since another writer may create the file
+            with self._workbook_lock:
+                # Check if file exists to determine mode
+                mode = 'a' if os.path.exists(excel_path) else 'w'
                 
-                if title:
-                    # Get the worksheet and write title
-                    worksheet = writer.sheets[report_type]
-                    worksheet.cell(row=1, column=1, value=title)
+                # Create Excel writer object with appropriate mode
+                # Replace the sheet if it already exists (e.g. when a stage is retried)
+                sheet_kwargs = {'if_sheet_exists': 'replace'} if mode == 'a' else {}
+                with pd.ExcelWriter(excel_path, engine='openpyxl', mode=mode, **sheet_kwargs) as writer:
+                    # Always write DataFrame, adjust startrow based on title presence
+                    start_row = 1 if title else 0
+                    df.to_excel(writer, sheet_name=report_type, index=False, startrow=start_row)
+                    
+                    if title:
+                        # Get the worksheet and write title
+                        worksheet = writer.sheets[report_type]
+                        worksheet.cell(row=1, column=1, value=title)
             
+            self.run_metrics.add('rows', len(df))
             logger.info(f"Successfully exported {report_type} to sheet in {excel_path}")
             return excel_path
                 
@@ -689,6 +876,15 @@ class WebNavigator:
             logger.error(f"Failed to export to Excel: {str(e)}")
             raise
 
+    @contextmanager
+    def _excel_writer(self, excel_path):
+        """ExcelWriter appending to the workbook, or creating it if this is the first sheet;
+        holds the workbook lock so background writers take turns"""
+        with self._workbook_lock:
+            mode = 'a' if os.path.exists(excel_path) else 'w'
+            with pd.ExcelWriter(str(excel_path), engine='openpyxl', mode=mode) as writer:
+                yield writer
+
     def save_screenshot(self, prefix):
         """Save screenshot on failure"""
         try:
@@ -750,6 +946,8 @@ class WebNavigator:
             logger.error(f"Error closing browser: {str(e)}")
         finally:
             self.driver = None
+            self.conversions.close()
+            self.downloads.close()
 
     def is_logged_in(self):
         """Check if user is currently logged in"""
@@ -759,72 +957,6 @@ class WebNavigator:
         except:
             return False
 
-    def extract_analysis_table(self):
-        """Extract data from analysis report table based on current filter"""
-        try:
-            # Wait for table to be present
-            table = self.wait.until(
-                EC.presence_of_element_located((By.XPATH, "//table[@bgcolor='#008080']"))
-            )
-            
-            # Get headers
-            headers = []
-            header_row = table.find_element(By.TAG_NAME, "tr")
-            for th in header_row.find_elements(By.TAG_NAME, "td"):
-                headers.append(th.text.strip())
-            
-            # Initialize lists to store data
-            data = []
-            
-            # Get all rows except header
-            rows = table.find_elements(By.TAG_NAME, "tr")[1:]  # Skip header row
-            
-            # Process regular rows
-            for row in rows:
-                cells = row.find_elements(By.TAG_NAME, "td")
-                row_data = []
-                
-                # Check if this is the total row
-                is_total = False
-                if cells[0].get_attribute("bgcolor") == "#CCFF66":
-                    is_total = True
-                
-                for cell in cells:
-                    value = cell.text.strip()
-                    # If it's a total row and the cell spans multiple columns
-                    if is_total and cell.get_attribute("colspan"):
-                        row_data.append("合計")  # Add '合計' for the first column
-                        # Add empty strings for spanned columns
-                        for _ in range(int(cell.get_attribute("colspan")) - 1):
-                            row_data.append("")
-                    else:
-                        row_data.append(value)
-                        
-                if row_data:  # Only add non-empty rows
-                    data.append(row_data)
-            
-            # Create DataFrame
-            df = pd.DataFrame(data, columns=headers)
-            
-            # Convert numeric columns
-            numeric_columns = ['出量', '退量', '淨量']
-            for col in numeric_columns:
-                if col in df.columns:
-                    df[col] = pd.to_numeric(df[col].replace('', '0'), errors='coerce')
-            
-            # Convert 退率 (return rate) - remove % and convert to numeric
-            if '退率' in df.columns:
-                df['退率'] = df['退率'].replace('', '0')
-                df['退率'] = df['退率'].str.rstrip('%').astype(float)
-            
-            logger.info(f"Successfully extracted {len(df)} analysis records")
-            return df
-                
-        except Exception as e:
-            logger.error(f"Failed to extract analysis table: {str(e)}")
-            self.save_screenshot("analysis_table_extraction_error")
-            raise
-
     def navigate_to_weekly_summary(self):
         """Navigate to the sum by week menu page"""
         try:
@@ -877,6 +1009,8 @@ class WebNavigator:
             # Build and execute conversion command
             command = [
                 '/Applications/LibreOffice.app/Contents/MacOS/soffice',
+                # Private profile per conversion worker so conversions can run in parallel
+                self.conversions.user_installation_arg(),
                 '--headless',
                 '--norestore',
                 '--nofirststartwizard',
@@ -889,12 +1023,14 @@ class WebNavigator:
             # For debugging only
             # logger.debug(f"Running command: {' '.join(command)}")
             
+            conversion_start = time.perf_counter()
             process = subprocess.run(
                 command,
                 capture_output=True,
                 text=True,
                 check=True
             )
+            self.run_metrics.add('conversion_seconds', time.perf_counter() - conversion_start)
             
             # For debugging only
             # logger.debug(f"Command stdout: {process.stdout}")
@@ -958,13 +1094,22 @@ class WebNavigator:
             self.save_screenshot("monthly_summary_navigation_error")
             raise
 
-    def set_report_filter(self, report_type):
-        """Generic filter setter for both weekly and monthly reports"""
+    def set_report_filter(self, report_type, year=None, month=None, end_year=None, end_month=None):
+        """Generic filter setter for both weekly and monthly reports
+        Args:
+            report_type: Key of self.report_configs
+            year, month: Optional first month (default: previous month)
+            end_year, end_month: Optional last month of a range (default: the first month)
+        """
         try:
-            # Get month value using your existing generator
-            date_values = self.filter_month_generator()
-            target_month = date_values['combined']
-            logger.debug(f"Filtering for {date_values['year']}/{date_values['month']}")
+            # Get month values using your existing generator
+            start_values, end_values = self.filter_range_generator(year, month, end_year, end_month)
+            start_month = start_values['combined']
+            end_month = end_values['combined']
+            period_label = f"{start_values['year']}/{start_values['month']}"
+            if end_month != start_month:
+                period_label += f" - {end_values['year']}/{end_values['month']}"
+            logger.debug(f"Filtering for {period_label}")
 
             # Select the appropriate form based on report type
             form_links = {
@@ -983,159 +1128,142 @@ class WebNavigator:
 
             # Handle different filter fields based on report type
             if report_type.startswith('sum_by_week'):
-                # Weekly report filter fields
-                start_select = Select(self.wait.until(
-                    EC.presence_of_element_located((By.NAME, "mas_date_b"))
-                ))
-                end_select = Select(self.wait.until(
-                    EC.presence_of_element_located((By.NAME, "mas_date_e"))
-                ))
-
-                # Get all options
-                start_options = [opt.get_attribute('value') for opt in start_select.options]
-                end_options = [opt.get_attribute('value') for opt in end_select.options]
-
-                # Filter options for the target month
-                month_start_options = [opt for opt in start_options if opt.startswith(target_month)]
-                month_end_options = [opt for opt in end_options if opt.startswith(target_month)]
+                # Weekly report filter fields; read both option lists in one call
+                self.dom.wait_for_xpath("//select[@name='mas_date_e']")
+                options = self.forms.read_options(["mas_date_b", "mas_date_e"])
+
+                # Filter options for the first and last month
+                month_start_options = [opt for opt in options["mas_date_b"] or [] if opt.startswith(start_month)]
+                month_end_options = [opt for opt in options["mas_date_e"] or [] if opt.startswith(end_month)]
 
                 if not month_start_options or not month_end_options:
-                    raise ValueError(f"No options found for {date_values['year']}/{date_values['month']}")
+                    raise ValueError(f"No options found for {period_label}")
 
-                # Select first and last options for the month
-                start_select.select_by_value(month_start_options[0])
-                end_select.select_by_value(month_end_options[-1])
+                # Select first week of the first month and last week of the last month
+                fields = [
+                    select_field("mas_date_b", month_start_options[0]),
+                    select_field("mas_date_e", month_end_options[-1]),
+                ]
 
             else:
                 # Monthly report filter fields
-                start_field = self.wait.until(
-                    EC.presence_of_element_located((By.NAME, "ym_b"))
-                )
-                end_field = self.wait.until(
-                    EC.presence_of_element_located((By.NAME, "ym_e"))
-                )
-                Select(start_field).select_by_value(target_month)
-                Select(end_field).select_by_value(target_month)
+                self.dom.wait_for_xpath("//select[@name='ym_e']")
+                fields = [select_field("ym_b", start_month), select_field("ym_e", end_month)]
 
-            # Submit the form
-            submit_button = self.wait.until(
-                EC.element_to_be_clickable((By.NAME, "B1"))  # Changed to match your original
-            )
-            submit_button.click()
+            # Fill and submit the form
+            self.forms.fill(fields, submit_xpath="//*[@name='B1']")
 
-            logger.info(f"Successfully set filter for {report_type} report: {date_values['year']}/{date_values['month']}")
+            logger.info(f"Successfully set filter for {report_type} report: {period_label}")
 
         except Exception as e:
             logger.error(f"Failed to set filter for {report_type}: {str(e)}")
             self.save_screenshot(f"{report_type}_filter_error")
             raise
 
-    def process_summary_reports(self, excel_path, report_category):
-        """Process both weekly and monthly summary reports"""
+    def download_summary_report(self, report_type, **period):
+        """Navigate to a summary report, submit its filter and wait for the download
+        Args:
+            report_type: Key of self.report_configs
+            period: Optional year/month/end_year/end_month for set_report_filter
+        Returns:
+            Path to the downloaded xls file
+        """
+        # Navigate to appropriate menu
+        if report_type.startswith('sum_by_week'):
+            self.navigate_to_weekly_summary()
+        else:
+            self.navigate_to_monthly_summary()
+        self.downloads.expect(report_type, self.report_configs[report_type]["filename"])
+        self.set_report_filter(report_type, **period)
+        
+        # Wait for download
         try:
-            # Define report pairs
-            report_pairs = {
-                'weekly': {
-                    'menu_func': self.navigate_to_weekly_summary,
-                    'reports': ['sum_by_week', 'sum_by_week_customer']
-                },
-                'monthly': {
-                    'menu_func': self.navigate_to_monthly_summary,
-                    'reports': ['sum_by_month', 'sum_by_month_customer']
-                }
-            }
+            file_path = self.downloads.wait(report_type)
+        except TimeoutException:
+            raise FileNotFoundError(f"Download timeout: {self.report_configs[report_type]['filename']}")
+        self.run_metrics.add('download_bytes', file_path.stat().st_size)
+        return file_path
 
-            pair = report_pairs[report_category]
-            converted_files = []  # Track converted files
+    def append_summary_sheet(self, excel_path, report_type, xlsx_path):
+        """Append a converted summary report to the workbook and remove the converted file"""
+        config = self.report_configs[report_type]
+        try:
+            # Read the converted file
+            df = pd.read_excel(xlsx_path, engine='openpyxl')
+            
+            # Get the header value from the first cell
+            header_value = df.columns[0]
             
-            for report_type in pair['reports']:
-                # Navigate to appropriate menu
-                pair['menu_func']()
-                self.set_report_filter(report_type)
+            # Reset the column names to be blank after the first column
+            new_columns = [header_value] + [''] * (len(df.columns) - 1)
+            df.columns = new_columns
+            self.run_metrics.add('rows', len(df))
+
+            # Append to main report with merged header
+            with self._excel_writer(excel_path) as writer:
+                if config["sheet_name"] in writer.book.sheetnames:
+                    idx = writer.book.sheetnames.index(config["sheet_name"])
+                    writer.book.remove(writer.book.worksheets[idx])
                 
-                # Wait for download
-                file_path = os.path.join(self.downloads_dir, self.report_configs[report_type]["filename"])
-                wait_start = time.time()
-                while not os.path.exists(file_path) and time.time() - wait_start < 30:
-                    time.sleep(0.5)
-                    
-                if not os.path.exists(file_path):
-                    raise FileNotFoundError(f"Download timeout: {self.report_configs[report_type]['filename']}")
+                # Write the DataFrame
+                df.to_excel(
+                    writer,
+                    sheet_name=config["sheet_name"],
+                    index=False
+                )
                 
-                # Convert file and store path
-                xlsx_path = self.process_downloaded_excel(file_path)
-                converted_files.append({
-                    'path': xlsx_path,
-                    'type': report_type,
-                    'config': self.report_configs[report_type]
-                })
+                # Get the worksheet
+                worksheet = writer.book[config["sheet_name"]]
                 
-                # Return to index for next report
-                self.return_to_index()
+                # Merge the header cells
+                worksheet.merge_cells(
+                    start_row=1,
+                    start_column=1,
+                    end_row=1,
+                    end_column=len(df.columns)
+                )
                 
-            # Now process all converted files
-            for file_info in converted_files:
-                try:
-                    # Read the converted file
-                    df = pd.read_excel(file_info['path'], engine='openpyxl')
-                    
-                    # Get the header value from the first cell
-                    header_value = df.columns[0]
-                    
-                    # Reset the column names to be blank after the first column
-                    new_columns = [header_value] + [''] * (len(df.columns) - 1)
-                    df.columns = new_columns
-
-                    # Append to main report with merged header
-                    with pd.ExcelWriter(str(excel_path), engine='openpyxl', mode='a') as writer:
-                        if file_info['config']["sheet_name"] in writer.book.sheetnames:
-                            idx = writer.book.sheetnames.index(file_info['config']["sheet_name"])
-                            writer.book.remove(writer.book.worksheets[idx])
-                        
-                        # Write the DataFrame
-                        df.to_excel(
-                            writer,
-                            sheet_name=file_info['config']["sheet_name"],
-                            index=False
-                        )
-                        
-                        # Get the worksheet
-                        worksheet = writer.book[file_info['config']["sheet_name"]]
-                        
-                        # Merge the header cells
-                        worksheet.merge_cells(
-                            start_row=1,
-                            start_column=1,
-                            end_row=1,
-                            end_column=len(df.columns)
-                        )
-                        
-                        # Set alignment for merged cell
-                        merged_cell = worksheet.cell(row=1, column=1)
-                        merged_cell.alignment = openpyxl.styles.Alignment(
-                            horizontal='center',
-                            vertical='center'
-                        )
+                # Set alignment for merged cell
+                merged_cell = worksheet.cell(row=1, column=1)
+                merged_cell.alignment = openpyxl.styles.Alignment(
+                    horizontal='center',
+                    vertical='center'
+                )
 
-                    logger.info(f"Successfully appended {file_info['config']['filename']} to main report")
+            logger.info(f"Successfully appended {config['filename']} to main report")
 
-                except Exception as e:
-                    logger.error(f"Failed to append {file_info['config']['filename']}: {str(e)}")
-                    raise
-                finally:
-                    # Cleanup converted file
-                    try:
-                        if os.path.exists(file_info['path']):
-                            os.remove(file_info['path'])
-                    except Exception as e:
-                        logger.warning(f"Could not remove temporary file: {e}")
+        except Exception as e:
+            logger.error(f"Failed to append {config['filename']}: {str(e)}")
+            raise
+        finally:
+            # Cleanup converted file
+            try:
+                if os.path.exists(xlsx_path):
+                    os.remove(xlsx_path)
+            except Exception as e:
+                logger.warning(f"Could not remove temporary file: {e}")
 
-            logger.info(f"Successfully processed {report_category} reports")
-            return excel_path
+    def finish_summary_report(self, excel_path, report_type, conversion):
+        """Wait for a summary report's conversion and append it to the workbook"""
+        self.append_summary_sheet(excel_path, report_type, conversion.result())
 
+    def process_summary_report(self, excel_path, report_type, **period):
+        """Download, convert and export a single weekly or monthly summary report;
+        conversion and export run in the background when a PostProcessor is attached
+        Args:
+            excel_path: Workbook to append to
+            report_type: Key of self.report_configs
+            period: Optional year/month/end_year/end_month for set_report_filter
+        """
+        try:
+            file_path = self.download_summary_report(report_type, **period)
+            # Conversion starts right away; the sheet is written once it is done
+            conversion = self.convert_download(file_path)
+            self.defer(self.finish_summary_report, excel_path, report_type, conversion)
+            return excel_path
         except Exception as e:
-            logger.error(f"Failed to process {report_category} reports: {str(e)}")
-            self.save_screenshot(f"{report_category}_reports_error")
+            logger.error(f"Failed to process {report_type} report: {str(e)}")
+            self.save_screenshot(f"{report_type}_report_error")
             raise
 
     def navigate_to_orders(self):
@@ -1161,54 +1289,36 @@ class WebNavigator:
             self.save_screenshot("order_navigation_error")
             raise
 
-    def set_order_filter(self, order_type):
+    def set_order_filter(self, order_type, year=None, month=None, end_year=None, end_month=None):
         """Set filter for order reports
         Args:
             order_type: 'GR' for purchase order or 'RNS' for return order
+            year, month: Optional first month (default: previous month)
+            end_year, end_month: Optional last month of a range (default: the first month)
         """
         try:
-            # Get date values for previous month
-            date_values = self.filter_month_generator()
-            year = date_values['year']
-            month = date_values['month'].zfill(2)
+            # Get date values (previous month by default)
+            start_values, end_values = self.filter_range_generator(year, month, end_year, end_month)
+            start_month = start_values['month'].zfill(2)
+            end_month = end_values['month'].zfill(2)
             
-            # Calculate last day of month
-            last_day = calendar.monthrange(int(year), int(month))[1]
+            # Calculate last day of the last month
+            last_day = calendar.monthrange(int(end_values['year']), int(end_month))[1]
             
             # Format dates (DD-MM-YYYY)
-            start_date = f"01-{month}-{year}"
-            end_date = f"{last_day:02d}-{month}-{year}"
-            
-            # Select order type
-            order_select = Select(self.wait.until(
-                EC.presence_of_element_located((By.NAME, "mas_code"))
-            ))
-            order_select.select_by_value(order_type)
-            
-            # Set start date
-            start_date_field = self.wait.until(
-                EC.presence_of_element_located((By.NAME, "date1"))
-            )
-            # Clear any existing value and set new date using JavaScript
-            self.driver.execute_script(
-                f"arguments[0].value = '{start_date}';", 
-                start_date_field
-            )
-            
-            # Set end date
-            end_date_field = self.wait.until(
-                EC.presence_of_element_located((By.NAME, "date2"))
-            )
-            self.driver.execute_script(
-                f"arguments[0].value = '{end_date}';", 
-                end_date_field
-            )
-            
-            # Submit form
-            submit_button = self.wait.until(
-                EC.element_to_be_clickable((By.XPATH, "//input[@value='送出查詢']"))
+            start_date = f"01-{start_month}-{start_values['year']}"
+            end_date = f"{last_day:02d}-{end_month}-{end_values['year']}"
+            
+            # Select order type, set the date range and submit
+            self.dom.wait_for_xpath("//input[@name='date2']")
+            self.forms.fill(
+                [
+                    select_field("mas_code", order_type),
+                    text_field("date1", start_date),
+                    text_field("date2", end_date),
+                ],
+                submit_xpath="//input[@value='送出查詢']"
             )
-            submit_button.click()
             
             logger.info(f"Successfully set filter for {order_type} orders: {start_date} to {end_date}")
             
@@ -1276,85 +1386,90 @@ class WebNavigator:
             self.save_screenshot(f"order_extract_error_{order_type}")
             raise
 
-    def process_order_reports(self, excel_path):
-        """Process both purchase and return order reports"""
+    def process_order_report(self, excel_path, order_type, **period):
+        """Extract and export a single order report
+        Args:
+            excel_path: Workbook to append to
+            order_type: 'GR' for purchase order or 'RNS' for return order
+            period: Optional year/month/end_year/end_month for set_order_filter
+        """
+        config = self.order_configs[order_type]
         try:
-            order_configs = {
-                'GR': {
-                    'sheet_name': 'Purchase Orders',
-                    'description': 'purchase'
-                },
-                'RNS': {
-                    'sheet_name': 'Return Orders',
-                    'description': 'return'
-                }
-            }
+            # Navigate to orders page
+            self.navigate_to_orders()
+            
+            # Set filter and get data; cleanup and export may run in the background
+            self.set_order_filter(order_type, **period)
+            df = self.cached_fetch(
+                f"orders_{order_type}",
+                lambda: self.probe_table((By.XPATH, "//table[@border='0' and @width='100%']")),
+                lambda: self.extract_order_data(order_type)
+            )
+            self.defer(self.write_order_report, excel_path, order_type, df)
+            return excel_path
             
-            for order_type, config in order_configs.items():
-                try:
-                    # Navigate to orders page
-                    self.navigate_to_orders()
-                    
-                    # Set filter and get data
-                    self.set_order_filter(order_type)
-                    df = self.extract_order_data(order_type)
-                    
-                    # First remove the numeric row if it exists
-                    if df.iloc[0].astype(str).str.match(r'^\d+$').all():
-                        df = df.iloc[1:].reset_index(drop=True)
-                    
-                    # Then add the title row
-                    title_df = pd.DataFrame([[config['sheet_name']] + [''] * (len(df.columns) - 1)], columns=df.columns)
-                    df = pd.concat([title_df, df], ignore_index=True)
-                    
-                    # Export to Excel
-                    with pd.ExcelWriter(str(excel_path), engine='openpyxl', mode='a') as writer:
-                        if config['sheet_name'] in writer.book.sheetnames:
-                            idx = writer.book.sheetnames.index(config['sheet_name'])
-                            writer.book.remove(writer.book.worksheets[idx])
-                        
-                        # Write the DataFrame
-                        df.to_excel(
-                            writer,
-                            sheet_name=config['sheet_name'],
-                            index=False,
-                            header=False  # Don't write the numeric headers
-                        )
-                        
-                        # Get the worksheet
-                        worksheet = writer.book[config['sheet_name']]
-                        
-                        # Merge the title cells in the first row
-                        worksheet.merge_cells(
-                            start_row=1,
-                            start_column=1,
-                            end_row=1,
-                            end_column=len(df.columns)
-                        )
-                        
-                        # Style the merged cell
-                        merged_cell = worksheet.cell(row=1, column=1)
-                        merged_cell.alignment = openpyxl.styles.Alignment(
-                            horizontal='center',
-                            vertical='center'
-                        )
-                    
-                    logger.info(f"Successfully exported {config['description']} orders to sheet in {excel_path}")
-                    
-                    # Return to index for next report
-                    self.return_to_index()
-                    
-                except Exception as e:
-                    logger.error(f"Failed to process {config['description']} orders: {str(e)}")
-                    raise
+        except Exception as e:
+            logger.error(f"Failed to process {config['description']} orders: {str(e)}")
+            self.save_screenshot(f"order_report_error_{order_type}")
+            raise
+
+    def write_order_report(self, excel_path, order_type, df):
+        """Clean an extracted order report and write it to its sheet"""
+        config = self.order_configs[order_type]
+        try:
+            self.run_metrics.add('rows', max(len(df) - 3, 0))
+            
+            # First remove the numeric row if it exists
+            if df.iloc[0].astype(str).str.match(r'^\d+$').all():
+                df = df.iloc[1:].reset_index(drop=True)
+            # Rows below the order type, date range and header rows are the orders
+            if len(df) > 2:
+                orders = pd.DataFrame(df.iloc[3:].to_numpy(), columns=df.iloc[2].tolist())
+                self.capture_changes(orders, config['report'])
+            
+            # Then add the title row
+            title_df = pd.DataFrame([[config['sheet_name']] + [''] * (len(df.columns) - 1)], columns=df.columns)
+            df = self.compact(pd.concat([title_df, df], ignore_index=True), config['sheet_name'])
+            
+            # Export to Excel
+            with self._excel_writer(excel_path) as writer:
+                if config['sheet_name'] in writer.book.sheetnames:
+                    idx = writer.book.sheetnames.index(config['sheet_name'])
+                    writer.book.remove(writer.book.worksheets[idx])
+                
+                # Write the DataFrame
+                df.to_excel(
+                    writer,
+                    sheet_name=config['sheet_name'],
+                    index=False,
+                    header=False  # Don't write the numeric headers
+                )
+                
+                # Get the worksheet
+                worksheet = writer.book[config['sheet_name']]
+                
+                # Merge the title cells in the first row
+                worksheet.merge_cells(
+                    start_row=1,
+                    start_column=1,
+                    end_row=1,
+                    end_column=len(df.columns)
+                )
+                
+                # Style the merged cell
+                merged_cell = worksheet.cell(row=1, column=1)
+                merged_cell.alignment = openpyxl.styles.Alignment(
+                    horizontal='center',
+                    vertical='center'
+                )
             
+            logger.info(f"Successfully exported {config['description']} orders to sheet in {excel_path}")
             return excel_path
             
         except Exception as e:
-            logger.error(f"Failed to process order reports: {str(e)}")
-            self.save_screenshot("order_reports_error")
+            logger.error(f"Failed to export {config['description']} orders: {str(e)}")
             raise
-    
+
     def navigate_to_payment_menu(self):
         """Navigate to the payment menu"""
         try:
@@ -1414,32 +1529,35 @@ class WebNavigator:
             self.save_screenshot("discount_detail_navigation_error")
             raise
 
-    def set_discount_filter(self):
-        """Set filter for discount detail report"""
+    def set_discount_filter(self, year=None, month=None):
+        """Set filter for discount detail report
+        Args:
+            year: Optional settlement year
+            month: Optional settlement month (default: 2 months ago)
+        """
         try:
-            # Get date 2 months ago using filter_month_generator
-            current_date = datetime.now()
-            if current_date.month <= 2:
-                year = current_date.year - 1
-                month = current_date.month + 10  # If month is 1 or 2, go back to previous year
-            else:
-                year = current_date.year
-                month = current_date.month - 2
+            if year is None and month is None:
+                # Settlement lags a month behind the other reports: 2 months ago
+                current_date = datetime.now()
+                if current_date.month <= 2:
+                    year = current_date.year - 1
+                    month = current_date.month + 10  # If month is 1 or 2, go back to previous year
+                else:
+                    year = current_date.year
+                    month = current_date.month - 2
                 
             # Format as YYYYMM
-            period = f"{year}{month:02d}"
+            period = self.filter_month_generator(year, month)['combined']
             
-            # Find and fill the period input
-            period_input = self.wait.until(
-                EC.presence_of_element_located((By.NAME, "period"))
-            )
-            period_input.clear()
-            period_input.send_keys(period)
+            # Fill the period input
+            self.forms.fill([text_field("period", period)])
             
-            # Click submit button
+            # Click submit button natively: results open in a new tab, and a
+            # scripted click would not count as a user gesture for the popup
             submit_button = self.wait.until(
                 EC.element_to_be_clickable((By.XPATH, "//input[@value='查詢'][@name='B1']"))
             )
+            self._window_handles_before_submit = self.dom.arm_new_window()
             submit_button.click()
             
             logger.info(f"Successfully set discount filter for period: {period}")
@@ -1457,19 +1575,19 @@ class WebNavigator:
         """Extract data from the discount detail table"""
         try:
             logger.debug("Starting extract_discount_table function")
-            time.sleep(3)  # Wait for new tab to open
-            
-            # Get all window handles and switch to the new tab
-            handles = self.driver.window_handles
-            logger.debug(f"Found {len(handles)} browser windows")
-            
-            if len(handles) < 2:
+            handles = self._window_handles_before_submit or self.driver.window_handles
+            try:
+                new_handle = self.dom.wait_for_new_window(handles)
+            except TimeoutException:
                 raise Exception("Expected new tab to open after filter submission, but no new tab found")
             
-            # Switch to the new tab (last opened)
-            self.driver.switch_to.window(handles[-1])
+            # Switch to the new tab
+            self.driver.switch_to.window(new_handle)
             logger.debug(f"Switched to new tab with URL: {self.driver.current_url}")
             
+            # Wait for the results table (second table on the page)
+            self.dom.wait_for_xpath("(//table)[2]")
+            
             # Find all tables in the new tab
             tables = self.driver.find_elements(By.TAG_NAME, "table")
             logger.debug(f"Found {len(tables)} tables on page")
@@ -1479,131 +1597,64 @@ class WebNavigator:
             else:
                 raise Exception(f"Not enough tables found in results tab. Found: {len(tables)}")
                 
-            # Get headers
-            headers = []
-            header_cells = table.find_elements(By.XPATH, ".//tr[1]/td")
-            for cell in header_cells:
-                header_text = cell.text.strip()
-                headers.append(header_text)
-            logger.debug(f"Found headers: {headers}")
+            # Read the table in one round trip
+            rows = self.driver.execute_script(TABLE_ROWS_JS, table, None)
+            headers = rows[0]['cells']
+            logger.debug(f"Found headers: {headers}, {len(rows)} rows")
             
-            # Get all rows
-            all_rows = table.find_elements(By.TAG_NAME, "tr")
-            logger.debug(f"Total rows found: {len(all_rows)}")
-            
-            # Process data rows (skip header)
+            # Regular rows have one cell per header; the total row has a label and the amount
             data = []
-            for i, row in enumerate(all_rows[1:], 1):  # Skip header row
-                cells = row.find_elements(By.TAG_NAME, "td")
-                logger.debug(f"Row {i} has {len(cells)} cells")
-                
-                # Check if this is the total row
-                if len(cells) == 2:  # Total row has 2 cells
-                    total_text = cells[0].text.strip()
-                    total_amount = cells[1].text.strip()
-                    logger.debug(f"Found total row: {total_text}, {total_amount}")
-                    continue
-                
-                # Regular data row
-                row_data = []
-                for j, cell in enumerate(cells):
-                    value = cell.text.strip()
-                    if j == 0:  # Date column
-                        # Extract just the date part if it contains time
-                        if "00:00:00" in value:
-                            value = value.split()[0]  # Take only the date part
-                    row_data.append(value)
-                    
-                if len(row_data) == len(headers):
-                    data.append(row_data)
-                    logger.debug(f"Added data row: {row_data}")
+            total_cells = None
+            discount_links = []
+            for row in rows[1:]:
+                cells = row['cells']
+                if cells and (is_total_label(cells[0]) or len(cells) == 2):
+                    total_cells = [cell for cell in cells if cell]
+                elif len(cells) == len(headers):
+                    data.append(cells)
+                    if row['link']:
+                        # The category column links to the detail download
+                        discount_links.append({'category': row['link']['text'], 'url': row['link']['href']})
                 else:
-                    logger.warning(f"Skipping row with incorrect number of cells. Expected {len(headers)}, got {len(row_data)}")
+                    logger.warning(f"Skipping row with incorrect number of cells. Expected {len(headers)}, got {len(cells)}")
             
-            # Create DataFrame
             df = pd.DataFrame(data, columns=headers)
-            logger.debug(f"Created DataFrame with shape: {df.shape}")
-            
-            # Convert date column - now using the exact format from the table
-            df['日期'] = pd.to_datetime(df['日期'], format='%Y/%m/%d').dt.date
-            logger.debug(f"Date column after conversion:\n{df['日期']}")
-            
-            # Convert amount column
-            df['折讓金額'] = df['折讓金額'].str.replace(',', '').astype(float)
-            
-            # Add total row
-            total_data = {
-                '日期': None,
-                '折讓類別': None,
-                '說明': total_text if 'total_text' in locals() else "合計",
-                '折讓金額': float(total_amount.replace(',', '')) if 'total_amount' in locals() else 0.0
-            }
-            df = pd.concat([df, pd.DataFrame([total_data])], ignore_index=True)
-            
-            logger.info(f"Successfully extracted {len(df)-1} discount records plus total")
+            if total_cells:
+                df = pd.concat([df, total_row_frame(total_cells[:1] + total_cells[-1:], '說明', ['折讓金額'])],
+                               ignore_index=True)
+            # Dates may carry a midnight time part
+            df['日期'] = df['日期'].str.replace(r'\s+00:00:00$', '', regex=True)
+            
+            # Convert columns to their schema types and check the rows against the site's total
+            df = apply_schema(df, 'discounts')
+            totals = validate_totals(df, 'discounts')
+            if not total_cells:
+                df = pd.concat([df, pd.DataFrame([{'說明': '合計', '折讓金額': totals['折讓金額']}])], ignore_index=True)
+            
+            # The sheet shows plain dates
+            df['日期'] = df['日期'].dt.date
+            
+            logger.info(f"Successfully extracted {len(data)} discount records plus total")
             logger.debug(f"Final DataFrame:\n{df}")
             
-            # Before closing the tab, collect all URLs and their categories
-            discount_links = []
-            for row in all_rows[1:-1]:  # Skip header and total rows
-                cells = row.find_elements(By.TAG_NAME, "td")
-                if len(cells) == 4:  # Regular data row
-                    cell = cells[2]  # The third column contains links
-                    links = cell.find_elements(By.TAG_NAME, "a")
-                    if links:
-                        link = links[0]
-                        category = link.text.strip()
-                        url = link.get_attribute('href')
-                        discount_links.append({
-                            'category': category,
-                            'url': url
-                        })
-            
-            logger.debug(f"Found {len(discount_links)} discount detail links")
-            
-            # Process each link
+            # Download each detail file; its conversion starts as soon as the download completes
+            self.pending_discount_files = []
             for link_data in discount_links:
                 try:
                     # Store current window handle
                     current_window = self.driver.current_window_handle
+                    download_key = f"discount:{link_data['category']}"
+                    self.downloads.expect(download_key, "*.xls")
                     
-                    # Click the link (opens in new tab)
-                    self.driver.execute_script(f"window.open('{link_data['url']}', '_blank');")
+                    # Open the link (opens in new tab and downloads the file)
+                    self.driver.execute_script("window.open(arguments[0], '_blank');", link_data['url'])
                     logger.debug(f"Triggered download for {link_data['category']}")
                     
                     # Don't switch to new tab, just wait for download
-                    time.sleep(3)  # Wait for download to start
-                    download_path = None
-                    for _ in range(30):  # Wait up to 30 seconds
-                        files = list(self._get_downloads_path().glob("*.xls"))
-                        if files:
-                            download_path = str(max(files, key=os.path.getctime))
-                            break
-                        time.sleep(1)
-                    
-                    if download_path:
-                        logger.debug(f"Found downloaded file: {download_path}")
-                        
-                        # Read the Excel file with explicit engine specification
-                        detail_df = pd.read_excel(download_path, engine='xlrd')
-                        
-                        # Append to main Excel file
-                        with pd.ExcelWriter(self.excel_path, engine='openpyxl', mode='a') as writer:
-                            if link_data['category'] in writer.book.sheetnames:
-                                idx = writer.book.sheetnames.index(link_data['category'])
-                                writer.book.remove(writer.book.worksheets[idx])
-                            
-                            detail_df.to_excel(
-                                writer,
-                                sheet_name=link_data['category'],
-                                index=False
-                            )
-                            logger.info(f"Added detail sheet: {link_data['category']}")
-                        
-                        # Move cleanup to after successful processing
-                        os.remove(download_path)
-                        if file.exists():
-                            file.unlink()
+                    download_path = self.downloads.wait(download_key)
+                    logger.debug(f"Found downloaded file: {download_path}")
+                    self.run_metrics.add('download_bytes', download_path.stat().st_size)
+                    self.pending_discount_files.append((download_path, self.convert_download(download_path)))
                     
                     # Make sure we're on the correct window
                     if self.driver.current_window_handle != current_window:
@@ -1611,7 +1662,7 @@ class WebNavigator:
                     
                 except Exception as e:
                     # Log as debug instead of error for expected empty files
-                    logger.debug(f"Skipping discount detail link {link_data['category']}")
+                    logger.debug(f"Skipping discount detail link {link_data['category']}: {str(e)}")
                     continue
             
             return df
@@ -1632,9 +1683,11 @@ class WebNavigator:
         try:
             # Get main discount table
             df = self.extract_discount_table()
+            self.run_metrics.add('rows', max(len(df) - 1, 0))  # Exclude total row
+            self.capture_changes(df, 'discounts')
             
             # Export main discount table to Excel
-            with pd.ExcelWriter(str(excel_path), engine='openpyxl', mode='a') as writer:
+            with self._excel_writer(excel_path) as writer:
                 sheet_name = 'Discount Details'
                 
                 # Remove sheet if it exists
@@ -1662,12 +1715,12 @@ class WebNavigator:
                     adjusted_width = (max_length + 2)
                     worksheet.column_dimensions[column[0].column_letter].width = adjusted_width
             
-            # Process downloaded detail files
-            downloads_path = self._get_downloads_path()
-            for file in downloads_path.glob("*.xls"):
+            # Process downloaded detail files as their conversions finish
+            pending_files, self.pending_discount_files = self.pending_discount_files, []
+            for file, conversion in pending_files:
                 try:
-                    # Convert using LibreOffice
-                    converted_path = self.process_downloaded_excel(file)
+                    # Join the background LibreOffice conversion
+                    converted_path = conversion.result()
                     if not converted_path:
                         raise Exception(f"Failed to convert file: {file}")
 
@@ -1722,12 +1775,14 @@ class WebNavigator:
                             pass
                         continue
 
+                    self.run_metrics.add('rows', len(df))
+
                     # Get category name from filename for sheet name
                     category = os.path.splitext(file.name)[0].replace("discount_", "")
                     sheet_name = f"Discount_{category}"
 
                     # Append to main Excel
-                    with pd.ExcelWriter(str(excel_path), engine='openpyxl', mode='a') as writer:
+                    with self._excel_writer(excel_path) as writer:
                         if sheet_name in writer.book.sheetnames:
                             idx = writer.book.sheetnames.index(sheet_name)
                             writer.book.remove(writer.book.worksheets[idx])
@@ -1799,75 +1854,40 @@ class WebNavigator:
             self.save_screenshot("payment_detail_navigation_error")
             raise   
 
-    def set_payment_filter(self):
-        """Set date filter for payment detail report"""
+    def set_payment_filter(self, year=None, month=None, end_year=None, end_month=None):
+        """Set date filter for payment detail report
+        Args:
+            year, month: Optional first month (default: previous month)
+            end_year, end_month: Optional last month of a range (default: the first month)
+        """
         try:
-            # Get date values for previous month
-            date_values = self.filter_month_generator()
-            year = date_values['year']
-            month = int(date_values['month'])
-            
-            # Get the last day of the month
-            last_day = calendar.monthrange(year, month)[1]
-            
-            logger.debug(f"Setting date range for year: {year}, month: {month}")
-            
-            # Set start date (1st of month)
-            # Click first calendar icon
-            start_calendar = self.wait.until(
-                EC.element_to_be_clickable((By.XPATH, 
-                    "//input[@name='date1']/following-sibling::a/img[@src='date.gif']"
-                ))
-            )
-            start_calendar.click()
-            
-            # Click the previous month arrow
-            prev_month = self.wait.until(
-                EC.element_to_be_clickable((By.XPATH, "//img[@src='previ.gif']"))
-            )
-            prev_month.click()
-            
-            # Select day 1
-            start_date = self.wait.until(
-                EC.element_to_be_clickable((By.XPATH, 
-                    "//a[contains(@href, 'javascript:yxPickDate(1)')]/span[text()='1']"
-                ))
-            )
-            start_date.click()
-            
-            # Small delay between date selections
-            time.sleep(1)
-            
-            # Set end date (last day of month)
-            # Click second calendar icon
-            end_calendar = self.wait.until(
-                EC.element_to_be_clickable((By.XPATH, 
-                    "//input[@name='date2']/following-sibling::a/img[@src='date.gif']"
-                ))
-            )
-            end_calendar.click()
-            
-            # Click the previous month arrow again
-            prev_month = self.wait.until(
-                EC.element_to_be_clickable((By.XPATH, "//img[@src='previ.gif']"))
-            )
-            prev_month.click()
-            
-            # Select the last day
-            end_date = self.wait.until(
-                EC.element_to_be_clickable((By.XPATH, 
-                    f"//a[contains(@href, 'javascript:yxPickDate({last_day})')]/span[text()='{last_day}']"
-                ))
-            )
-            end_date.click()
-            
-            # Click submit button
+            # Get date values (previous month by default)
+            start_values, end_values = self.filter_range_generator(year, month, end_year, end_month)
+            year = int(start_values['year'])
+            month = int(start_values['month'])
+            last_year = int(end_values['year'])
+            last_month = int(end_values['month'])
+            
+            # Get the last day of the last month
+            last_day = calendar.monthrange(last_year, last_month)[1]
+            
+            logger.debug(f"Setting date range for {year}/{month} to {last_year}/{last_month}")
+            
+            # Write both dates (DD-MM-YYYY, as the date picker does) in one call
+            # instead of driving the calendar widget
+            self.forms.fill([
+                text_field("date1", f"01-{month:02d}-{year}"),
+                text_field("date2", f"{last_day:02d}-{last_month:02d}-{last_year}"),
+            ])
+            
+            # Click submit button natively; results (if any) open in a new tab
             submit_button = self.wait.until(
                 EC.element_to_be_clickable((By.XPATH, "//input[@value='確定'][@name='B1']"))
             )
+            self._window_handles_before_submit = self.dom.arm_new_window()
             submit_button.click()
             
-            logger.info(f"Successfully set payment filter for period: 1-{month:02d}-{year} to {last_day}-{month:02d}-{year}")
+            logger.info(f"Successfully set payment filter for period: 1-{month:02d}-{year} to {last_day}-{last_month:02d}-{last_year}")
             
         except TimeoutException:
             logger.error("Timeout waiting for payment filter elements")
@@ -1887,21 +1907,18 @@ class WebNavigator:
             DataFrame if data exists, None if no data found
         """
         try:
-            # Wait for new tab to open
-            time.sleep(3)
-            
-            # Get all window handles and switch to the new tab
-            handles = self.driver.window_handles
-            logger.debug(f"Found {len(handles)} browser windows")
-            
-            if len(handles) < 2:
-                # No new tab means no data
+            # Wait for new tab to open; no new tab means no data
+            handles = self._window_handles_before_submit or self.driver.window_handles
+            try:
+                new_handle = self.dom.wait_for_new_window(handles, timeout=self.NO_DATA_GRACE_SECONDS)
+            except TimeoutException:
                 logger.info("No payment data found for the selected period")
                 return None
             
-            # Switch to the new tab (last opened)
-            self.driver.switch_to.window(handles[-1])
+            # Switch to the new tab
+            self.driver.switch_to.window(new_handle)
             logger.debug(f"Switched to new tab with URL: {self.driver.current_url}")
+            self.dom.wait_for_page_load()
             
             # Find all tables in the new tab
             tables = self.driver.find_elements(By.TAG_NAME, "table")
@@ -1946,27 +1963,9 @@ class WebNavigator:
                 self.driver.switch_to.window(handles[0])
                 return None
                 
-            # Create DataFrame
-            df = pd.DataFrame(data, columns=headers)
-            
-            # Convert numeric columns (金額)
-            if '金額' in df.columns:
-                df['金額'] = df['金額'].str.replace(',', '').astype(float)
-            
-            # Convert date columns (日期, 到期日) - handle YYYYMMDD format
-            date_columns = ['日期', '到期日']
-            for col in date_columns:
-                if col in df.columns:
-                    # First try YYYYMMDD format
-                    df[col] = pd.to_datetime(df[col], format='%Y%m%d', errors='coerce')
-                    # If any dates failed to parse, try YYYY/MM/DD as fallback
-                    mask = df[col].isna()
-                    if mask.any():
-                        df.loc[mask, col] = pd.to_datetime(
-                            df.loc[mask, col], 
-                            format='%Y/%m/%d', 
-                            errors='coerce'
-                        )
+            # Create DataFrame and convert columns to their schema types
+            # (金額 amounts; 日期/到期日 as YYYYMMDD with YYYY/MM/DD fallback)
+            df = apply_schema(pd.DataFrame(data, columns=headers), 'payment_detail')
             
             logger.info(f"Successfully extracted {len(df)} payment records")
             
@@ -1997,22 +1996,9 @@ class WebNavigator:
                 return None
             
             # Only create Excel sheet if we have data
+            self.run_metrics.add('rows', len(df))
             if not df.empty:
-                with pd.ExcelWriter(str(excel_path), engine='openpyxl', mode='a') as writer:
-                    sheet_name = "Payment Details"
-                    
-                    # Remove sheet if it exists
-                    if sheet_name in writer.book.sheetnames:
-                        idx = writer.book.sheetnames.index(sheet_name)
-                        writer.book.remove(writer.book.worksheets[idx])
-                    
-                    df.to_excel(
-                        writer,
-                        sheet_name=sheet_name,
-                        index=False
-                    )
-                    
-                    logger.info(f"Successfully exported {len(df)} payment details to sheet in {excel_path}")
+                self.defer(self.write_payment_detail, excel_path, df)
             else:
                 logger.info("No payment data to export")
             
@@ -2023,6 +2009,26 @@ class WebNavigator:
             self.save_screenshot("payment_detail_error")
             raise
 
+    def write_payment_detail(self, excel_path, df):
+        """Write the payment detail table to its sheet"""
+        df = self.compact(df, 'payment_detail')
+        self.capture_changes(df, 'payment_detail')
+        with self._excel_writer(excel_path) as writer:
+            sheet_name = "Payment Details"
+            
+            # Remove sheet if it exists
+            if sheet_name in writer.book.sheetnames:
+                idx = writer.book.sheetnames.index(sheet_name)
+                writer.book.remove(writer.book.worksheets[idx])
+            
+            df.to_excel(
+                writer,
+                sheet_name=sheet_name,
+                index=False
+            )
+            
+            logger.info(f"Successfully exported {len(df)} payment details to sheet in {excel_path}")
+
 # Custom exception for security-related errors
 class SecurityError(Exception):
     pass
\ No newline at end of file
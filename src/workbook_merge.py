@@ -0,0 +1,64 @@
+# workbook_merge.py
+import os
+from copy import copy
+
+import openpyxl
+from logger_config import logger
+
+
+def _copy_sheet(source, target):
+    """Copy values, basic styles, merged ranges and column widths between worksheets"""
+    for row in source.iter_rows():
+        for cell in row:
+            new_cell = target.cell(row=cell.row, column=cell.column, value=cell.value)
+            if cell.has_style:
+                new_cell.font = copy(cell.font)
+                new_cell.alignment = copy(cell.alignment)
+                new_cell.number_format = cell.number_format
+    for merged_range in source.merged_cells.ranges:
+        target.merge_cells(str(merged_range))
+    for key, dimension in source.column_dimensions.items():
+        if dimension.width:
+            target.column_dimensions[key].width = dimension.width
+
+
+def merge_workbooks(part_paths, target_path, sheet_order=None, remove_parts=True):
+    """Merge the sheets of several workbooks into one
+    Args:
+        part_paths: Workbooks written by parallel lanes
+        target_path: Workbook to create
+        sheet_order: Optional list of sheet names giving the preferred order
+        remove_parts: Delete the part workbooks afterwards
+    Returns:
+        target_path
+    """
+    try:
+        sheets = {}
+        for part_path in part_paths:
+            if not os.path.exists(part_path):
+                continue
+            part = openpyxl.load_workbook(part_path)
+            for sheet in part.worksheets:
+                sheets[sheet.title] = sheet
+
+        titles = list(sheets)
+        if sheet_order:
+            rank = {name: index for index, name in enumerate(sheet_order)}
+            titles.sort(key=lambda title: rank.get(title, len(rank)))
+
+        merged = openpyxl.Workbook()
+        merged.remove(merged.active)
+        for title in titles:
+            _copy_sheet(sheets[title], merged.create_sheet(title))
+
+        merged.save(target_path)
+        logger.info(f"Merged {len(part_paths)} workbooks into {target_path}")
+
+        if remove_parts:
+            for part_path in part_paths:
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+        return target_path
+    except Exception as e:
+        logger.error(f"Failed to merge workbooks: {str(e)}")
+        raise
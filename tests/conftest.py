@@ -0,0 +1,6 @@
+# conftest.py
+import sys
+from pathlib import Path
+
+# The modules under src/ import each other by bare name (as when run as src/main.py)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
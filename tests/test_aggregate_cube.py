@@ -0,0 +1,81 @@
+# test_aggregate_cube.py
+import pytest
+
+pd = pytest.importorskip('pandas')
+
+from aggregate_cube import AggregateCube
+
+
+def analysis_frame(key, name, rows):
+    """Parsed analysis report: code, name, 出量, 退量, 淨量, 退率 and the site's total row"""
+    df = pd.DataFrame(rows, columns=[key, name, '出量', '退量', '淨量'])
+    total = {key: '合計', '出量': df['出量'].sum(), '退量': df['退量'].sum(), '淨量': df['淨量'].sum()}
+    df = pd.concat([df, pd.DataFrame([total])], ignore_index=True)
+    df['退率'] = (df['退量'] / df['出量'] * 100).round(2)
+    return df
+
+
+CUSTOMERS = analysis_frame('客戶代碼', '客戶名稱', [
+    ['C001', 'Shop A', 100, 10, 90],
+    ['C002', 'Shop B', 50, 5, 45],
+])
+PRODUCTS = analysis_frame('貨物代碼', '書名', [
+    ['A001', 'Book 1', 120, 12, 108],
+    ['A002', 'Book 2', 30, 3, 27],
+])
+
+
+@pytest.fixture
+def cube(tmp_path):
+    cube = AggregateCube(tmp_path / 'cube')
+    cube.add_view('customer_analysis', CUSTOMERS, '202403')
+    cube.add_view('product_analysis', PRODUCTS, '202403')
+    return cube
+
+
+def month_sums(level):
+    return level.groupby(level='month', observed=True)[['出量', '退量', '淨量']].sum().rename(index=str)
+
+
+def test_month_level_equals_both_monthly_levels(cube):
+    month = cube.level('month')[['出量', '退量', '淨量']].rename(index=str)
+    assert month.loc['202403'].tolist() == [150, 15, 135]
+    pd.testing.assert_frame_equal(month, month_sums(cube.level('customer_month')), check_dtype=False)
+    pd.testing.assert_frame_equal(month, month_sums(cube.level('product_month')), check_dtype=False)
+    assert cube.level('month').loc['202403', '退率'] == 10.0
+
+
+def test_month_fetched_only_as_product_report_reaches_month_level(cube):
+    cube.add_view('product_analysis', PRODUCTS, '202404')
+    month = cube.level('month').rename(index=str)
+    assert sorted(month.index) == ['202403', '202404']
+    assert month.loc['202404', '出量'] == 150
+
+
+def test_refetched_month_replaces_its_rows(cube):
+    corrected = analysis_frame('貨物代碼', '書名', [['A001', 'Book 1', 130, 10, 120]])
+    cube.add_view('product_analysis', corrected, '202403')
+    assert cube.query('product_month', month='202403')['出量'].tolist() == [130]
+    assert cube.query('product', product='A002').empty
+
+
+def test_levels_survive_a_reload(cube, tmp_path):
+    reloaded = AggregateCube(tmp_path / 'cube')
+    assert reloaded.query('customer', customer='C001')['淨量'].tolist() == [90]
+    assert reloaded.query('customer', customer='C999').empty
+
+
+def test_breakdown_fills_every_level(tmp_path):
+    breakdown = pd.DataFrame({
+        '客戶代碼': ['C001', 'C001', 'C002', '合計'],
+        '貨物代碼': ['A001', 'A002', 'A001', None],
+        '出量': [80, 20, 40, 140],
+        '退量': [8, 2, 4, 14],
+        '淨量': [72, 18, 36, 126],
+    })
+    cube = AggregateCube(tmp_path / 'cube')
+    cube.add_breakdown(breakdown, '客戶代碼', '貨物代碼', '202403')
+    assert cube.query('customer_product_month', product='A001')['出量'].tolist() == [80, 40]
+    assert cube.query('product', product='A001')['出量'].tolist() == [120]
+    assert cube.query('customer', customer='C001')['出量'].tolist() == [100]
+    assert cube.level('month')['出量'].tolist() == [140]
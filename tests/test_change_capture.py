@@ -0,0 +1,77 @@
+# test_change_capture.py
+import pytest
+
+pd = pytest.importorskip('pandas')
+
+from change_capture import ROW_HASH_COLUMN, diff_frames, report_keys
+
+
+def frame(rows, columns=('單號', '貨物代碼', '數量')):
+    return pd.DataFrame(rows, columns=list(columns))
+
+
+def keys_of(df, keys):
+    return sorted(tuple(row) for row in df[keys].itertuples(index=False))
+
+
+def test_inserts_updates_and_deletes_by_key():
+    keys = ['單號', '貨物代碼']
+    previous = frame([['P1', 'A001', 5], ['P1', 'A002', 3], ['P2', 'A001', 1]])
+    current = frame([['P1', 'A001', 5], ['P1', 'A002', 4], ['P3', 'A003', 2]])
+    inserted, updated, deleted = diff_frames(previous, current, keys)
+    assert keys_of(inserted, keys) == [('P3', 'A003')]
+    assert keys_of(updated, keys) == [('P1', 'A002')]
+    assert updated['數量'].tolist() == [4]
+    assert keys_of(deleted, keys) == [('P2', 'A001')]
+
+
+def test_unchanged_report_has_no_changes():
+    df = frame([['P1', 'A001', 5], ['P1', 'A002', 3]])
+    assert all(changes.empty for changes in diff_frames(df, df.copy(), ['單號', '貨物代碼']))
+
+
+def test_duplicate_keys_are_matched_in_order():
+    keys = ['單號', '貨物代碼']
+    previous = frame([['P1', 'A001', 5], ['P1', 'A001', 7]])
+    # The second line of the same order and product changed; a third was added
+    current = frame([['P1', 'A001', 5], ['P1', 'A001', 8], ['P1', 'A001', 1]])
+    inserted, updated, deleted = diff_frames(previous, current, keys)
+    assert updated['數量'].tolist() == [8]
+    assert updated['_occurrence'].tolist() == [1]
+    assert inserted['數量'].tolist() == [1]
+    assert inserted['_occurrence'].tolist() == [2]
+    assert deleted.empty
+
+    inserted, updated, deleted = diff_frames(current, previous, keys)
+    assert deleted['_occurrence'].tolist() == [2]
+    assert inserted.empty
+
+
+def test_total_rows_are_ignored():
+    keys = ['貨物代碼']
+    previous = frame([['', 'A001', 5], ['', '總計', 5]])
+    current = frame([['', 'A001', 6], ['', '總計', 6]])
+    inserted, updated, deleted = diff_frames(previous, current, keys)
+    assert updated['貨物代碼'].tolist() == ['A001']
+    assert inserted.empty and deleted.empty
+
+
+def test_payment_with_edited_amount_is_an_update():
+    previous = pd.DataFrame({'日期': ['2024-03-01'], '到期日': ['2024-04-30'], '金額': [100.0], '摘要': ['x']})
+    current = previous.assign(金額=[120.0])
+    keys = report_keys('payment_detail', current)
+    assert keys == ['日期', '到期日']
+    inserted, updated, deleted = diff_frames(previous, current, keys)
+    assert updated['金額'].tolist() == [120.0]
+    assert inserted.empty and deleted.empty
+
+
+def test_report_without_key_columns_compares_whole_rows():
+    previous = pd.DataFrame({'摘要': ['x', 'y'], '金額': [1.0, 2.0]})
+    current = pd.DataFrame({'摘要': ['x', 'y'], '金額': [1.0, 3.0]})
+    keys = report_keys('payment_detail', current)
+    assert keys == [ROW_HASH_COLUMN]
+    inserted, updated, deleted = diff_frames(previous, current, keys)
+    assert inserted['金額'].tolist() == [3.0]
+    assert deleted['金額'].tolist() == [2.0]
+    assert updated.empty
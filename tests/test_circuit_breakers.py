@@ -0,0 +1,106 @@
+# test_circuit_breakers.py
+import pytest
+
+pytest.importorskip('selenium')
+
+import session_watchdog
+from perf_history import PerfHistory
+from session_watchdog import CircuitBreaker, CircuitOpenError, SessionSupervisor
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(session_watchdog.time, 'time', clock)
+    return clock
+
+
+def test_opens_after_threshold_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=600)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+    assert breaker.opened_at == clock.now
+
+
+def test_half_open_after_cool_down_then_closes_on_success(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=600)
+    breaker.record_failure()
+    breaker.record_failure()
+    clock.now += 599
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.failures == 0 and breaker.opened_at is None
+    assert breaker.allow()
+
+
+def test_failure_while_half_open_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=600)
+    breaker.record_failure()
+    breaker.record_failure()
+    clock.now += 600
+    assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+    assert breaker.opened_at == clock.now
+
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.allow()
+
+
+def test_state_persists_across_runs(tmp_path, clock):
+    db = tmp_path / 'perf_history.sqlite'
+    breakers = {'discounts': CircuitBreaker(failure_threshold=3, reset_seconds=3600)}
+    breakers['discounts'].record_failure()
+    breakers['discounts'].record_failure()
+    PerfHistory(db).save_breakers(breakers, label='publisher_a')
+
+    # Next run: the third consecutive failure opens the circuit
+    state = PerfHistory(db).load_breakers('publisher_a')
+    assert state == {'discounts': (2, None)}
+    failures, opened_at = state['discounts']
+    breaker = CircuitBreaker(3, 3600, failures=failures, opened_at=opened_at)
+    breaker.record_failure()
+    PerfHistory(db).save_breakers({'discounts': breaker}, label='publisher_a')
+
+    failures, opened_at = PerfHistory(db).load_breakers('publisher_a')['discounts']
+    assert not CircuitBreaker(3, 3600, failures=failures, opened_at=opened_at).allow()
+    # Series are kept apart per account
+    assert PerfHistory(db).load_breakers('') == {}
+
+
+class FakeNavigator:
+    driver = None
+
+
+def failing_step(navigator, attempt):
+    raise ValueError("bad data")
+
+
+def test_supervisors_of_parallel_lanes_share_breakers(clock):
+    breakers = {}
+    lanes = [SessionSupervisor(FakeNavigator(), None, 'user', 'secret', breaker_threshold=2, breakers=breakers)
+             for _ in range(2)]
+    for supervisor in lanes:
+        with pytest.raises(ValueError):
+            supervisor.run_step('discounts', failing_step)
+    assert breakers['discounts'].failures == 2
+    with pytest.raises(CircuitOpenError):
+        lanes[0].run_step('discounts', failing_step)
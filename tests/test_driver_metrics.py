@@ -0,0 +1,74 @@
+# test_driver_metrics.py
+import pytest
+
+pytest.importorskip('selenium')
+
+from selenium.webdriver.remote.command import Command
+
+from driver_metrics import CommandMetrics, instrument_driver
+
+
+class FakeDriver:
+    """Stands in for a WebDriver: execute() answers without a browser"""
+
+    def __init__(self):
+        self.executed = []
+
+    def execute(self, driver_command, params=None):
+        self.executed.append(driver_command)
+        return {'value': None}
+
+
+def run_stage(driver, metrics, stage, commands):
+    with metrics.stage(stage):
+        for command in commands:
+            driver.execute(command, {})
+
+
+@pytest.fixture
+def instrumented():
+    metrics = CommandMetrics()
+    driver = instrument_driver(FakeDriver(), metrics)
+    return driver, metrics
+
+
+@pytest.fixture
+def budget(tmp_path, instrumented):
+    """Budget saved from a baseline run: inventory = 1 get + 2 find_element"""
+    driver, metrics = instrumented
+    run_stage(driver, metrics, 'inventory', [Command.GET, Command.FIND_ELEMENT, Command.FIND_ELEMENT])
+    path = tmp_path / 'command_budget.json'
+    metrics.save_budget(path)
+    return path
+
+
+def test_commands_are_counted_per_stage(instrumented):
+    driver, metrics = instrumented
+    run_stage(driver, metrics, 'inventory', [Command.GET, Command.FIND_ELEMENT, Command.FIND_CHILD_ELEMENT])
+    assert metrics.snapshot() == {'inventory': {'get': 1, 'find_element': 2}}
+    assert driver.executed == [Command.GET, Command.FIND_ELEMENT, Command.FIND_CHILD_ELEMENT]
+
+
+def test_within_budget(budget):
+    metrics = CommandMetrics()
+    driver = instrument_driver(FakeDriver(), metrics)
+    run_stage(driver, metrics, 'inventory', [Command.GET, Command.FIND_ELEMENT])
+    assert metrics.check_budget(budget) == []
+
+
+def test_over_budget(budget):
+    metrics = CommandMetrics()
+    driver = instrument_driver(FakeDriver(), metrics)
+    run_stage(driver, metrics, 'inventory', [Command.GET, Command.FIND_ELEMENT, Command.FIND_ELEMENT,
+                                             Command.FIND_ELEMENT, Command.CLICK_ELEMENT])
+    assert metrics.check_budget(budget) == ['inventory.find_element: 3 > 2', 'inventory.click: 1 > 0']
+
+
+def test_stage_missing_from_budget_is_a_violation(budget):
+    metrics = CommandMetrics()
+    driver = instrument_driver(FakeDriver(), metrics)
+    run_stage(driver, metrics, 'inventory', [Command.GET])
+    run_stage(driver, metrics, 'monthly_supply', [Command.GET, Command.GET])
+    violations = metrics.check_budget(budget)
+    assert len(violations) == 1
+    assert violations[0].startswith('monthly_supply: not in budget (2 commands)')
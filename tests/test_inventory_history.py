@@ -0,0 +1,62 @@
+# test_inventory_history.py
+import sqlite3
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+
+from inventory_history import InventoryHistory
+
+
+def inventory(rows):
+    """Parsed inventory report with the site's 總計 row"""
+    df = pd.DataFrame(rows, columns=['貨物代碼', '庫存量', '庫存額'])
+    total = {'貨物代碼': '總計', '庫存量': df['庫存量'].sum(), '庫存額': df['庫存額'].sum()}
+    return pd.concat([df, pd.DataFrame([total])], ignore_index=True)
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = InventoryHistory(tmp_path / 'inventory.sqlite')
+    history.record(inventory([['A001', 10, 100.0], ['A002', 5, 50.0]]), day='2024-03-01')
+    # A001 changes, A002 is unchanged
+    history.record(inventory([['A001', 8, 80.0], ['A002', 5, 50.0]]), day='2024-03-03')
+    # A002 is sold out and disappears, A003 is new
+    history.record(inventory([['A001', 8, 80.0], ['A003', 2, 30.0]]), day='2024-03-05')
+    return history
+
+
+def levels(state):
+    return {code: int(quantity) for code, quantity in state['quantity'].items()}
+
+
+def test_only_changes_are_stored(history, tmp_path):
+    with sqlite3.connect(tmp_path / 'inventory.sqlite') as conn:
+        rows = conn.execute("SELECT code, day FROM inventory_changes ORDER BY day, code").fetchall()
+    assert rows == [('A001', '2024-03-01'), ('A002', '2024-03-01'), ('A001', '2024-03-03'),
+                    ('A002', '2024-03-05'), ('A003', '2024-03-05')]
+
+
+@pytest.mark.parametrize('day, expected', [
+    ('2024-03-01', {'A001': 10, 'A002': 5}),
+    # Between recorded days: the latest change on or before the day
+    ('2024-03-02', {'A001': 10, 'A002': 5}),
+    ('2024-03-04', {'A001': 8, 'A002': 5}),
+    ('2024-03-05', {'A001': 8, 'A003': 2}),
+    (None, {'A001': 8, 'A003': 2}),
+    ('2024-02-28', {}),
+])
+def test_state_at_picks_the_latest_change_on_or_before_the_day(history, day, expected):
+    assert levels(history.state_at(day)) == expected
+
+
+def test_rerun_replaces_the_day(history):
+    history.record(inventory([['A001', 7, 70.0], ['A003', 2, 30.0]]), day='2024-03-05')
+    assert levels(history.state_at('2024-03-05')) == {'A001': 7, 'A003': 2}
+    assert history.days() == ['2024-03-01', '2024-03-03', '2024-03-05']
+
+
+def test_product_history_daily(history):
+    daily = history.product_history('A001', daily=True)
+    assert daily['quantity'].tolist() == [10, 8, 8]
+    assert daily['quantity_delta'].tolist() == [10, -2, 0]
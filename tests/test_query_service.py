@@ -0,0 +1,105 @@
+# test_query_service.py
+import pytest
+
+pd = pytest.importorskip('pandas')
+
+from aggregate_cube import AggregateCube
+from inventory_history import InventoryHistory
+from query_service import QueryService, ReportIndex, _sheet_frame
+
+
+def analysis_frame(key, rows):
+    df = pd.DataFrame(rows, columns=[key, '出量', '退量', '淨量'])
+    df['退率'] = (df['退量'] / df['出量'] * 100).round(2)
+    return df
+
+
+@pytest.fixture
+def index(tmp_path):
+    products = analysis_frame('貨物代碼', [['A001', 100, 10, 90], ['A002', 50, 0, 50]])
+    customers = analysis_frame('客戶代碼', [['C001', 150, 10, 140]])
+    cube = AggregateCube(tmp_path / 'cube')
+    cube.add_view('product_analysis', products, '202403')
+    cube.add_view('product_analysis', analysis_frame('貨物代碼', [['A001', 40, 4, 36]]), '202404')
+    cube.add_view('customer_analysis', customers, '202403')
+
+    inventory = pd.DataFrame({'貨物代碼': ['A001', 'A002', '總計'], '庫存量': [12, 3, 15],
+                              '庫存額': [120.0, 30.0, 150.0]})
+    history = InventoryHistory(tmp_path / 'inventory.sqlite')
+    history.record(inventory, day='2024-04-30')
+
+    frames = {
+        'inventory': inventory,
+        'purchase_orders': pd.DataFrame({'單號': ['P1', 'P2'], '貨物代碼': ['A001', 'A002'], '數量': [5, 2]}),
+        'product_analysis': products,
+        'customer_analysis': customers,
+        'discounts': pd.DataFrame({'日期': ['2024/03/31'], '折讓類別': ['volume'], '折讓金額': [25.0]}),
+    }
+    return ReportIndex(frames, inventory_history=history, aggregate_cube=cube, source='test')
+
+
+@pytest.fixture
+def service(index):
+    service = QueryService(lambda: index, port=0)
+    yield service
+    service.server.server_close()
+
+
+def test_product_hit(service):
+    status, answer = service.answer('/products/A001', {})
+    assert status == 200
+    assert answer['stock'] == {'day': '2024-04-30', 'quantity': 12, 'amount': 120.0}
+    assert [row['month'] for row in answer['monthly']] == ['202403', '202404']
+    assert [row['單號'] for row in answer['reports']['purchase_orders']] == ['P1']
+    assert answer['reports']['product_analysis'][0]['出量'] == 100
+    assert 'inventory' in answer['reports']
+
+
+def test_product_month_filter(service):
+    status, answer = service.answer('/products/A001', {'month': ['202404']})
+    assert status == 200
+    assert [(row['month'], row['出量']) for row in answer['monthly']] == [('202404', 40)]
+
+
+def test_product_miss(service):
+    status, answer = service.answer('/products/ZZZ', {})
+    assert status == 404
+    assert 'ZZZ' in answer['error']
+
+
+def test_customer_and_period(service):
+    status, answer = service.answer('/customers/C001', {})
+    assert status == 200
+    assert answer['monthly'][0]['出量'] == 150
+    assert service.answer('/customers/C999', {})[0] == 404
+
+    status, answer = service.answer('/periods/202403', {})
+    assert status == 200
+    assert answer['totals']['出量'] == 150
+    assert sorted(row['product'] for row in answer['products']) == ['A001', 'A002']
+    assert service.answer('/periods/202312', {})[0] == 404
+
+
+def test_whole_report_and_unknown_paths(service):
+    status, answer = service.answer('/reports/discounts', {})
+    assert status == 200 and answer['rows'][0]['折讓金額'] == 25.0
+    assert service.answer('/reports/nothing', {})[0] == 404
+    assert service.answer('/unknown/A001', {})[0] == 404
+    status, answer = service.answer('/health', {})
+    assert status == 200 and answer['products'] == 2
+
+
+def test_total_rows_are_not_indexed(index):
+    assert index.product('總計') is None
+
+
+def test_sheet_frame_skips_title_rows():
+    raw = pd.DataFrame([
+        ['庫存銷售月報表 2024/03', None, None],
+        ['貨物代碼', '書名', '存量'],
+        ['A001', 'Book 1', '12'],
+        ['A002', 'Book 2', '3'],
+    ])
+    df = _sheet_frame(raw)
+    assert list(df.columns) == ['貨物代碼', '書名', '存量']
+    assert df['存量'].tolist() == [12, 3]
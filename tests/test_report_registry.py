@@ -0,0 +1,80 @@
+# test_report_registry.py
+import pytest
+
+pytest.importorskip('pandas')
+
+from report_registry import REPORTS, build_steps, lane_stages, plan
+
+COSTS = {
+    'inventory': 10,
+    'monthly_supply': 40,
+    'analysis': 50,
+    'sum_by_week': 25,
+    'sum_by_week_customer': 25,
+    'sum_by_month': 20,
+    'sum_by_month_customer': 20,
+    'purchase_orders': 30,
+    'return_orders': 15,
+    'discounts': 35,
+    'payment_detail': 5,
+}
+
+
+def names(lane):
+    return [step['name'] for step in lane]
+
+
+def load(lane):
+    return sum(step['cost'] for step in lane)
+
+
+@pytest.mark.parametrize('lanes', [1, 2, 3, 4])
+def test_every_step_is_assigned_exactly_once(lanes):
+    planned = plan(lanes=lanes, cost_estimates=COSTS)
+    assigned = [name for lane in planned for name in names(lane)]
+    assert sorted(assigned) == sorted(step['name'] for step in build_steps())
+    assert len(planned) == lanes
+
+
+@pytest.mark.parametrize('lanes', [2, 3, 4])
+def test_lanes_are_balanced_longest_first(lanes):
+    planned = plan(lanes=lanes, cost_estimates=COSTS)
+    loads = [load(lane) for lane in planned]
+    # Longest-processing-time bound: no lane exceeds the average by more than the largest step
+    assert max(loads) <= sum(COSTS.values()) / lanes + max(COSTS.values())
+
+    # Replay the greedy assignment: each step, longest first, goes to the least loaded lane
+    expected = [0.0] * lanes
+    for cost in sorted(COSTS.values(), reverse=True):
+        expected[expected.index(min(expected))] += cost
+    assert sorted(loads) == sorted(expected)
+
+
+def test_two_lanes_split_evenly():
+    costs = {'inventory': 30, 'monthly_supply': 20, 'analysis': 20, 'discounts': 10}
+    planned = plan(['inventory', 'monthly_supply', 'customer_analysis', 'product_analysis', 'discounts'],
+                   lanes=2, cost_estimates=costs)
+    assert sorted(load(lane) for lane in planned) == [40, 40]
+    assert sorted(names(lane) for lane in planned) == [['inventory', 'discounts'], ['monthly_supply', 'analysis']]
+
+
+def test_lanes_keep_pipeline_order():
+    order = list(REPORTS)
+    for lane in plan(lanes=3, cost_estimates=COSTS):
+        positions = [order.index(step['reports'][0]) for step in lane]
+        assert positions == sorted(positions)
+
+
+def test_group_reports_form_one_step():
+    steps = build_steps(['customer_analysis', 'product_analysis', 'inventory'], COSTS)
+    assert [(step['name'], step['reports']) for step in steps] == [
+        ('inventory', ['inventory']),
+        ('analysis', ['customer_analysis', 'product_analysis']),
+    ]
+    assert [name for name, _ in lane_stages(steps)] == ['inventory', 'analysis']
+
+
+def test_default_costs_without_history():
+    steps = build_steps(['inventory', 'customer_analysis'])
+    assert [step['cost'] for step in steps] == [REPORTS['inventory']['default_cost'],
+                                               REPORTS['customer_analysis']['default_cost']]
@@ -0,0 +1,31 @@
+# test_report_totals.py
+import pytest
+
+pd = pytest.importorskip('pandas')
+
+from report_totals import TotalsMismatchError, validate_totals
+
+
+def discount_frame(amounts, total):
+    rows = [{'說明': f"item {index}", '折讓金額': amount} for index, amount in enumerate(amounts)]
+    return pd.DataFrame(rows + [{'說明': '合 計', '折讓金額': total}])
+
+
+def test_matching_totals_return_the_computed_sums():
+    computed = validate_totals(discount_frame([100.0, 200.0, 300.0], 600.0), 'discounts')
+    assert computed['折讓金額'] == 600.0
+
+
+def test_truncated_table_raises():
+    # The last row was cut off: the site's total no longer adds up
+    with pytest.raises(TotalsMismatchError, match='折讓金額'):
+        validate_totals(discount_frame([100.0, 200.0], 600.0), 'discounts')
+
+
+def test_rounding_within_tolerance_passes():
+    validate_totals(discount_frame([100.4, 200.4], 300.0), 'discounts')
+
+
+def test_table_without_total_row_is_not_validated():
+    df = pd.DataFrame([{'說明': 'item', '折讓金額': 5.0}])
+    assert validate_totals(df, 'discounts')['折讓金額'] == 5.0
@@ -0,0 +1,44 @@
+# test_run_stages.py
+import pytest
+
+pytest.importorskip('pandas')
+# main needs the full runtime (selenium, webdriver_manager and the site's url configuration)
+main = pytest.importorskip('main')
+
+from driver_metrics import CommandMetrics
+from metrics_exporter import RunMetrics
+from report_totals import TotalsMismatchError
+from session_watchdog import SessionSupervisor, StepFailedError
+
+
+class FakeNavigator:
+    def __init__(self):
+        self.command_metrics = CommandMetrics()
+        self.run_metrics = RunMetrics()
+        self.post_processor = None
+        self.driver = object()
+
+    def return_to_index(self):
+        pass
+
+
+def truncated_report(navigator, excel_path):
+    raise TotalsMismatchError("discounts: 2 rows do not add up to the site's total")
+
+
+@pytest.mark.parametrize('supervised', [False, True])
+def test_totals_mismatch_fails_only_its_stage(supervised):
+    navigator = FakeNavigator()
+    finished = []
+    stages = [
+        ('discounts', truncated_report),
+        ('inventory', lambda nav, excel_path: finished.append('inventory')),
+    ]
+    supervisor = None
+    if supervised:
+        supervisor = SessionSupervisor(navigator, lambda **kwargs: FakeNavigator(), 'user', 'secret')
+
+    with pytest.raises(StepFailedError, match='Stages failed: discounts$'):
+        main.run_stages(navigator, 'unused.xlsx', stages, at_index=True, supervisor=supervisor, post_workers=0)
+    assert finished == ['inventory']
+    assert navigator.run_metrics.reports['discounts']['failures'] == 1